@@ -3,10 +3,27 @@ import sys
 from copy import deepcopy
 from collections import UserDict
 from collections.abc import Mapping
-from .template import PhotonicTemplateBase  # Expose PhotonicTemplateBase so that all generators can subclass it
-from .layout_manager import PhotonicLayoutManager  # Expose PLM to simplify BPG usage
+from importlib import import_module
+from .config_cache import parse_yaml_file
 from typing import Union
 
+# Attributes of the BPG package that are only imported when first accessed, so that importing BPG does not load BAG
+# and the layout backends. PhotonicTemplateBase is exposed so that all generators can subclass it, and
+# PhotonicLayoutManager is exposed to simplify BPG usage
+_lazy_attributes = {
+    'PhotonicTemplateBase': '.template',
+    'PhotonicLayoutManager': '.layout_manager',
+}
+
+
+def __getattr__(name):
+    """ Imports the lazily exposed attributes of the package on first access """
+    if name in _lazy_attributes:
+        value = getattr(import_module(_lazy_attributes[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
 class ConfigDict(UserDict):
     """
@@ -77,7 +94,7 @@ check_environment()
 # If BAG_CONFIG_PATH is not provided, don't try to load any settings, this mostly happens when trying to
 # run the bpg command line setup script for the first time
 if 'BAG_CONFIG_PATH' in os.environ:
-    _config = PhotonicLayoutManager.load_yaml(os.environ['BAG_CONFIG_PATH'])
+    _config = parse_yaml_file(os.environ['BAG_CONFIG_PATH'])
     # Add paths specified in config file
     if 'path_setup' in _config:
         for path in _config['path_setup']:
@@ -85,7 +102,7 @@ if 'BAG_CONFIG_PATH' in os.environ:
                 sys.path.append(path)
                 print(f'Adding {path} to python module search path')
     # Use the core setting built into BPG as a base for all configuration
-    _bpg_default_config = PhotonicLayoutManager.load_yaml(
+    _bpg_default_config = parse_yaml_file(
         os.path.dirname(os.path.realpath(__file__)) + "/default_config.yaml"
     )
 
@@ -0,0 +1,167 @@
+"""
+This module runs the generation flow of many spec files in parallel.
+
+The batch runner imports BPG with all of its dependencies and loads the shared tech configuration once, then forks one
+worker process per spec file, with at most `jobs` workers running at a time. Forked workers start from this warm state
+instead of paying for the imports and the tech file parsing, and each one runs in its own process, so that the global
+run settings and the masters of one spec file never affect another.
+
+Each spec file gets its own output directory under the batch output directory, holding its project outputs, its log
+files and the captured stdout / stderr of its worker. The runner writes a consolidated report.json with the status,
+timing and outputs of every spec file.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import traceback
+import multiprocessing
+from multiprocessing.connection import wait
+from pathlib import Path
+
+import BPG
+from BPG.config_cache import preload_tech_files
+from BPG.runner import check_outputs, run_spec
+
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def _job_dirs(spec_files: Sequence[str],
+              output_dir: Path,
+              ) -> List[Path]:
+    """ Returns a distinct output directory for each spec file, named after its index and file name """
+    width = len(str(len(spec_files)))
+    return [output_dir / f'{index:0{width}d}_{Path(spec_file).stem}' for index, spec_file in enumerate(spec_files)]
+
+
+def _run_job(spec_file: str,
+             outputs: Sequence[str],
+             job_dir: Path,
+             ) -> None:
+    """
+    Runs a spec file in a forked worker, redirecting its outputs, logs and console to job_dir.
+    The result of the run is written to job_dir / result.json.
+    """
+    with open(job_dir / 'console.log', 'w') as console:
+        os.dup2(console.fileno(), sys.stdout.fileno())
+        os.dup2(console.fileno(), sys.stderr.fileno())
+
+    start = time.time()
+    try:
+        project_dir = job_dir / 'project'
+        result = run_spec(spec_file=spec_file,
+                          outputs=outputs,
+                          overrides=dict(project_dir=str(project_dir),
+                                         logfile=str(project_dir / 'logs' / 'output.log')))
+        result['status'] = 'ok'
+    except Exception as e:
+        traceback.print_exc()
+        result = dict(spec=spec_file, status='error', error=str(e), traceback=traceback.format_exc(),
+                      timing=dict(total=time.time() - start))
+
+    with open(job_dir / 'result.json', 'w') as f:
+        json.dump(result, f, indent=2, default=str)
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+
+def run_batch(spec_files: Sequence[str],
+              outputs: Sequence[str] = (),
+              jobs: int = 1,
+              output_dir: str = 'bpg_batch',
+              ) -> Dict[str, Any]:
+    """
+    Runs the generation flow of each spec file in a forked worker, with at most `jobs` workers at a time.
+
+    Parameters
+    ----------
+    spec_files : Sequence[str]
+        The spec files to run
+    outputs : Sequence[str]
+        The outputs to produce for every spec file, among BPG.runner.OUTPUT_STAGES
+    jobs : int
+        Maximum number of workers running at the same time
+    output_dir : str
+        Directory holding the output directory of each spec file and the report
+
+    Returns
+    -------
+    report : Dict[str, Any]
+        'results' : the result of each spec file, in the order of spec_files,
+        'summary' : the number of spec files that passed and failed, and the total duration
+    """
+    check_outputs(outputs)
+    if jobs < 1:
+        raise ValueError(f'jobs must be at least 1, got {jobs}')
+    start = time.time()
+
+    # Warm up the imports and the shared tech configuration before forking, so that every worker inherits them
+    from BPG.layout_manager import PhotonicLayoutManager  # noqa: F401
+    if 'photonic_tech_config_path' in BPG.run_settings['bpg_config']:
+        n_loaded = preload_tech_files(BPG.run_settings['bpg_config']['photonic_tech_config_path'])
+        logging.info(f'Preloaded {n_loaded} tech files')
+
+    spec_files = [str(Path(spec_file).resolve()) for spec_file in spec_files]
+    output_dir = Path(output_dir).resolve()
+    job_dirs = _job_dirs(spec_files, output_dir)
+    for job_dir in job_dirs:
+        job_dir.mkdir(parents=True, exist_ok=True)
+
+    context = multiprocessing.get_context('fork')
+    pending = list(range(len(spec_files)))
+    running: Dict[int, Any] = {}
+    results: List[Optional[Dict[str, Any]]] = [None] * len(spec_files)
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    while pending or running:
+        while pending and len(running) < jobs:
+            index = pending.pop(0)
+            process = context.Process(target=_run_job, args=(spec_files[index], list(outputs), job_dirs[index]))
+            process.start()
+            running[process.sentinel] = (index, process, time.time())
+
+        for sentinel in wait(list(running)):
+            index, process, job_start = running.pop(sentinel)
+            process.join()
+            result_path = job_dirs[index] / 'result.json'
+            if process.exitcode == 0 and result_path.is_file():
+                with open(result_path, 'r') as f:
+                    result = json.load(f)
+            else:
+                result = dict(spec=spec_files[index], status='error',
+                              error=f'Worker exited with code {process.exitcode}',
+                              timing=dict(total=time.time() - job_start))
+            result['output_dir'] = str(job_dirs[index])
+            results[index] = result
+            print(f'[{sum(r is not None for r in results)}/{len(results)}] {result["status"]:>5} '
+                  f'{result["timing"]["total"]:>10.3f}s  {spec_files[index]}')
+
+    n_failed = sum(result['status'] != 'ok' for result in results)
+    report = dict(results=results,
+                  summary=dict(total=len(results), passed=len(results) - n_failed, failed=n_failed, jobs=jobs,
+                               duration=time.time() - start))
+    with open(output_dir / 'report.json', 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """ Prints the timing of each stage for every spec file, followed by the failures and the summary """
+    stages = ['init', 'content', 'gds', 'flat_content', 'flat_gds', 'lsf', 'dataprep', 'total']
+    print(f'{"status":<8}' + ''.join(f'{stage:>14}' for stage in stages) + '  spec')
+    for result in report['results']:
+        timing = result['timing']
+        print(f'{result["status"]:<8}' +
+              ''.join(f'{timing[stage]:>14.3f}' if stage in timing else f'{"-":>14}' for stage in stages) +
+              f'  {result["spec"]}')
+
+    for result in report['results']:
+        if result['status'] != 'ok':
+            print(f'\nFAILED {result["spec"]}: {result["error"]}\n  see {result["output_dir"]}')
+
+    summary = report['summary']
+    print(f'\n{summary["passed"]} passed, {summary["failed"]} failed, {summary["total"]} spec files in '
+          f'{summary["duration"]:.3f}s with {summary["jobs"]} jobs')
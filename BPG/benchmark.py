@@ -0,0 +1,242 @@
+"""
+This module runs the scaling benchmark suite: synthetic layouts from BPG.examples.ScalingBenchmark, each generated at
+several sizes, with every stage of the flow timed. Each case runs in a new process, so that the peak memory of a case
+is not hidden by the larger cases run before it. The results are written as JSON, and can be compared against a stored
+baseline to flag the stages that slowed down.
+
+Results format::
+
+    {"meta": {"python": ..., "platform": ..., "date": ...},
+     "results": [{"benchmark": "rect_array", "size": 100, "flat_shapes": 10000, "process_peak_rss_mb": ...,
+                  "timing": {"generate_template": ..., "generate_content": ..., ...}}, ...]}
+"""
+import sys
+import json
+import time
+import logging
+import platform
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import BPG
+from BPG.tracing import peak_rss, MB
+
+from typing import Any, Dict, List, Optional, Sequence
+
+# Benchmark name keyed generator class, size parameter and default sizes
+BENCHMARKS = {
+    'deep_hierarchy': ('DeepHierarchy', 'depth', [4, 8, 12]),
+    'fan_out': ('FanOut', 'n_instances', [100, 1000, 4000]),
+    'rect_array': ('RectArray', 'n', [10, 50, 100]),
+    'dense_rings': ('DenseRings', 'n_rings', [10, 100, 500]),
+    'curved_paths': ('CurvedPaths', 'n_paths', [10, 50, 200]),
+    'via_farm': ('ViaFarm', 'n', [5, 10, 20]),
+}
+
+# Timed stages of the flow, in the order they are run
+STAGES = ['generate_template', 'generate_content', 'save_content_list', 'generate_gds', 'generate_flat_content',
+          'dataprep', 'generate_lsf']
+
+# Spec file providing the tech and output settings of the benchmarks
+DEFAULT_SPEC_FILE = str(Path(__file__).parent / 'examples' / 'specs' / 'scaling_benchmark.yaml')
+
+
+def run_case(spec_file: str,
+             benchmark: str,
+             size: int,
+             stages: Sequence[str] = STAGES,
+             ) -> Dict[str, Any]:
+    """
+    Generates one benchmark at one size in a new layout manager, timing each stage.
+
+    Parameters
+    ----------
+    spec_file : str
+        Spec file providing the tech and output settings
+    benchmark : str
+        Name of the benchmark, a key of BENCHMARKS
+    size : int
+        Value of the size parameter of the benchmark generator
+    stages : Sequence[str]
+        The stages to run, among STAGES. The stages that other stages depend on are always run
+
+    Returns
+    -------
+    result : Dict[str, Any]
+        The benchmark, size, number of flat shapes, duration of each stage in seconds, and peak RSS of the process.
+        The peak RSS is only that of the case when it runs in a new process, see run_case_in_process
+    """
+    from BPG.examples import ScalingBenchmark
+
+    class_name, size_param, _ = BENCHMARKS[benchmark]
+    temp_cls = getattr(ScalingBenchmark, class_name)
+    cell_name = f'{benchmark}_{size}'
+    plm = BPG.PhotonicLayoutManager(spec_file, impl_cell=cell_name)
+    if plm.perf_history is not None:
+        # All of the cases share the spec file, so the history compares each case to its own previous runs
+        plm.perf_history.case = dict(benchmark=benchmark, size=size)
+
+    steps = [
+        ('generate_template', lambda: plm.generate_template(temp_cls=temp_cls, params={size_param: size},
+                                                            cell_name=cell_name)),
+        ('generate_content', lambda: plm.generate_content(save_content=False)),
+        ('save_content_list', lambda: plm.save_content_list('content_list')),
+        ('generate_gds', lambda: plm.generate_gds()),
+        ('generate_flat_content', lambda: plm.generate_flat_content(save_content=False)),
+        ('dataprep', lambda: plm.dataprep()),
+        ('generate_lsf', lambda: plm.generate_lsf()),
+    ]
+    required = {'generate_template', 'generate_content'}
+    if {'dataprep', 'generate_lsf'} & set(stages):
+        required.add('generate_flat_content')
+
+    timing = {}
+    for stage, step in steps:
+        if stage in stages or stage in required:
+            start = time.perf_counter()
+            step()
+            timing[stage] = time.perf_counter() - start
+
+    result = dict(benchmark=benchmark, size=size, timing=timing)
+    if plm.content_list_flat:
+        result['flat_shapes'] = sum(sum(content.shape_counts(elements=True).values())
+                                    for content in plm.content_list_flat)
+    max_rss = peak_rss()
+    result['process_peak_rss_mb'] = max_rss / MB if max_rss is not None else None
+    return result
+
+
+def run_case_in_process(spec_file: str,
+                        benchmark: str,
+                        size: int,
+                        stages: Sequence[str] = STAGES,
+                        ) -> Dict[str, Any]:
+    """ Runs run_case in a new process, so that its peak RSS only accounts for this case """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(run_case, spec_file, benchmark, size, list(stages)).result()
+
+
+def run_benchmarks(spec_file: str = DEFAULT_SPEC_FILE,
+                   benchmarks: Optional[Sequence[str]] = None,
+                   sizes: Optional[Dict[str, Sequence[int]]] = None,
+                   stages: Sequence[str] = STAGES,
+                   new_process: bool = True,
+                   ) -> Dict[str, Any]:
+    """
+    Runs each benchmark at each of its sizes.
+
+    Parameters
+    ----------
+    spec_file : str
+        Spec file providing the tech and output settings
+    benchmarks : Optional[Sequence[str]]
+        Names of the benchmarks to run. Defaults to all of BENCHMARKS
+    sizes : Optional[Dict[str, Sequence[int]]]
+        Benchmark name keyed sizes to run, overriding the default sizes of BENCHMARKS
+    stages : Sequence[str]
+        The stages to run, among STAGES
+    new_process : bool
+        True to run each case in a new process, False to run them all in this process. The peak RSS of each case is
+        then the peak RSS of this process so far
+
+    Returns
+    -------
+    results : Dict[str, Any]
+        'meta' : the environment of the run,
+        'results' : the result of each benchmark and size, see run_case
+    """
+    unsupported = [stage for stage in stages if stage not in STAGES]
+    if unsupported:
+        raise ValueError(f'Unsupported stages {unsupported}. Supported stages are {STAGES}')
+    if benchmarks is None:
+        benchmarks = list(BENCHMARKS)
+    for benchmark in benchmarks:
+        if benchmark not in BENCHMARKS:
+            raise ValueError(f'Unknown benchmark {benchmark}. Available benchmarks are {list(BENCHMARKS)}')
+    sizes = sizes or {}
+
+    results = []
+    for benchmark in benchmarks:
+        for size in sizes.get(benchmark, BENCHMARKS[benchmark][2]):
+            result = (run_case_in_process if new_process else run_case)(spec_file, benchmark, size, stages)
+            results.append(result)
+            logging.info(f'Benchmark {benchmark} size {size}: '
+                         + ', '.join(f'{stage} {duration:.4g}s' for stage, duration in result['timing'].items()))
+
+    meta = dict(python=sys.version.split()[0], platform=platform.platform(),
+                date=datetime.datetime.now().isoformat(timespec='seconds'), spec_file=str(spec_file))
+    return dict(meta=meta, results=results)
+
+
+def compare_results(results: Dict[str, Any],
+                    baseline: Dict[str, Any],
+                    threshold: float = 0.2,
+                    min_time: float = 0.05,
+                    ) -> List[Dict[str, Any]]:
+    """
+    Compares the timing of each benchmark, size and stage to a baseline.
+
+    Parameters
+    ----------
+    results : Dict[str, Any]
+        The results to check, as returned by run_benchmarks
+    baseline : Dict[str, Any]
+        The reference results
+    threshold : float
+        Relative slowdown above which a stage is flagged as a regression
+    min_time : float
+        Absolute slowdown in seconds below which a stage is never flagged, to ignore the noise of short stages
+
+    Returns
+    -------
+    comparison : List[Dict[str, Any]]
+        For each benchmark, size and stage found in both, the 'baseline' and 'current' durations, their 'ratio', and
+        whether the stage is a 'regression'
+    """
+    reference = {(result['benchmark'], result['size']): result['timing'] for result in baseline['results']}
+    comparison = []
+    for result in results['results']:
+        baseline_timing = reference.get((result['benchmark'], result['size']), None)
+        if baseline_timing is None:
+            continue
+        for stage, current in result['timing'].items():
+            if stage not in baseline_timing:
+                continue
+            previous = baseline_timing[stage]
+            comparison.append(dict(benchmark=result['benchmark'], size=result['size'], stage=stage,
+                                   baseline=previous, current=current,
+                                   ratio=current / previous if previous > 0 else float('inf'),
+                                   regression=current > previous * (1 + threshold) and current - previous > min_time))
+    return comparison
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    """ Prints the duration of each stage for every benchmark and size """
+    print(f'{"benchmark":<16}{"size":>8}' + ''.join(f'{stage:>23}' for stage in STAGES))
+    for result in results['results']:
+        timing = result['timing']
+        print(f'{result["benchmark"]:<16}{result["size"]:>8}' +
+              ''.join(f'{timing[stage]:>23.4f}' if stage in timing else f'{"-":>23}' for stage in STAGES))
+
+
+def print_comparison(comparison: List[Dict[str, Any]]) -> None:
+    """ Prints the stages flagged as regressions, followed by a summary """
+    regressions = [row for row in comparison if row['regression']]
+    for row in regressions:
+        print(f'REGRESSION {row["benchmark"]} size {row["size"]} {row["stage"]}: '
+              f'{row["baseline"]:.4f}s -> {row["current"]:.4f}s ({row["ratio"]:.2f}x)')
+    print(f'{len(regressions)} regressions in {len(comparison)} compared stages')
+
+
+def write_results(results: Dict[str, Any], filepath: str) -> None:
+    """ Writes benchmark results to a JSON file """
+    with open(filepath, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def read_results(filepath: str) -> Dict[str, Any]:
+    """ Reads benchmark results from a JSON file """
+    with open(filepath, 'r') as f:
+        return json.load(f)
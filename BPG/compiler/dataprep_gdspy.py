@@ -6,11 +6,21 @@ import sys
 import logging
 import re
 
-from BPG.objects import PhotonicRect, PhotonicPolygon, PhotonicRound
+from BPG.objects import PhotonicRound
 from BPG.compiler.point_operations import coords_cleanup
-from BPG.content_list import ContentList
+from BPG.compiler.rough_raster import rough_raster_rectangles
+from BPG.compiler.manh_fracture import fracture_pointlists
+from BPG.compiler.manh_adaptive import manh_adaptive
+from BPG.compiler.prepared_layers import PreparedLayers
+from BPG.content_list import ContentList, polygon_array_from_pointlists
+from BPG.tracing import tracer, traced, span, annotate
+try:
+    from BPG.compiler.poly_simplify import simplify_pointlists
+except ImportError:
+    simplify_pointlists = None
 
 from math import ceil
+from itertools import chain
 from typing import TYPE_CHECKING, Tuple, List, Union, Dict, Optional, Pattern, Iterable
 
 if TYPE_CHECKING:
@@ -37,6 +47,9 @@ warnings.filterwarnings(
 # List of
 IMPLEMENTED_DATAPREP_OPERATIONS = ['rad', 'add', 'manh', 'ouo', 'sub', 'ext', 'and', 'xor']
 
+# Implementations of the rough add operation, selected with RoughAddMode in the dataprep routine file
+ROUGH_ADD_MODES = ['offset', 'raster']
+
 
 class Dataprep:
     def __init__(self,
@@ -45,6 +58,9 @@ class Dataprep:
                  content_list_flat: "ContentList",
                  is_lsf: bool = False,
                  impl_cell=None,
+                 output_arrays: bool = False,
+                 prepared_layers: Optional[PreparedLayers] = None,
+                 collect_stats: bool = False,
                  ) -> None:
         """
 
@@ -61,18 +77,29 @@ class Dataprep:
             False if the Dataprep object is being used for standard dataprep.
         impl_cell : str
             The top level cell name.
+        output_arrays : bool = False
+            True to return the dataprepped polygons as one polygon array per layer (polygon_array_list).
+            False to return one polygon_list entry per polygon.
+        prepared_layers : Optional[PreparedLayers] = None
+            The layer sorted content and converted input polygons shared with the other dataprep runs on
+            content_list_flat. If None, the layers are prepared for this run only.
+        collect_stats : bool = False
+            True to record the geometry statistics of each layer after each step in geometry_stats.
 
         """
         self.photonic_tech_info: PhotonicTechInfo = photonic_tech_info
         self.grid = grid
         self.content_list_flat: "ContentList" = content_list_flat
         self.is_lsf = is_lsf
+        self.output_arrays = output_arrays
 
-        # Sort the flattened content list into the different layers
-        start = time.time()
-        self.content_list_flat_sorted_by_layer = content_list_flat.sort_content_list_by_layers()
-        end = time.time()
-        logging.info(f'Sorting flat content list by layer took {end - start:.4g}s')
+        # Sort the flattened content list into the different layers, reusing the sort of previous runs if available
+        if prepared_layers is None:
+            prepared_layers = PreparedLayers(content_list_flat)
+        elif prepared_layers.content_list_flat is not content_list_flat:
+            raise ValueError(f'prepared_layers were not prepared from the content list of cell {impl_cell}')
+        self.prepared_layers = prepared_layers
+        self.content_list_flat_sorted_by_layer = self.prepared_layers.content_list_flat_sorted_by_layer
 
         self.global_grid_size = self.photonic_tech_info.global_grid_size
         self.global_rough_grid_size = self.photonic_tech_info.global_rough_grid_size
@@ -84,6 +111,22 @@ class Dataprep:
         self.offset_tolerance = 4.35250
         self.do_cleanup = True
 
+        # Layers whose input polygons are simplified before dataprep, and the maximum deviation allowed on each
+        self.simplify_tolerance_per_layer: Dict[str, float] = \
+            self.photonic_tech_info.dataprep_routine_data.get('simplify_tolerance_per_layer', None) or {}
+        for layer, tolerance in self.simplify_tolerance_per_layer.items():
+            if tolerance > self.global_grid_size:
+                raise ValueError(f'simplify_tolerance_per_layer tolerance {tolerance} on layer {layer} must not be '
+                                 f'larger than GlobalGridSize {self.global_grid_size}')
+        if self.simplify_tolerance_per_layer and simplify_pointlists is None:
+            raise ValueError('simplify_tolerance_per_layer requires Shapely >= 2.0 to be installed')
+
+        # 'offset' sizes the shapes with polygon offsets, 'raster' sizes them on a mask of the rough grid
+        self.rough_add_mode = self.photonic_tech_info.dataprep_routine_data.get('RoughAddMode', 'offset')
+        if self.rough_add_mode not in ROUGH_ADD_MODES:
+            raise ValueError(f'RoughAddMode {self.rough_add_mode} is not supported. '
+                             f'Valid modes are {ROUGH_ADD_MODES}')
+
         # In skill, all shapes are created already-manhattanized.
         # Either we must do this (and can then set GLOBAL_DO_MANH_AT_BEGINNING to false, or must manhattanize here to
         #  replicate skill dataprep output)
@@ -103,6 +146,8 @@ class Dataprep:
         self.flat_gdspy_polygonsets_by_layer: Dict[Tuple[str, str], Union[gdspy.PolygonSet, gdspy.Polygon]] = {}
         # Dictionary of layer-keyed polygon point-lists (lists of points comprising the polygons on the layer)
         self.post_dataprep_polygon_pointlist_by_layer: Dict[Tuple[str, str], List] = {}
+        # Dictionary of layer-keyed polygon array content items, used instead of the pointlists when output_arrays
+        self.post_dataprep_polygon_arrays_by_layer: Dict[Tuple[str, str], Dict] = {}
         # BAG style content list after dataprep
         self.content_list_flat_post_dataprep: "ContentList" = None
 
@@ -167,6 +212,13 @@ class Dataprep:
 
         # cache list of polygons
         self.polygon_cache: Dict[Tuple, Union[gdspy.Polygon, gdspy.PolygonSet]] = {}
+        # Layer-keyed [vertices before, vertices after] counts of the input simplification
+        self.simplify_vertex_counts_by_layer: Dict[Tuple[str, str], List[int]] = {}
+        # Layer-keyed [vertices before, vertices after] counts of the 'manh' operations
+        self.manh_vertex_counts_by_layer: Dict[Tuple[str, str], List[int]] = {}
+        # Polygon count, vertex count, maximum vertices per polygon and bounding box area of a layer after each step
+        self.collect_stats = collect_stats
+        self.geometry_stats: List[Dict] = []
 
         # Set the cell name for flattened gds output
         if not isinstance(impl_cell, str):
@@ -453,7 +505,10 @@ class Dataprep:
         if fracture:
             start = time.time()
             # TODO: Magic numbers
-            polygon_gdspy = polygon_gdspy_in.fracture(max_points=4094, precision=self.global_grid_size)
+            # Manhattan polygons are decomposed along horizontal slabs, only the others go through gdspy's fracture
+            polygon_gdspy = gdspy.PolygonSet(
+                fracture_pointlists(polygon_gdspy_in.polygons, max_points=4094, resolution=self.global_grid_size)
+            )
             end = time.time()
             dataprep_logger.debug(f'polyop_gdspy_to_point_list: fracturing took: {end-start}s')
         else:
@@ -483,6 +538,53 @@ class Dataprep:
 
         return output_list_of_coord_lists
 
+    @staticmethod
+    def count_vertices_gdspy(polygon: Union[gdspy.Polygon, gdspy.PolygonSet, None],
+                             ) -> int:
+        """
+        Returns the total number of vertices of a gdspy Polygon/PolygonSet, 0 for None.
+        """
+        if polygon is None:
+            return 0
+        return sum(len(points) for points in polygon.polygons)
+
+    @staticmethod
+    def geometry_stats_gdspy(polygon: Union[gdspy.Polygon, gdspy.PolygonSet, None],
+                             ) -> Dict[str, float]:
+        """
+        Returns the polygon count, vertex count, maximum vertices per polygon and bounding box area of a gdspy
+        Polygon/PolygonSet.
+        """
+        vertex_counts = [len(points) for points in polygon.polygons] if polygon is not None else []
+        bbox = polygon.get_bounding_box() if vertex_counts else None
+        return dict(polygon_count=len(vertex_counts),
+                    vertex_count=sum(vertex_counts),
+                    max_vertices=max(vertex_counts, default=0),
+                    bbox_area=0.0 if bbox is None else float(np.prod(bbox[1] - bbox[0])),
+                    )
+
+    def record_geometry_stats(self,
+                              step: str,
+                              layer: "lpp_type",
+                              polygon: Union[gdspy.Polygon, gdspy.PolygonSet, None],
+                              operation: Optional[str] = None,
+                              lpp_in: Optional["lpp_type"] = None,
+                              amount: Union[float, Tuple[float, float], None] = None,
+                              ) -> None:
+        """ Records the geometry statistics of the shapes of a layer after a dataprep step """
+        self.geometry_stats.append(dict(step=step, layer=layer, operation=operation, lpp_in=lpp_in, amount=amount,
+                                        **self.geometry_stats_gdspy(polygon)))
+
+    @staticmethod
+    def count_polygons_gdspy(polygon: Union[gdspy.Polygon, gdspy.PolygonSet, None],
+                             ) -> int:
+        """
+        Returns the number of polygons of a gdspy Polygon/PolygonSet, 0 for None.
+        """
+        if polygon is None:
+            return 0
+        return len(polygon.polygons)
+
     ################################################################################
     # Manhattanization related functions
     ################################################################################
@@ -614,6 +716,7 @@ class Dataprep:
                    poly_coords: Union[List[Tuple[float, float]], np.ndarray],
                    manh_grid_size: float,
                    manh_type: str,
+                   max_deviation: Optional[float] = None,
                    ) -> np.ndarray:
         """
         Convert a polygon into a polygon with orthogonal edges (ie, performs Manhattanization)
@@ -628,6 +731,9 @@ class Dataprep:
             'inc' : the Manhattanized polygon is larger compared to the one on the manh grid
             'dec' : the Manhattanized polygon is smaller compared to the one on the manh grid
             'non' : additional feature, only map the coords to the manh grid but do no Manhattanization
+        max_deviation : Optional[float]
+            If specified, use the coarsest steps that keep the Manhattanized outline within max_deviation of the
+            original one, instead of one step per manh_grid_size
 
         Returns
         ----------
@@ -653,15 +759,25 @@ class Dataprep:
         else:
             poly_coords_ori = np.array(poly_coords)
 
+        # Formatting the coordinate arrays is expensive on large polygons, only do it when it will be logged
+        log_coords = dataprep_logger.isEnabledFor(logging.DEBUG)
         dataprep_logger.debug(f'in manh_skill, manh_grid_size: {manh_grid_size}')
-        dataprep_logger.debug(f'in manh_skill, poly_coords before mapping to manh grid: {poly_coords_ori}')
+        if log_coords:
+            dataprep_logger.debug(f'in manh_skill, poly_coords before mapping to manh grid: {poly_coords_ori}')
 
         if poly_coords_ori.size == 0:
             return poly_coords_ori
 
+        if max_deviation is not None and manh_type != 'non':
+            poly_coords_adaptive = manh_adaptive(poly_coords_ori, manh_grid_size, max_deviation, manh_type)
+            # Self-intersecting adaptive outlines are Manhattanized with one step per grid instead
+            if poly_coords_adaptive is not None:
+                return poly_coords_adaptive
+
         poly_coords_manhgrid = manh_grid_size * np.round(poly_coords_ori / manh_grid_size)
 
-        dataprep_logger.debug(f'in manh_skill, poly_coords after mapping to manh grid: {poly_coords_manhgrid}')
+        if log_coords:
+            dataprep_logger.debug(f'in manh_skill, poly_coords after mapping to manh grid: {poly_coords_manhgrid}')
 
         # poly_coords_manhgrid = self.coords_cleanup(poly_coords_manhgrid)
         poly_coords_manhgrid = self.merge_adjacent_duplicate(poly_coords_manhgrid)
@@ -749,6 +865,7 @@ class Dataprep:
                    polygon_gdspy: Union[gdspy.Polygon, gdspy.PolygonSet, None],
                    manh_grid_size: float,
                    do_manh: bool,
+                   max_deviation: Optional[float] = None,
                    ) -> Union[gdspy.Polygon, gdspy.PolygonSet]:
         """
         Performs Manhattanization on a gdspy representation of a polygon, and returns a gdspy representation of the
@@ -762,6 +879,8 @@ class Dataprep:
             grid size for Manhattanization, edge length after Manhattanization should be larger than it
         do_manh : bool
             True to perform Manhattanization
+        max_deviation : Optional[float]
+            If specified, Manhattanize adaptively with steps that stay within max_deviation of the original outline
 
         Returns
         -------
@@ -778,13 +897,13 @@ class Dataprep:
         if polygon_gdspy is None:
             polygon_out = None
         elif isinstance(polygon_gdspy, gdspy.Polygon):
-            coord_list = self.manh_skill(polygon_gdspy.points, manh_grid_size, manh_type)
+            coord_list = self.manh_skill(polygon_gdspy.points, manh_grid_size, manh_type, max_deviation)
             polygon_out = self.dataprep_cleanup_gdspy(gdspy.Polygon(coord_list),
                                                       do_cleanup=self.do_cleanup)
         elif isinstance(polygon_gdspy, gdspy.PolygonSet):
             polygon_list = []
             for poly in polygon_gdspy.polygons:
-                coord_list = self.manh_skill(poly, manh_grid_size, manh_type)
+                coord_list = self.manh_skill(poly, manh_grid_size, manh_type, max_deviation)
                 polygon_list.append(coord_list)
             polygon_out = self.dataprep_cleanup_gdspy(gdspy.PolygonSet(polygon_list),
                                                       do_cleanup=self.do_cleanup)
@@ -923,6 +1042,117 @@ class Dataprep:
 
         return polygon_roughsized
 
+    def dataprep_roughsize_raster(self,
+                                  polygon: Union[gdspy.Polygon, gdspy.PolygonSet, None],
+                                  size_amount: float,
+                                  do_manh: bool,
+                                  ) -> Union[gdspy.Polygon, gdspy.PolygonSet, None]:
+        """
+        Raster implementation of dataprep_roughsize_gdspy.
+        The shapes are painted on a mask whose cells are the global rough grid. Every cell overlapped by a shape is
+        set, then the mask is dilated by 2x and eroded by 1x the global rough grid size, which replaces the
+        oversize / undersize / Manhattanize sequence of the offset implementation. The mask is converted back to
+        rectangles. The remaining oversize by 'size_amount' less 2x the global rough grid size is a further dilation
+        of the mask when it is a multiple of the rough grid, and a polygon oversize of the coarse shapes otherwise.
+
+        The result is Manhattan and on the rough grid by construction. It covers the output of the offset
+        implementation, and can extend up to about two rough grid cells beyond it along curved or diagonal edges,
+        where the square dilation grows faster than a polygon offset. The cost depends on the shape area and perimeter
+        measured in rough grid cells rather than on the number of vertices.
+
+        Parameters
+        ----------
+        polygon : Union[gdspy.Polygon, gdspy.PolygonSet, None]
+            polygon to be used as the base shape for the rough add, in gdspy representation
+        size_amount : float
+            amount to oversize (undersize is not supported, will be set to 0 if negative) the rough added shape
+        do_manh : bool
+            Unused, the raster output is always Manhattan
+
+        Returns
+        -------
+        polygon_roughsized : Union[gdspy.Polygon, gdspy.PolygonSet, None]
+            the rough added polygon shapes, in gdspy representation
+        """
+        if polygon is None:
+            return None
+
+        # Oversizing Manhattan shapes by a whole number of rough grid cells is a dilation of the mask
+        extra_size = max(size_amount - 2 * self.global_rough_grid_size, 0)
+        grow_cells = int(round(extra_size / self.global_rough_grid_size))
+        if abs(extra_size - grow_cells * self.global_rough_grid_size) > self.global_grid_size / 2:
+            grow_cells = 0
+
+        rects = rough_raster_rectangles(
+            self.polyop_gdspy_to_point_list(polygon, fracture=False, do_manh=False),
+            grid_size=self.global_rough_grid_size,
+            dilate_cells=2,
+            erode_cells=1,
+            eps=self.global_grid_size / 2,
+            grow_cells=grow_cells,
+        )
+        if not len(rects):
+            return None
+
+        polygon_roughsized = self.dataprep_rects_to_gdspy(
+            self.global_grid_size * np.round(rects / self.global_grid_size)
+        )
+
+        extra_size -= grow_cells * self.global_rough_grid_size
+        if extra_size > self.global_grid_size / 2:
+            polygon_roughsized = self.dataprep_oversize_gdspy(polygon_roughsized, extra_size)
+
+        return polygon_roughsized
+
+    def dataprep_rects_to_gdspy(self,
+                                rects: np.ndarray,
+                                ) -> Union[gdspy.Polygon, gdspy.PolygonSet, None]:
+        """
+        Merges rectangles into gdspy polygons with a single offset by 0, which clipper handles much faster than a
+        boolean 'or' over many touching rectangles.
+
+        Parameters
+        ----------
+        rects : np.ndarray
+            (M, 4) array of [left, bottom, right, top] rectangles, with coordinates on the global grid
+
+        Returns
+        -------
+        polygon_out : Union[gdspy.Polygon, gdspy.PolygonSet, None]
+            The union of the rectangles
+        """
+        if not len(rects):
+            return None
+        left, bottom, right, top = rects.T
+        rect_pointlists = np.stack([left, bottom, right, bottom, right, top, left, top], axis=1).reshape(-1, 4, 2)
+        return self.dataprep_cleanup_gdspy(gdspy.PolygonSet(list(rect_pointlists)), do_cleanup=True)
+
+    @staticmethod
+    def dataprep_boolean_gdspy(polygon1: Union[gdspy.Polygon, gdspy.PolygonSet, None],
+                               polygon2: Union[gdspy.Polygon, gdspy.PolygonSet, None],
+                               operation: str,
+                               ) -> Union[gdspy.Polygon, gdspy.PolygonSet, None]:
+        """
+        Performs a boolean operation between two polygons.
+        All booleans in poly_operation go through this method so that alternative engines only need to override it.
+
+        Parameters
+        ----------
+        polygon1 : Union[gdspy.Polygon, gdspy.PolygonSet, None]
+            The first operand, in gdspy representation
+        polygon2 : Union[gdspy.Polygon, gdspy.PolygonSet, None]
+            The second operand, in gdspy representation
+        operation : str
+            The boolean operation to perform: 'or', 'and', 'xor' or 'not' (polygon1 - polygon2)
+
+        Returns
+        -------
+        polygon_out : Union[gdspy.Polygon, gdspy.PolygonSet, None]
+            The result of the boolean operation, in gdspy representation
+        """
+        return gdspy.fast_boolean(polygon1, polygon2, operation)
+
+    @traced('dataprep.poly_operation')
     def poly_operation(self,
                        lpp_in: Union[str, Tuple[str, str]],
                        lpp_out: Union[str, Tuple[str, str]],
@@ -964,6 +1194,7 @@ class Dataprep:
         polygons_out : Union[gdspy.Polygon, gdspy.PolygonSet, None]
             The new polygons present on the output layer
         """
+        annotate(operation=operation, lpp_in=lpp_in, lpp_out=lpp_out, amount=size_amount)
 
         # If there are no shapes to operate on, return the shapes currently on the output layer
         # This is not the case if the operation is 'and'
@@ -980,11 +1211,19 @@ class Dataprep:
                     polygon=self.gdspy_manh(
                         polygon_gdspy=polygon2,
                         manh_grid_size=size_amount,
-                        do_manh=True  # TODO: Remove this argument?
+                        do_manh=True,  # TODO: Remove this argument?
+                        max_deviation=self.get_manhattanization_tolerance_on_layer(lpp_in),
                     ),
                     do_cleanup=self.do_cleanup
                 )
 
+                n_before = self.count_vertices_gdspy(polygon2)
+                n_after = self.count_vertices_gdspy(polygon_out)
+                logging.info(f'Manhattanization of {lpp_in} changed the vertex count from {n_before} to {n_after}')
+                vertex_counts = self.manh_vertex_counts_by_layer.setdefault(lpp_in, [0, 0])
+                vertex_counts[0] += n_before
+                vertex_counts[1] += n_after
+
             elif operation == 'rad':
                 # Rough add the shape
 
@@ -993,24 +1232,28 @@ class Dataprep:
                     polygon_rough_sized = self.polygon_cache[polygon_key]
                 else:
                     # Need to compute the roughadd shape and update the cache
-                    polygon_rough_sized = self.dataprep_roughsize_gdspy(polygon2,
-                                                                        size_amount=size_amount,
-                                                                        do_manh=do_manh_in_rad)
+                    if self.rough_add_mode == 'raster':
+                        roughsize_func = self.dataprep_roughsize_raster
+                    else:
+                        roughsize_func = self.dataprep_roughsize_gdspy
+                    polygon_rough_sized = roughsize_func(polygon2,
+                                                         size_amount=size_amount,
+                                                         do_manh=do_manh_in_rad)
                     self.polygon_cache[polygon_key] = polygon_rough_sized
 
                 if polygon1 is None:
                     polygon_out = polygon_rough_sized
                 else:
-                    polygon_out = gdspy.fast_boolean(polygon1, polygon_rough_sized, 'or')
+                    polygon_out = self.dataprep_boolean_gdspy(polygon1, polygon_rough_sized, 'or')
                     polygon_out = self.dataprep_cleanup_gdspy(polygon_out, do_cleanup=self.do_cleanup)
 
             elif operation == 'add':
                 if polygon1 is None:
                     polygon_out = self.dataprep_oversize_gdspy(polygon2, size_amount)
                 else:
-                    polygon_out = gdspy.fast_boolean(polygon1,
-                                                     self.dataprep_oversize_gdspy(polygon2, size_amount),
-                                                     'or')
+                    polygon_out = self.dataprep_boolean_gdspy(polygon1,
+                                                              self.dataprep_oversize_gdspy(polygon2, size_amount),
+                                                              'or')
                     polygon_out = self.dataprep_cleanup_gdspy(polygon_out, do_cleanup=self.do_cleanup)
 
             elif operation == 'sub':
@@ -1018,9 +1261,9 @@ class Dataprep:
                     polygon_out = None
                 else:
                     # returns polygon1 - polygon2
-                    polygon_out = gdspy.fast_boolean(polygon1,
-                                                     self.dataprep_oversize_gdspy(polygon2, size_amount),
-                                                     'not')
+                    polygon_out = self.dataprep_boolean_gdspy(polygon1,
+                                                              self.dataprep_oversize_gdspy(polygon2, size_amount),
+                                                              'not')
                     polygon_out = self.dataprep_cleanup_gdspy(polygon_out, self.do_cleanup)
 
             elif operation == 'and':
@@ -1028,18 +1271,18 @@ class Dataprep:
                 if polygon1 is None or polygon2 is None:
                     polygon_out = None
                 else:
-                    polygon_out = gdspy.fast_boolean(polygon1,
-                                                     self.dataprep_oversize_gdspy(polygon2, size_amount),
-                                                     'and')
+                    polygon_out = self.dataprep_boolean_gdspy(polygon1,
+                                                              self.dataprep_oversize_gdspy(polygon2, size_amount),
+                                                              'and')
                     polygon_out = self.dataprep_cleanup_gdspy(polygon_out, self.do_cleanup)
 
             elif operation == 'xor':
                 if polygon1 is None:
                     polygon_out = self.dataprep_oversize_gdspy(polygon2, size_amount)
                 else:
-                    polygon_out = gdspy.fast_boolean(polygon1,
-                                                    self.dataprep_oversize_gdspy(polygon2, size_amount),
-                                                    'xor')
+                    polygon_out = self.dataprep_boolean_gdspy(polygon1,
+                                                              self.dataprep_oversize_gdspy(polygon2, size_amount),
+                                                              'xor')
                 polygon_out = self.dataprep_cleanup_gdspy(polygon_out, self.do_cleanup)
 
             elif operation == 'ext':
@@ -1052,18 +1295,18 @@ class Dataprep:
 
                 polygon_ref_sized = self.dataprep_oversize_gdspy(polygon_ref, extended_amount)
                 polygon_extended = self.dataprep_oversize_gdspy(polygon_toextend, extended_amount)
-                polygon_extra = self.dataprep_cleanup_gdspy(gdspy.fast_boolean(polygon_extended,
-                                                                               polygon_ref,
-                                                                               'not'),
+                polygon_extra = self.dataprep_cleanup_gdspy(self.dataprep_boolean_gdspy(polygon_extended,
+                                                                                        polygon_ref,
+                                                                                        'not'),
                                                             do_cleanup=self.do_cleanup)
-                polygon_toadd = self.dataprep_cleanup_gdspy(gdspy.fast_boolean(polygon_extra,
-                                                                               polygon_ref_sized,
-                                                                               'and'),
+                polygon_toadd = self.dataprep_cleanup_gdspy(self.dataprep_boolean_gdspy(polygon_extra,
+                                                                                        polygon_ref_sized,
+                                                                                        'and'),
                                                             do_cleanup=self.do_cleanup)
 
-                polygon_out = self.dataprep_cleanup_gdspy(gdspy.fast_boolean(polygon_toextend,
-                                                                             polygon_toadd,
-                                                                             'or'),
+                polygon_out = self.dataprep_cleanup_gdspy(self.dataprep_boolean_gdspy(polygon_toextend,
+                                                                                      polygon_toadd,
+                                                                                      'or'),
                                                           do_cleanup=self.do_cleanup)
 
                 # TODO: replace 1.1 with non-magic number
@@ -1107,6 +1350,12 @@ class Dataprep:
             if lpp_out in [key[0] for key in self.polygon_cache.keys()]:
                 self.polygon_cache.pop(polygon_key, None)
 
+            if self.collect_stats:
+                self.record_geometry_stats('ouuo' if operation == 'ouo' else 'operation', lpp_out, polygon_out,
+                                           operation=operation, lpp_in=lpp_in, amount=size_amount)
+            if tracer.recording:
+                annotate(polygon_count=self.count_polygons_gdspy(polygon_out),
+                         vertex_count=self.count_vertices_gdspy(polygon_out))
             return polygon_out
 
     ################################################################################
@@ -1131,6 +1380,82 @@ class Dataprep:
         content = self.get_content_on_layer(layer)
         return self.to_polygon_pointlist_from_content_list(content_list=content)
 
+    def simplify_polygon_point_lists(self,
+                                     layer: Tuple[str, str],
+                                     pos_neg_list_list: Tuple[List, List],
+                                     ) -> Tuple[List, List]:
+        """
+        Simplifies the positive and negative polygons of a layer with its tolerance in simplify_tolerance_per_layer.
+        Paths and rounds are discretized much finer than the grid, this removes the vertices that do not change the
+        shapes by more than the tolerance before they go through the boolean and offset operations.
+        Layers without a tolerance are returned unchanged.
+
+        Parameters
+        ----------
+        layer : Tuple[str, str]
+            The layer purpose pair the polygons are on
+        pos_neg_list_list : Tuple[List, List]
+            The lists of positive shape and negative shape (holes) polygon boundaries
+
+        Returns
+        -------
+        positive_polygon_pointlist, negative_polygon_pointlist : Tuple[List, List]
+            The simplified lists of positive and negative polygon boundaries
+        """
+        if layer[0] not in self.simplify_tolerance_per_layer:
+            return pos_neg_list_list
+
+        start = time.time()
+        tolerance = self.simplify_tolerance_per_layer[layer[0]]
+        simplified = tuple(simplify_pointlists(pointlists, tolerance) for pointlists in pos_neg_list_list)
+
+        n_before = sum(len(points) for pointlists in pos_neg_list_list for points in pointlists)
+        n_after = sum(len(points) for pointlists in simplified for points in pointlists)
+        self.simplify_vertex_counts_by_layer[layer] = [n_before, n_after]
+        end = time.time()
+        logging.info(f'Simplifying {layer} with tolerance {tolerance} reduced the vertex count from {n_before} to '
+                     f'{n_after} in {end - start:.4g}s')
+
+        return simplified
+
+    def get_prepared_polygons_on_layer(self,
+                                       layer: Tuple[str, str],
+                                       ) -> Union[gdspy.PolygonSet, gdspy.Polygon]:
+        """
+        Returns the shapes of a layer converted to gdspy format, before any dataprep operation.
+        The conversion is looked up in prepared_layers first, and stored there for the next dataprep runs otherwise.
+
+        Parameters
+        ----------
+        layer : Tuple[str, str]
+            The layer purpose pair to convert
+
+        Returns
+        -------
+        polygons : Union[gdspy.PolygonSet, gdspy.Polygon]
+            The converted shapes on the layer
+        """
+        manh_grid_size = self.get_manhattanization_size_on_layer(layer)
+        key = (type(self), layer, self.global_grid_size, manh_grid_size, self.GLOBAL_DO_MANH_AT_BEGINNING,
+               self.simplify_tolerance_per_layer.get(layer[0], None))
+
+        entry = self.prepared_layers.get_polygons(key)
+        if entry is not None:
+            polygons, simplify_vertex_counts = entry
+            logging.info(f'Reusing the prepared {layer} content')
+        else:
+            polygons = self.dataprep_coord_to_gdspy(
+                self.simplify_polygon_point_lists(layer, self.get_polygon_point_lists_on_layer(layer)),
+                manh_grid_size=manh_grid_size,
+                do_manh=self.GLOBAL_DO_MANH_AT_BEGINNING,  # TODO: Remove this argument?
+            )
+            simplify_vertex_counts = self.simplify_vertex_counts_by_layer.get(layer, None)
+            self.prepared_layers.store_polygons(key, polygons, simplify_vertex_counts)
+
+        if simplify_vertex_counts is not None:
+            self.simplify_vertex_counts_by_layer[layer] = simplify_vertex_counts
+        return polygons
+
     def get_content_on_layer(self,
                              layer: Tuple[str, str],
                              ) -> "ContentList":
@@ -1174,55 +1499,58 @@ class Dataprep:
 
         Notes
         -----
-        No need to loop over content_list, as dataprep only handles a single master at a time
-        No need to handle instance looping, as there are no instances in the flattened content list
+        The shapes are first converted into a single vertex buffer by to_polygon_arrays_from_content_list.
+        The returned pointlists are (n, 2) array views into that buffer.
         """
+        (pos_vertices, pos_offsets), (neg_vertices, neg_offsets) = self.to_polygon_arrays_from_content_list(
+            content_list
+        )
+        pos_bounds = pos_offsets.tolist()
+        neg_bounds = neg_offsets.tolist()
+        positive_polygon_pointlist = [pos_vertices[i:j] for i, j in zip(pos_bounds[:-1], pos_bounds[1:])]
+        negative_polygon_pointlist = [neg_vertices[i:j] for i, j in zip(neg_bounds[:-1], neg_bounds[1:])]
 
-        positive_polygon_pointlist = []
-        negative_polygon_pointlist = []
-
-        start = time.time()
-
-        # add rectangles
-        for rect in content_list.rect_list:
-            nx, ny = rect.get('arr_nx', 1), rect.get('arr_ny', 1)
-            if nx > 1 or ny > 1:
-                polygon_pointlist_pos_neg = PhotonicRect.polygon_pointlist_export(
-                    rect['bbox'], nx, ny,
-                    spx=rect['arr_spx'], spy=rect['arr_spy']
-                )
-            else:
-                polygon_pointlist_pos_neg = PhotonicRect.polygon_pointlist_export(
-                    rect['bbox']
-                )
+        return positive_polygon_pointlist, negative_polygon_pointlist
 
-            positive_polygon_pointlist.extend(polygon_pointlist_pos_neg[0])
-            negative_polygon_pointlist.extend(polygon_pointlist_pos_neg[1])
+    def to_polygon_arrays_from_content_list(self,
+                                            content_list: "ContentList",
+                                            ) -> Tuple[Tuple[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]:
+        """
+        Convert the provided content list into a contiguous vertex buffer for the positive shapes and one for the
+        negative shapes (holes). The vertices of all polygons are stored back to back in an (N, 2) array, and
+        polygon i is made of the vertices between offsets[i] and offsets[i + 1].
+        All shapes in the passed content list are converted, regardless of layer.
 
-        # add vias
-        for via in content_list.via_list:
-            pass
+        Parameters
+        ----------
+        content_list : ContentList
+            The content list to be converted
 
-        # add pins
-        for pin in content_list.pin_list:
-            pass
+        Returns
+        -------
+        (positive_vertices, positive_offsets), (negative_vertices, negative_offsets) : Tuple[Tuple, Tuple]
+            The vertex buffers and polygon offsets of the positive and negative shapes
 
-        for path in content_list.path_list:
-            # Treat like polygons
-            polygon_pointlist_pos_neg = PhotonicPolygon.polygon_pointlist_export(path['polygon_points'])
-            positive_polygon_pointlist.extend(polygon_pointlist_pos_neg[0])
-            negative_polygon_pointlist.extend(polygon_pointlist_pos_neg[1])
+        Notes
+        -----
+        No need to loop over content_list, as dataprep only handles a single master at a time
+        No need to handle instance looping, as there are no instances in the flattened content list
+        Vias, pins, blockages and boundaries are not converted
+        """
+        start = time.time()
 
-        for blockage in content_list.blockage_list:
-            pass
+        vertex_chunks = []
+        length_chunks = []
 
-        for boundary in content_list.boundary_list:
-            pass
+        # add rectangles. All rectangles and their array copies are expanded at once
+        if len(content_list.rect_list):
+            rect_vertices = self.rect_list_to_vertices(content_list.rect_list)
+            vertex_chunks.append(rect_vertices.reshape(-1, 2))
+            length_chunks.append(np.full(len(rect_vertices), 4, dtype=np.int64))
 
-        for polygon in content_list.polygon_list:
-            polygon_pointlist_pos_neg = PhotonicPolygon.polygon_pointlist_export(polygon['points'])
-            positive_polygon_pointlist.extend(polygon_pointlist_pos_neg[0])
-            negative_polygon_pointlist.extend(polygon_pointlist_pos_neg[1])
+        # Paths, polygons and rounds are already point lists. They are gathered and flattened into one buffer
+        pointlists = [path['polygon_points'] for path in content_list.path_list]
+        pointlists.extend(polygon['points'] for polygon in content_list.polygon_list)
 
         for round_obj in content_list.round_list:
             polygon_pointlist_pos_neg = PhotonicRound.polygon_pointlist_export(
@@ -1231,20 +1559,102 @@ class Dataprep:
                 theta0=round_obj['theta0'],
                 theta1=round_obj['theta1'],
                 center=round_obj['center'],
-                nx=round_obj.get('nx', 1),
-                ny=round_obj.get('ny', 1),
-                spx=round_obj.get('spx', 0.0),
-                spy=round_obj.get('spy', 0.0),
+                nx=round_obj.get('arr_nx', 1),
+                ny=round_obj.get('arr_ny', 1),
+                spx=round_obj.get('arr_spx', 0.0),
+                spy=round_obj.get('arr_spy', 0.0),
                 resolution=self.grid.resolution,
             )
+            pointlists.extend(polygon_pointlist_pos_neg[0])
+
+        if pointlists:
+            lengths = np.fromiter(map(len, pointlists), dtype=np.int64, count=len(pointlists))
+            num_coords = 2 * int(lengths.sum())
+            vertex_chunks.append(
+                np.fromiter(chain.from_iterable(chain.from_iterable(pointlists)), dtype=float, count=num_coords
+                            ).reshape(-1, 2)
+            )
+            length_chunks.append(lengths)
 
-            positive_polygon_pointlist.extend(polygon_pointlist_pos_neg[0])
-            negative_polygon_pointlist.extend(polygon_pointlist_pos_neg[1])
+        # Polygon arrays are already vertex buffers
+        for polygon_array in content_list.polygon_array_list:
+            vertex_chunks.append(np.asarray(polygon_array['vertices'], dtype=float).reshape(-1, 2))
+            length_chunks.append(np.diff(np.asarray(polygon_array['offsets'], dtype=np.int64)))
+
+        positive_arrays = self.vertex_chunks_to_buffer(vertex_chunks, length_chunks)
+        # None of the supported shapes currently produce negative shapes
+        negative_arrays = self.vertex_chunks_to_buffer([], [])
 
         end = time.time()
-        logging.debug(f'Conversion from ContentList to polygon pointlist format took {end-start:.4g}')
+        logging.debug(f'Conversion from ContentList to polygon vertex buffer took {end-start:.4g}')
 
-        return positive_polygon_pointlist, negative_polygon_pointlist
+        return positive_arrays, negative_arrays
+
+    @staticmethod
+    def rect_list_to_vertices(rect_list: List[Dict]) -> np.ndarray:
+        """
+        Converts a list of rectangle content into the corner points of every rectangle, including each copy of
+        arrayed rectangles. Copies are ordered as in PhotonicRect.polygon_pointlist_export.
+
+        Parameters
+        ----------
+        rect_list : List[Dict]
+            The rectangle content items
+
+        Returns
+        -------
+        rect_vertices : np.ndarray
+            (M, 4, 2) array with the four corners of each of the M rectangles
+        """
+        num_rects = len(rect_list)
+        bbox = np.fromiter(chain.from_iterable(chain.from_iterable(rect['bbox'] for rect in rect_list)),
+                           dtype=float, count=4 * num_rects).reshape(-1, 4)
+        left, bottom, right, top = bbox.T
+
+        # Only arrayed rectangles carry the array keys in their content
+        arrayed_idx = [idx for idx, rect in enumerate(rect_list) if 'arr_nx' in rect or 'arr_ny' in rect]
+        if arrayed_idx:
+            nx = np.ones(num_rects, dtype=np.int64)
+            ny = np.ones(num_rects, dtype=np.int64)
+            spx = np.zeros(num_rects, dtype=float)
+            spy = np.zeros(num_rects, dtype=float)
+            for idx in arrayed_idx:
+                rect = rect_list[idx]
+                nx[idx], ny[idx] = rect.get('arr_nx', 1), rect.get('arr_ny', 1)
+                spx[idx], spy[idx] = rect.get('arr_spx', 0), rect.get('arr_spy', 0)
+
+            # Repeat every rectangle once per copy and shift each copy by its position in the array
+            counts = nx * ny
+            rect_idx = np.repeat(np.arange(num_rects), counts)
+            copy_idx = np.arange(len(rect_idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+            x_shift = (copy_idx // ny[rect_idx]) * spx[rect_idx]
+            y_shift = (copy_idx % ny[rect_idx]) * spy[rect_idx]
+            left, right = left[rect_idx] + x_shift, right[rect_idx] + x_shift
+            bottom, top = bottom[rect_idx] + y_shift, top[rect_idx] + y_shift
+
+        rect_vertices = np.empty((len(left), 4, 2), dtype=float)
+        rect_vertices[:, 0, 0] = left
+        rect_vertices[:, 0, 1] = bottom
+        rect_vertices[:, 1, 0] = right
+        rect_vertices[:, 1, 1] = bottom
+        rect_vertices[:, 2, 0] = right
+        rect_vertices[:, 2, 1] = top
+        rect_vertices[:, 3, 0] = left
+        rect_vertices[:, 3, 1] = top
+        return rect_vertices
+
+    @staticmethod
+    def vertex_chunks_to_buffer(vertex_chunks: List[np.ndarray],
+                                length_chunks: List[np.ndarray],
+                                ) -> Tuple[np.ndarray, np.ndarray]:
+        """ Concatenates chunks of vertices and polygon lengths into a single vertex buffer and offset array """
+        if not vertex_chunks:
+            return np.empty((0, 2), dtype=float), np.zeros(1, dtype=np.int64)
+
+        lengths = np.concatenate(length_chunks)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return np.concatenate(vertex_chunks, axis=0), offsets
 
     @staticmethod
     def polygon_list_by_layer_to_flat_content_list(poly_list_by_layer: Dict["lpp_type", List],
@@ -1292,6 +1702,42 @@ class Dataprep:
                            monitor_list=monitor_list
                            )
 
+    @staticmethod
+    def polygon_arrays_by_layer_to_flat_content_list(poly_arrays_by_layer: Dict["lpp_type", Dict],
+                                                     sim_list: List,
+                                                     source_list: List,
+                                                     monitor_list: List,
+                                                     impl_cell: str = '',
+                                                     ) -> "ContentList":
+        """
+        Converts a LPP-keyed dictionary of polygon array content items to a flat ContentList format.
+        The arrays are passed through as is, so that the exporters receive the dataprep output without copies.
+
+        Parameters
+        ----------
+        poly_arrays_by_layer : Dict[Tuple[str, str], Dict]
+            A dictionary containing the polygon array of all dataprepped polygons organized by layername
+        sim_list : List
+            The list of simulation boundary content
+        source_list : List
+            The list of source object content
+        monitor_list : List
+            The list of monitor object content
+        impl_cell : str
+            Name of cell in flat gds output
+
+        Returns
+        -------
+        flat_content_list : ContentList
+            The data in flat content-list-format.
+        """
+        return ContentList(cell_name=impl_cell,
+                           polygon_array_list=list(poly_arrays_by_layer.values()),
+                           sim_list=sim_list,
+                           source_list=source_list,
+                           monitor_list=monitor_list
+                           )
+
     def get_manhattanization_size_on_layer(self,
                                            layer: Union[str, Tuple[str, str]]
                                            ) -> float:
@@ -1326,6 +1772,33 @@ class Dataprep:
 
         return manh_size
 
+    def get_manhattanization_tolerance_on_layer(self,
+                                                layer: Union[str, Tuple[str, str]]
+                                                ) -> Optional[float]:
+        """
+        Finds the layer-specific maximum Manhattanization deviation.
+        Layers listed in the optional manh_tolerance_per_layer dictionary are Manhattanized adaptively, with the
+        coarsest steps that keep the outline within this distance of the original shape.
+
+        Parameters
+        ----------
+        layer : Union[str, Tuple[str, str]]
+            The layer or LPP being Manhattanized.
+
+        Returns
+        -------
+        max_deviation : Optional[float]
+            The maximum deviation for the layer, or None to Manhattanize with one step per Manhattanization grid.
+        """
+        if isinstance(layer, tuple):
+            layer = layer[0]
+
+        per_layer_tolerance = self.photonic_tech_info.dataprep_routine_data.get('manh_tolerance_per_layer', None)
+        if per_layer_tolerance is None:
+            return None
+
+        return per_layer_tolerance.get(layer, None)
+
     @staticmethod
     def regex_search_lpps(regex: Tuple[Pattern, Pattern],
                           keys: Iterable[Tuple[str, str]],
@@ -1379,11 +1852,13 @@ class Dataprep:
             if (layer[1] != 'port' and layer[1] != 'label' and layer[1] != 'sim') and (
                     layer not in self.dataprep_ignore_list and layer not in self.dataprep_bypass_list):
 
-                self.flat_gdspy_polygonsets_by_layer[layer] = self.dataprep_coord_to_gdspy(
-                    self.get_polygon_point_lists_on_layer(layer),
-                    manh_grid_size=self.get_manhattanization_size_on_layer(layer),
-                    do_manh=self.GLOBAL_DO_MANH_AT_BEGINNING,  # TODO: Remove this argument?
-                )
+                with span('dataprep.prepare_layer', layer=layer) as prepare_span:
+                    self.flat_gdspy_polygonsets_by_layer[layer] = self.get_prepared_polygons_on_layer(layer)
+                    if tracer.recording:
+                        prepare_span.set(polygon_count=self.count_polygons_gdspy(
+                            self.flat_gdspy_polygonsets_by_layer[layer]))
+                if self.collect_stats:
+                    self.record_geometry_stats('input', layer, self.flat_gdspy_polygonsets_by_layer[layer])
                 end = time.time()
                 logging.info(f'Converting {layer} content to gdspy took: {end - start}s')
             else:
@@ -1487,35 +1962,51 @@ class Dataprep:
         # 5) Take the dataprepped gdspy shapes and import them into a new post-dataprep content list
         start0 = time.time()
         logging.info(f'-------- Converting gdspy shapes to content list --------')
-        # TODO: Replace the below code by having polyop_gdspy_to_point_list directly draw the gds... ?
-        # TODO: IE, implement direct GDS export from dataprep to avoid going back to contentlist land
+        # With output_arrays, each layer is kept as a single polygon array that the exporters consume directly
         for layer, gdspy_polygons in self.flat_gdspy_polygonsets_by_layer.items():
             logging.info('Performing gdspy to point list conversion on {layer}')
             start = time.time()
-            # Convert gdspy polygonset to list of pointlists
-            output_shapes = self.polyop_gdspy_to_point_list(gdspy_polygons,
-                                                            fracture=False,
-                                                            do_manh=self.GLOBAL_DO_FINAL_MANH,
-                                                            manh_grid_size=self.grid.resolution,
-                                                            )
-            new_shapes = []
-            for shape in output_shapes:
-                shape = tuple(map(tuple, shape))
-                new_shapes.append([coord for coord in shape])
-            # Assign pointlists to a per-layer dictionary
-            self.post_dataprep_polygon_pointlist_by_layer[layer] = new_shapes
+            if self.collect_stats:
+                self.record_geometry_stats('output', layer, gdspy_polygons)
+            with span('dataprep.output_layer', layer=layer) as output_span:
+                # Convert gdspy polygonset to list of pointlists
+                output_shapes = self.polyop_gdspy_to_point_list(gdspy_polygons,
+                                                                fracture=False,
+                                                                do_manh=self.GLOBAL_DO_FINAL_MANH,
+                                                                manh_grid_size=self.grid.resolution,
+                                                                )
+                if self.output_arrays:
+                    self.post_dataprep_polygon_arrays_by_layer[layer] = polygon_array_from_pointlists(layer,
+                                                                                                      output_shapes)
+                else:
+                    new_shapes = []
+                    for shape in output_shapes:
+                        shape = tuple(map(tuple, shape))
+                        new_shapes.append([coord for coord in shape])
+                    # Assign pointlists to a per-layer dictionary
+                    self.post_dataprep_polygon_pointlist_by_layer[layer] = new_shapes
+                output_span.set(shape_count=len(output_shapes))
 
             end = time.time()
             logging.info(f'Converting {layer} from gdspy to point list took: {end - start}s')
 
         # Convert per-layer pointlist dictionary into content list format
-        self.content_list_flat_post_dataprep = self.polygon_list_by_layer_to_flat_content_list(
-            poly_list_by_layer=self.post_dataprep_polygon_pointlist_by_layer,
-            sim_list=self.content_list_flat.sim_list,
-            source_list=self.content_list_flat.source_list,
-            monitor_list=self.content_list_flat.monitor_list,
-            impl_cell=self.impl_cell
-        )
+        if self.output_arrays:
+            self.content_list_flat_post_dataprep = self.polygon_arrays_by_layer_to_flat_content_list(
+                poly_arrays_by_layer=self.post_dataprep_polygon_arrays_by_layer,
+                sim_list=self.content_list_flat.sim_list,
+                source_list=self.content_list_flat.source_list,
+                monitor_list=self.content_list_flat.monitor_list,
+                impl_cell=self.impl_cell
+            )
+        else:
+            self.content_list_flat_post_dataprep = self.polygon_list_by_layer_to_flat_content_list(
+                poly_list_by_layer=self.post_dataprep_polygon_pointlist_by_layer,
+                sim_list=self.content_list_flat.sim_list,
+                source_list=self.content_list_flat.source_list,
+                monitor_list=self.content_list_flat.monitor_list,
+                impl_cell=self.impl_cell
+            )
 
         # 6) Add shapes on layers from the bypass list back in
         # TODO: Properly support batch dataprep, i.e. cases where there are mulitple gds cells
@@ -1528,4 +2019,9 @@ class Dataprep:
         end0 = time.time()
         logging.info(f'Converting all layers from gdspy to point list took a total of: {end0 - start0}s')
 
+        for layer, (n_before, n_after) in self.simplify_vertex_counts_by_layer.items():
+            logging.info(f'Input simplification vertex count on {layer}: {n_before} before, {n_after} after')
+        for layer, (n_before, n_after) in self.manh_vertex_counts_by_layer.items():
+            logging.info(f'Manhattanization vertex count on {layer}: {n_before} before, {n_after} after')
+
         return self.content_list_flat_post_dataprep
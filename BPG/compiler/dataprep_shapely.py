@@ -1,224 +1,472 @@
-# import BPG
-# from bag.layout.util import BBox
-
-# from matplotlib import pyplot
-# from descartes import PolygonPatch
-# from shapely.ops import cascaded_union
-# from shapely.ops import polygonize, polygonize_full
-
-# import importlib
-# from figures import SIZE, BLUE, GRAY, set_limits
-from typing import Tuple, List, Union, Optional
-from math import ceil
-from shapely.geometry import Polygon, MultiPolygon
-from BPG.compiler.manh_shapely import polyop_manh
-from BPG.shapely_debug import shapely_plot
-
-
-################################################################################
-# define parameters for testing
-################################################################################
-global_grid_size = 0.001
-global_rough_grid_size = 0.01
-global_do_manh = True
-global_min_width = 0.02
-global_min_space = 0.05
-
-
-def dataprep_coord_to_poly(
-        pos_neg_list_list,  # type: Tuple[List[List[Tuple[float, float]]], List[List[Tuple[float, float]]]]
-        manh_grid_size,  # type: float
-        ):
-    # type: (...) -> Union[Polygon, MultiPolygon]
-    """
-    Converts list of coordinate lists into shapely polygon objects
+import time
+import logging
+import numpy as np
+import shapely
+from shapely.geometry.base import BaseGeometry
+
+from BPG.compiler.dataprep_gdspy import Dataprep, dataprep_logger
+from BPG.compiler.poly_simplify import pointlists_to_shapely, coord_to_shapely, shapely_to_gdspy, \
+    shapely_to_gdspy_polygon
+
+from typing import Dict, Tuple, List, Optional
+
+# The vectorized API (union_all, set_precision, STRtree.query with predicates) only exists in Shapely 2.x
+if not hasattr(shapely, 'union_all'):
+    raise ImportError(f'The shapely dataprep engine requires Shapely >= 2.0, found {shapely.__version__}')
 
-    Parameters
-    ----------
-    pos_neg_list_list
-    manh_grid_size
+# Boolean operations used by Dataprep.poly_operation, mapped to their GEOS implementation
+SHAPELY_BOOLEAN_OPERATIONS = {
+    'or': shapely.union,
+    'and': shapely.intersection,
+    'xor': shapely.symmetric_difference,
+    'not': shapely.difference,
+}
 
-    Returns
-    -------
+# Shapely geometry type id of a Polygon
+POLYGON_TYPE_ID = 3
 
+
+class DataprepShapely(Dataprep):
+    """
+    Dataprep engine backed by Shapely 2.x / GEOS.
+
+    Runs the same dataprep procedure as Dataprep, but each layer is held as a single shapely geometry instead of a
+    gdspy PolygonSet:
+     - All shapes on a layer are merged with one vectorized union, which is much faster than clipper on heavily
+       overlapping inputs
+     - Over/undersizing uses GEOS buffers with mitre joins
+     - Subtractions and intersections only operate on the parts of the layer found to overlap the other operand
+       through an STRtree query
+
+    The gdspy-named hooks of Dataprep are overridden, so the shared poly_operation and dataprep flow run unchanged.
+    The engine is selected with bpg_config: dataprep_engine: 'shapely'
     """
-    pos_coord_list_list = pos_neg_list_list[0]
-    neg_coord_list_list = pos_neg_list_list[1]
-
-    polygon_out = Polygon(pos_coord_list_list[0]).buffer(0, cap_style=3, join_style=2)
-
-    # print(pos_coord_list_list)
-    # asgege
-    if len(pos_coord_list_list) > 1:
-        for pos_coord_list in pos_coord_list_list[1:]:
-            polygon_pos = Polygon(pos_coord_list).buffer(0, cap_style=3, join_style=2)
-            polygon_out = polygon_out.union(polygon_pos)
-    if len(neg_coord_list_list):
-        for neg_coord_list in neg_coord_list_list:
-            polygon_neg = Polygon(neg_coord_list).buffer(0, cap_style=3, join_style=2)
-            polygon_out = polygon_out.difference(polygon_neg)
-
-    polygon_out = polyop_manh(polygon_out, do_manh=True, manh_grid_size=manh_grid_size)
-    return polygon_out
-
-def polyop_roughsize(polygon: Union[Polygon, MultiPolygon],
-                     size_amount: float,
-                     do_manh: bool
-                     ):
-
-    rough_grid_size = global_rough_grid_size
-
-    # oversize twice, then undersize twice and oversize again
-    polygon_oo = polyop_oversize(polygon, 2 * rough_grid_size)
-    polygon_oouu = polyop_undersize(polygon_oo, 2 * rough_grid_size)
-    polygon_oouuo = polyop_oversize(polygon_oouu, rough_grid_size)
-
-    # manhattanize to the rough grid
-    polygon_oouuo_rough = polyop_manh(polygon_oouuo, rough_grid_size, do_manh)
-
-    # undersize then oversize
-    polygon_roughsized = polyop_oversize(polyop_undersize(polygon_oouuo_rough, global_grid_size), global_grid_size)
-
-    polygon_roughsized = polyop_oversize(polygon_roughsized, max(size_amount - 2 * global_grid_size, 0))
-
-    return polygon_roughsized
-
-
-def polyop_oversize(polygon: Union[Polygon, MultiPolygon],
-                    offset: float
-                    ):
-    if offset < 0:
-        print('Warning: offset = %f < 0 indicates you are doing undersize')
-    polygon_oversized = polygon.buffer(offset, cap_style=3, join_style=2)
-    return polygon_oversized
-
-
-def polyop_undersize(polygon: Union[Polygon, MultiPolygon],
-                     offset: float
-                     ):
-    if offset < 0:
-        print('Warning: offset = %f < 0 indicates you are doing oversize')
-    polygon_undersized = polygon.buffer(-offset, cap_style=3, join_style=2)
-    return polygon_undersized
-
-
-def polyop_extend(polygon_toextend: Union[Polygon, Multipolygon],
-                  polygon_ref: Union[Polygon, MultiPolygon],
-                  extended_amount: float
-                  ):
-    grid_size = global_grid_size
-    extended_amount = grid_size * ceil(extended_amount / grid_size)
-    polygon_ref_sized = polyop_oversize(polygon_ref, extended_amount)
-    polygon_extended = polyop_oversize(polygon_toextend, extended_amount)
-    polygon_extra = polygon_extended.difference(polygon_ref)
-    polygon_toadd = polygon_extra.intersection(polygon_ref_sized)
-
-    polygon_out = polygon_toextend.union(polygon_toadd)
-    buffer_size = max(grid_size * ceil(0.5 * extended_amount / grid_size + 1.1), 0.0)
-    polygon_out = polyop_oversize(polyop_undersize(polygon_out, buffer_size), buffer_size)
-    return polygon_out
-
-
-def poly_operation(polygon1: Union[Polygon, Multipolygon],
-                   polygon2: Optional[Union[Polygon, MultiPolygon]],
-                   operation: str,
-                   size_amount: float,
-                   debug_text: bool = False
-                   ):
-    # TODO: clean up the input polygons first
-
-    grid_size = global_grid_size
-    if polygon2 is None:
-        return polygon1
-    else:
-        if operation == 'rad':
-            # if (need_new_rough_shapes == True):
-            #     polygon_rough = polyop_roughsize(polygon2)
-            #     need_new_rough_shapes == False
-            # TODO: manh
-            polygon_rough = polyop_roughsize(polygon2, size_amount=size_amount, do_manh=True)
-
-            buffer_size = max(size_amount - 2 * global_rough_grid_size, 0)
-            polygon_rough_sized = polyop_oversize(polygon_rough, buffer_size)
-
-            if polygon1 is None:
-                polygon_out = polygon_rough_sized
-            else:
-                polygon_out = polygon1.union(polygon_rough_sized)
-            # if (debug_text == True and leng(RoughShapes) > 0):
-            #     print("%L --> %L  %L rough shapes added."  %(LppIn, LppOut, list(len(RoughShapes))))
-
-        elif operation == 'add':
-            if polygon1 is None:
-                polygon_out = polyop_oversize(polygon2, size_amount)
-                shapely_plot(polygon_out)
-            else:
-                polygon_out = polygon1.union(polyop_oversize(polygon2, size_amount))
-                shapely_plot(polygon_out)
-            # if (debug_text == True and leng(ShapesIn) > 0):
-            #     print("%L --> %L  %L shapes added."  %(LppIn, LppOut, list(length(ShapesIn))))
-
-        elif operation == 'sub':
-            if polygon1 is None:
-                polygon_out = None
-            else:
-                # TODO: Over or undersize the subtracted poly
-                polygon_out = polygon1.difference(polyop_oversize(polygon2, size_amount))
-            # if (debug_text == True and leng(ShapesToSubtract) > 0):
-            #     print("%L --> %L  %L shapes subtracted."  %(LppIn, LppOut, list(length(ShapesToSubtract))))
-            # if polygon1.area == 0
-            #     print("Warning in 0ProcedureDataPrep. There is nothing to substract %L from." %(LppOut))
-
-        elif operation == 'ext':
-            # TODO:
-            # if (not (member(LppOut, NotToExtendOrOverUnderOrUnderOverLpps) != nil)):
-            if True:
-                # if (debug_text == True):
-                #     print("Extending %L over %L by %s ." %(LppIn, LppOut, list(SizeAmount)))
-                # else:
-                #     pass
-                polygon_toextend = polygon1
-                polygon_ref = polygon2
-                polygon_out = polyop_extend(polygon_toextend, polygon_ref, size_amount)
-            else:
-                pass
-                # if (debug_text == True):
-                #     print("Extension skipped on %L over %s by %s." %(LppIn, LppOut, list(SizeAmount)))
-                # else:
-                #     pass
-        # TODO
-        elif operation == 'ouo':
-            # if (not (member(LppIn NotToExtendOrOverUnderOrUnderOverLpps) != nil)):
-            if True:
-                # if (debug_text == True and length(ShapesIn) > 0):
-                #     print("Performing Over of Under of Under of Over on %s."  %LppIn)
-                # if ():
-                #     ValueError("MinWidth for %s is missing" %LppIn)
-                # else:
-                #     min_width = lpp_in['min_width']
-                # if ():
-                #     ValueError("MinSpace for %s is missing" %LppIn)
-                # else:
-                #     min_space = lpp_in['min_space']
-
-                min_width = global_min_width
-                min_space = global_min_width
-
-                underofover_size = grid_size * ceil(0.5 * min_space / grid_size)
-                overofunder_size = grid_size * ceil(0.5 * min_width / grid_size)
-                poly_o = polyop_oversize(polygon2, underofover_size)
-                poly_ou = polyop_undersize(poly_o, underofover_size)
-                poly_ouu = polyop_undersize(poly_ou, overofunder_size)
-                poly_out = polyop_oversize(poly_ouu, overofunder_size)
 
+    ################################################################################
+    # clean up functions for shapely geometries
+    ################################################################################
+    @staticmethod
+    def polygonal_or_none(geom: Optional[BaseGeometry]) -> Optional[BaseGeometry]:
+        """
+        Drops the points and lines that booleans and precision reduction can leave behind,
+        and maps empty geometries to None like the gdspy engine does.
+
+        Parameters
+        ----------
+        geom : Optional[BaseGeometry]
+            The geometry to filter
+
+        Returns
+        -------
+        geom_out : Optional[BaseGeometry]
+            The Polygon or MultiPolygon part of the geometry, or None if it has no area
+        """
+        if geom is None or geom.is_empty:
+            return None
+        if geom.geom_type in ('Polygon', 'MultiPolygon'):
+            return geom
+
+        # GEOS outputs nest at most one level deep (GeometryCollection of MultiPolygons)
+        parts = shapely.get_parts(shapely.get_parts(geom))
+        polygons = parts[shapely.get_type_id(parts) == POLYGON_TYPE_ID]
+        if len(polygons) == 0:
+            return None
+        elif len(polygons) == 1:
+            return polygons[0]
+        else:
+            return shapely.multipolygons(polygons)
+
+    def dataprep_cleanup_shapely(self,
+                                 polygon: Optional[BaseGeometry],
+                                 do_cleanup: bool = True,
+                                 ) -> Optional[BaseGeometry]:
+        """
+        Clean up a shapely geometry by snapping it to the global grid.
+        Precision reduction in GEOS always returns valid geometry, so no separate offset by 0 is needed.
+
+        Parameters
+        ----------
+        polygon : Optional[BaseGeometry]
+            The polygon to clean
+        do_cleanup : bool
+            True to perform the cleanup. False will return input polygon unchanged
+
+        Returns
+        -------
+        clean_polygon : Optional[BaseGeometry]
+            The cleaned up polygon
+        """
+        if not do_cleanup or polygon is None:
+            return polygon
+        if not isinstance(polygon, BaseGeometry):
+            raise ValueError('input polygon must be a shapely geometry or NoneType')
+
+        return self.polygonal_or_none(shapely.set_precision(polygon, self.global_grid_size))
+
+    ################################################################################
+    # type-converting functions for coordlist/shapely
+    ################################################################################
+    def dataprep_coord_to_shapely(
+            self,
+            pos_neg_list_list: Tuple[List[List[Tuple[float, float]]], List[List[Tuple[float, float]]]],
+            manh_grid_size: float,
+            do_manh: bool,
+    ) -> Optional[BaseGeometry]:
+        """
+        Converts list of polygon coordinate lists into a single shapely geometry with one vectorized union.
+        The expected input list will be a list of all polygons on a given layer
+
+        Parameters
+        ----------
+        pos_neg_list_list : Tuple[List, List]
+            A tuple containing two lists: the list of positive polygon shapes and the list of negative polygon shapes.
+            Each polygon shape is a list of point tuples
+        manh_grid_size : float
+            The Manhattanization grid size
+        do_manh : bool
+            True to perform Manhattanization
+
+        Returns
+        -------
+        polygon_out : Optional[BaseGeometry]
+            The merged polygons
+        """
+        # Overlays run in floating point, the cleanup snaps the result to the grid once. Snap-rounding every overlay
+        # (grid_size argument) is about twice as slow
+        polygon_out = self.polygonal_or_none(coord_to_shapely(pos_neg_list_list))
+        polygon_out = self.shapely_manh(polygon_out, manh_grid_size=manh_grid_size, do_manh=do_manh)
+
+        return self.dataprep_cleanup_shapely(polygon_out, do_cleanup=self.do_cleanup)
+
+    def polyop_shapely_to_point_list(self,
+                                     polygon_shapely_in: Optional[BaseGeometry],
+                                     fracture: bool = True,
+                                     do_manh: bool = True,
+                                     manh_grid_size: Optional[float] = None,
+                                     ) -> List[np.ndarray]:
+        """
+        Converts the shapely representation of the polygon into a list of polygon point lists.
+        Polygons without holes are extracted with a single coordinate query. Polygons with holes are cut into
+        keyhole polygons through gdspy, as the content list cannot represent holes.
+
+        Parameters
+        ----------
+        polygon_shapely_in : Optional[BaseGeometry]
+            The shapely geometry to be converted to lists of coordinates
+        fracture : bool
+            True to fracture shapes
+        do_manh : bool
+            True to perform Manhattanization
+        manh_grid_size : float
+            The Manhattanization grid size
+
+        Returns
+        -------
+        output_list_of_coord_lists : List[np.ndarray]
+            A list containing the polygon point lists that compose the input geometry
+        """
+        if manh_grid_size is None:
+            manh_grid_size = self.global_grid_size
+
+        if do_manh:
+            polygon_shapely_in = self.shapely_manh(polygon_shapely_in, manh_grid_size=manh_grid_size, do_manh=True)
+
+        polygon_shapely_in = self.polygonal_or_none(polygon_shapely_in)
+        if polygon_shapely_in is None:
+            return []
+
+        if fracture:
+            # Fracturing is only implemented by gdspy
+            return Dataprep.polyop_gdspy_to_point_list(
+                self,
+                shapely_to_gdspy(polygon_shapely_in, precision=self.global_operation_precision),
+                fracture=True,
+                do_manh=False,
+            )
+
+        parts = shapely.get_parts(polygon_shapely_in)
+        has_holes = shapely.get_num_interior_rings(parts) > 0
+
+        output_list_of_coord_lists = []
+        # TODO: Magic number. round based on layout_unit and resolution
+        if not np.all(has_holes):
+            coords, index = shapely.get_coordinates(shapely.get_exterior_ring(parts[~has_holes]), return_index=True)
+            coords = np.round(coords, 3)
+            # Shapely rings repeat the first point at the end, content list polygons do not
+            output_list_of_coord_lists.extend(
+                ring[:-1] for ring in np.split(coords, np.flatnonzero(np.diff(index)) + 1)
+            )
+
+        for part in parts[has_holes]:
+            polygon_gdspy = shapely_to_gdspy_polygon(part, precision=self.global_operation_precision)
+            output_list_of_coord_lists.extend(np.round(poly, 3) for poly in polygon_gdspy.polygons)
+
+        return output_list_of_coord_lists
+
+    ################################################################################
+    # Manhattanization related functions
+    ################################################################################
+    def shapely_manh(self,
+                     polygon: Optional[BaseGeometry],
+                     manh_grid_size: float,
+                     do_manh: bool,
+                     max_deviation: Optional[float] = None,
+                     ) -> Optional[BaseGeometry]:
+        """
+        Performs Manhattanization on a shapely geometry.
+        Exteriors are Manhattanized outwards and holes inwards, using the same manh_skill as the gdspy engine.
+
+        Parameters
+        ----------
+        polygon : Optional[BaseGeometry]
+            The shapely geometry to be Manhattanized
+        manh_grid_size : float
+            grid size for Manhattanization, edge length after Manhattanization should be larger than it
+        do_manh : bool
+            True to perform Manhattanization
+        max_deviation : Optional[float]
+            If specified, Manhattanize adaptively with steps that stay within max_deviation of the original outline
+
+        Returns
+        -------
+        polygon_out : Optional[BaseGeometry]
+            The Manhattanized geometry
+        """
+        if polygon is None:
+            return None
+        if not do_manh:
+            return self.dataprep_cleanup_shapely(polygon, do_cleanup=self.do_cleanup)
+
+        start = time.time()
+
+        shell_coords = []
+        holed_coords = []
+        for part in shapely.get_parts(polygon):
+            coords_ext = self.manh_skill(shapely.get_coordinates(part.exterior), manh_grid_size, 'inc', max_deviation)
+            if len(part.interiors):
+                coords_int = [self.manh_skill(shapely.get_coordinates(interior), manh_grid_size, 'dec', max_deviation)
+                              for interior in part.interiors]
+                holed_coords.append((coords_ext, coords_int))
             else:
-                pass
+                shell_coords.append(coords_ext)
 
-        elif operation == 'del':
-            # TODO
-            pass
+        manh_polygons = list(shapely.make_valid(pointlists_to_shapely(shell_coords)))
+        # Holes must be subtracted from their own shell only, as another part may sit inside the hole
+        for coords_ext, coords_int in holed_coords:
+            manh_polygons.append(
+                shapely.difference(shapely.union_all(shapely.make_valid(pointlists_to_shapely([coords_ext]))),
+                                   shapely.union_all(shapely.make_valid(pointlists_to_shapely(coords_int))))
+            )
 
-        return polygon_out
+        polygon_out = shapely.union_all(manh_polygons)
+        polygon_out = self.dataprep_cleanup_shapely(self.polygonal_or_none(polygon_out), do_cleanup=self.do_cleanup)
 
+        end = time.time()
+        dataprep_logger.debug(f'shapely_manh took {end-start}s')
 
+        return polygon_out
 
+    ################################################################################
+    # Dataprep related operations
+    ################################################################################
+    def dataprep_oversize_shapely(self,
+                                  polygon: Optional[BaseGeometry],
+                                  offset: float,
+                                  do_cleanup: bool = None,
+                                  ) -> Optional[BaseGeometry]:
+        """
+        Grow a polygon by an offset with a mitred GEOS buffer. Perform cleanup to ensure proper polygon shape.
+
+        Parameters
+        ----------
+        polygon : Optional[BaseGeometry]
+            The polygon to size, in shapely representation
+        offset : float
+            The amount to grow the polygon
+        do_cleanup : bool
+            Optional parameter to force whether point cleanup should occur.
+
+        Returns
+        -------
+        polygon_oversized : Optional[BaseGeometry]
+            The oversized polygon
+        """
+        if polygon is None:
+            return None
+        if offset < 0:
+            logging.warning(f'Oversizing by offset = {offset} < 0 undersizes the polygon by {-offset}')
+
+        polygon_oversized = self.polygonal_or_none(
+            shapely.buffer(polygon, offset, join_style='mitre', mitre_limit=self.offset_tolerance)
+        )
+        return self.dataprep_cleanup_shapely(
+            polygon_oversized,
+            do_cleanup=do_cleanup if do_cleanup is not None else self.do_cleanup
+        )
+
+    def dataprep_undersize_shapely(self,
+                                   polygon: Optional[BaseGeometry],
+                                   offset: float,
+                                   do_cleanup: bool = None,
+                                   ) -> Optional[BaseGeometry]:
+        """
+        Shrink a polygon by an offset with a mitred GEOS buffer. Perform cleanup to ensure proper polygon shape.
+
+        Parameters
+        ----------
+        polygon : Optional[BaseGeometry]
+            The polygon to size, in shapely representation
+        offset : float
+            The amount to shrink the polygon
+        do_cleanup : bool
+            Optional parameter to force whether point cleanup should occur.
+
+        Returns
+        -------
+        polygon_undersized : Optional[BaseGeometry]
+            The undersized polygon
+        """
+        if polygon is None:
+            return None
+        if offset < 0:
+            logging.warning(f'Undersizing by offset = {offset} < 0 oversizes the polygon by {-offset}')
+
+        polygon_undersized = self.polygonal_or_none(
+            shapely.buffer(polygon, -offset, join_style='mitre', mitre_limit=self.offset_tolerance)
+        )
+        return self.dataprep_cleanup_shapely(
+            polygon_undersized,
+            do_cleanup=do_cleanup if do_cleanup is not None else self.do_cleanup
+        )
+
+    def dataprep_boolean_shapely(self,
+                                 polygon1: Optional[BaseGeometry],
+                                 polygon2: Optional[BaseGeometry],
+                                 operation: str,
+                                 ) -> Optional[BaseGeometry]:
+        """
+        Performs a boolean operation between two geometries.
+
+        For 'not' and 'and', the parts of polygon1 that overlap polygon2 are found with an STRtree query first, so
+        the overlay only runs on those parts. Untouched parts are passed through ('not') or dropped ('and').
+
+        Parameters
+        ----------
+        polygon1 : Optional[BaseGeometry]
+            The first operand
+        polygon2 : Optional[BaseGeometry]
+            The second operand
+        operation : str
+            The boolean operation to perform: 'or', 'and', 'xor' or 'not' (polygon1 - polygon2)
+
+        Returns
+        -------
+        polygon_out : Optional[BaseGeometry]
+            The result of the boolean operation
+        """
+        if operation not in SHAPELY_BOOLEAN_OPERATIONS:
+            raise ValueError(f'Boolean operation {operation} is not one of {list(SHAPELY_BOOLEAN_OPERATIONS.keys())}')
+
+        # None is an empty layer
+        if polygon1 is None or polygon2 is None:
+            if operation == 'and':
+                return None
+            elif polygon2 is None:
+                return polygon1
+            else:
+                return polygon2 if operation != 'not' else None
+
+        boolean_func = SHAPELY_BOOLEAN_OPERATIONS[operation]
+
+        if operation in ('not', 'and'):
+            parts1 = shapely.get_parts(polygon1)
+            parts2 = shapely.get_parts(polygon2)
+            index1, index2 = shapely.STRtree(parts2).query(parts1, predicate='intersects')
+
+            touched = np.zeros(len(parts1), dtype=bool)
+            touched[index1] = True
+            polygon_out = boolean_func(shapely.union_all(parts1[touched]),
+                                       shapely.union_all(parts2[np.unique(index2)]))
+            if operation == 'not':
+                polygon_out = shapely.union_all(np.append(shapely.get_parts(polygon_out), parts1[~touched]))
+        else:
+            polygon_out = boolean_func(polygon1, polygon2)
+
+        return self.polygonal_or_none(polygon_out)
+
+    def dataprep_rects_to_shapely(self,
+                                  rects: np.ndarray,
+                                  ) -> Optional[BaseGeometry]:
+        """
+        Merges rectangles into a single geometry with one vectorized union.
+
+        Parameters
+        ----------
+        rects : np.ndarray
+            (M, 4) array of [left, bottom, right, top] rectangles, with coordinates on the global grid
+
+        Returns
+        -------
+        polygon_out : Optional[BaseGeometry]
+            The union of the rectangles
+        """
+        if not len(rects):
+            return None
+        return self.polygonal_or_none(shapely.union_all(shapely.box(*rects.T)))
+
+    ################################################################################
+    # Hooks called by the shared Dataprep.poly_operation and Dataprep.dataprep flow
+    ################################################################################
+    def gdspy_manh(self,
+                   polygon_gdspy: Optional[BaseGeometry],
+                   manh_grid_size: float,
+                   do_manh: bool,
+                   max_deviation: Optional[float] = None,
+                   ) -> Optional[BaseGeometry]:
+        """ Shapely replacement of Dataprep.gdspy_manh. polygon_gdspy holds a shapely geometry in this engine """
+        return self.shapely_manh(polygon_gdspy, manh_grid_size=manh_grid_size, do_manh=do_manh,
+                                 max_deviation=max_deviation)
+
+    @staticmethod
+    def count_vertices_shapely(polygon: Optional[BaseGeometry],
+                               ) -> int:
+        """ Returns the total number of distinct vertices of a shapely geometry, 0 for None """
+        if polygon is None:
+            return 0
+        # Each ring repeats its first point at the end
+        parts = shapely.get_parts(polygon)
+        n_rings = len(parts) + int(np.sum(shapely.get_num_interior_rings(parts)))
+        return int(shapely.get_num_coordinates(polygon)) - n_rings
+
+    @staticmethod
+    def count_polygons_shapely(polygon: Optional[BaseGeometry],
+                               ) -> int:
+        """ Returns the number of polygons of a shapely geometry, 0 for None """
+        if polygon is None:
+            return 0
+        return len(shapely.get_parts(polygon))
+
+    @staticmethod
+    def geometry_stats_shapely(polygon: Optional[BaseGeometry],
+                               ) -> Dict[str, float]:
+        """ Returns the polygon count, vertex count, maximum vertices per polygon and bounding box area of a geometry """
+        parts = shapely.get_parts(polygon) if polygon is not None else np.empty(0, dtype=object)
+        # Each ring repeats its first point at the end
+        vertex_counts = shapely.get_num_coordinates(parts) - 1 - shapely.get_num_interior_rings(parts)
+        min_x, min_y, max_x, max_y = polygon.bounds if len(parts) else (0.0, 0.0, 0.0, 0.0)
+        return dict(polygon_count=len(parts),
+                    vertex_count=int(np.sum(vertex_counts)),
+                    max_vertices=int(np.max(vertex_counts, initial=0)),
+                    bbox_area=float((max_x - min_x) * (max_y - min_y)),
+                    )
+
+    dataprep_cleanup_gdspy = dataprep_cleanup_shapely
+    dataprep_coord_to_gdspy = dataprep_coord_to_shapely
+    polyop_gdspy_to_point_list = polyop_shapely_to_point_list
+    dataprep_oversize_gdspy = dataprep_oversize_shapely
+    dataprep_undersize_gdspy = dataprep_undersize_shapely
+    dataprep_boolean_gdspy = dataprep_boolean_shapely
+    dataprep_rects_to_gdspy = dataprep_rects_to_shapely
+    count_vertices_gdspy = count_vertices_shapely
+    count_polygons_gdspy = count_polygons_shapely
+    geometry_stats_gdspy = geometry_stats_shapely
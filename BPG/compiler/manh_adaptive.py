@@ -0,0 +1,126 @@
+"""
+This module implements a tolerance bounded Manhattanization. Instead of one step per Manhattanization grid, the
+staircase uses the coarsest steps whose deviation from the original outline stays within a maximum deviation budget.
+
+Along each run of edges that are monotone in x and y and share the same dominant direction, only the points where the
+outline crosses a coarse grid line (spaced by the budget, across the dominant direction) are kept, and consecutive kept
+points are joined by a single step. The outline between two kept points lies within their bounding box, whose short
+side is at most the budget, so every point of the original outline is within the budget of the staircase and vice
+versa (up to the rounding onto the Manhattanization grid).
+
+The steps of two nearby parts of the outline, such as both sides of a sharp concave corner, can cross each other. The
+outlines are checked with Shapely, and the self-intersecting ones are rejected so that the caller falls back to the
+regular Manhattanization.
+"""
+import numpy as np
+
+from BPG.compiler.point_operations import coords_cleanup
+
+from typing import List, Optional, Tuple, Union
+
+try:
+    import shapely
+except ImportError:
+    shapely = None
+
+
+def manh_adaptive(poly_coords: Union[List[Tuple[float, float]], np.ndarray],
+                  manh_grid_size: float,
+                  max_deviation: float,
+                  manh_type: str = 'inc',
+                  ) -> Optional[np.ndarray]:
+    """
+    Manhattanizes a polygon with the coarsest steps allowed by max_deviation.
+
+    Parameters
+    ----------
+    poly_coords : Union[List[Tuple[float, float]], np.ndarray]
+        list of coordinates that enclose a polygon
+    manh_grid_size : float
+        grid size for Manhattanization, all output points lie on this grid
+    max_deviation : float
+        maximum distance between the original outline and the Manhattanized one. Values below manh_grid_size give one
+        step per grid, like the regular Manhattanization
+    manh_type : str
+        'inc' : the steps are placed outside of the polygon
+        'dec' : the steps are placed inside of the polygon
+
+    Returns
+    -------
+    poly_coords_cleanup : Optional[np.ndarray]
+        The Manhattanized list of coordinates describing the polygon, with the first point repeated at the end. None if
+        the Manhattanized outline intersects itself
+    """
+    if manh_type not in ('inc', 'dec'):
+        raise ValueError(f'manh_type = {manh_type} should be either "inc" or "dec"')
+    if shapely is None:
+        raise ValueError('Adaptive Manhattanization requires Shapely >= 2.0 to be installed')
+
+    # Work in integer units of the Manhattanization grid, without repeated points
+    points = np.round(np.asarray(poly_coords, dtype=float).reshape(-1, 2) / manh_grid_size).astype(np.int64)
+    points = points[np.any(points != np.roll(points, 1, axis=0), axis=1)]
+    if len(points) < 3:
+        return np.empty((0, 2))
+
+    step = max(int(np.floor(max_deviation / manh_grid_size + 1e-9)), 1)
+
+    delta = np.roll(points, -1, axis=0) - points
+    is_manh = np.any(delta == 0, axis=1)
+    x_dominant = np.abs(delta[:, 0]) >= np.abs(delta[:, 1])
+    quadrant = 3 * np.sign(delta[:, 0]) + np.sign(delta[:, 1])
+
+    # Vertices are kept where the outline turns back, changes dominant direction, or meets an axis aligned edge
+    keep = (is_manh | np.roll(is_manh, 1) | (quadrant != np.roll(quadrant, 1)) |
+            (x_dominant != np.roll(x_dominant, 1)))
+
+    # Points where each edge crosses a coarse grid line across its dominant direction. Lines through the end point of
+    # an edge are counted, lines through its start point belong to the previous edge
+    edge_idx = np.flatnonzero(~is_manh)
+    cross_axis = np.where(x_dominant[edge_idx], 1, 0)
+    c0 = points[edge_idx, cross_axis]
+    dc = delta[edge_idx, cross_axis]
+    c1 = c0 + dc
+    k_lo = np.where(dc > 0, c0 // step + 1, -(-c1 // step))
+    k_hi = np.where(dc > 0, c1 // step, (c0 - 1) // step)
+    counts = np.maximum(k_hi - k_lo + 1, 0)
+    rep = np.repeat(np.arange(len(edge_idx)), counts)
+    j = np.arange(len(rep)) - np.repeat(np.cumsum(counts) - counts, counts)
+    levels = np.where(dc[rep] > 0, k_lo[rep] + j, k_hi[rep] - j) * step
+    t = (levels - c0[rep]) / dc[rep]
+    crossing_edge = edge_idx[rep]
+    crossings = np.empty((len(rep), 2), dtype=np.int64)
+    crossings[np.arange(len(rep)), cross_axis[rep]] = levels
+    other_axis = 1 - cross_axis[rep]
+    crossings[np.arange(len(rep)), other_axis] = np.round(
+        points[crossing_edge, other_axis] + t * delta[crossing_edge, other_axis]
+    ).astype(np.int64)
+
+    # Kept vertices and crossings, in order along the outline
+    kept_idx = np.flatnonzero(keep)
+    anchors = np.concatenate([points[kept_idx], crossings])
+    order = np.lexsort((np.concatenate([np.zeros(len(kept_idx)), t]), np.concatenate([kept_idx, crossing_edge])))
+    anchors = anchors[order]
+    anchors = anchors[np.any(anchors != np.roll(anchors, 1, axis=0), axis=1)]
+    if len(anchors) < 2:
+        return np.empty((0, 2))
+
+    # Join consecutive anchors with a single step, placed on the requested side of the outline.
+    # For a counterclockwise outline, the step going first along x is on the outside when dx * dy > 0
+    delta = np.roll(anchors, -1, axis=0) - anchors
+    x = points[:, 0].astype(float)
+    y = points[:, 1].astype(float)
+    is_ccw = np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y) > 0
+    x_first = (delta[:, 0] * delta[:, 1] > 0) == (is_ccw == (manh_type == 'inc'))
+    corners = np.where(x_first[:, np.newaxis],
+                       np.stack([anchors[:, 0] + delta[:, 0], anchors[:, 1]], axis=1),
+                       np.stack([anchors[:, 0], anchors[:, 1] + delta[:, 1]], axis=1))
+    coords_orth = np.stack([anchors, corners], axis=1).reshape(-1, 2)
+    coords_orth = coords_orth[np.any(coords_orth != np.roll(coords_orth, 1, axis=0), axis=1)]
+
+    poly_coords_cleanup = coords_cleanup(coords_orth.astype(float) * manh_grid_size, eps_grid=manh_grid_size / 10)
+    if poly_coords_cleanup.size != 0:
+        poly_coords_cleanup = np.append(poly_coords_cleanup, [poly_coords_cleanup[0]], axis=0)
+        if not shapely.is_valid(shapely.Polygon(poly_coords_cleanup)):
+            return None
+
+    return poly_coords_cleanup
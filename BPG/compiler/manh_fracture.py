@@ -0,0 +1,328 @@
+"""
+This module implements the fracturing of polygons into pieces with a bounded number of vertices.
+
+Polygons that are small enough are kept as they are. Large Manhattan polygons, which make up most of a layer after
+Manhattanization, are split with a scanline decomposition that runs vectorized over all the polygons of a layer:
+each polygon is cut into horizontal slabs at its vertex y coordinates, the interior of each slab is found with the
+nonzero winding rule, and the resulting rectangles are stacked back into y-monotone pieces of at most max_points
+vertices. Only the remaining non-Manhattan polygons go through the generic gdspy fracture.
+"""
+import gdspy
+import numpy as np
+
+from typing import List, Sequence, Tuple
+
+
+def pointlists_to_int_array(pointlists: Sequence[np.ndarray],
+                            resolution: float,
+                            ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Snaps the passed polygons to the resolution grid and stores them back to back in a single integer array.
+
+    Parameters
+    ----------
+    pointlists : Sequence[np.ndarray]
+        The polygon pointlists
+    resolution : float
+        The grid on which the polygon vertices lie
+
+    Returns
+    -------
+    vertices, offsets : Tuple[np.ndarray, np.ndarray]
+        (N, 2) integer vertices in units of resolution, and the (P + 1,) offsets at which each polygon starts
+    """
+    lengths = np.fromiter((len(points) for points in pointlists), dtype=np.int64, count=len(pointlists))
+    offsets = np.zeros(len(pointlists) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    if not offsets[-1]:
+        return np.empty((0, 2), dtype=np.int64), offsets
+    vertices = np.concatenate([np.asarray(points, dtype=float).reshape(-1, 2) for points in pointlists])
+    return np.round(vertices / resolution).astype(np.int64), offsets
+
+
+def _cyclic_neighbours(offsets: np.ndarray,
+                       ) -> Tuple[np.ndarray, np.ndarray]:
+    """ Returns the index of the previous and next vertex of each vertex, wrapping around within each polygon """
+    n_vertices = offsets[-1]
+    index = np.arange(n_vertices)
+    prev_index = index - 1
+    next_index = index + 1
+    lengths = np.diff(offsets)
+    starts = offsets[:-1][lengths > 0]
+    ends = offsets[1:][lengths > 0] - 1
+    prev_index[starts] = ends
+    next_index[ends] = starts
+    return prev_index, next_index
+
+
+def manhattan_polygon_mask(vertices: np.ndarray,
+                           offsets: np.ndarray,
+                           ) -> np.ndarray:
+    """
+    Returns True for each polygon whose edges are all horizontal or vertical.
+
+    Parameters
+    ----------
+    vertices : np.ndarray
+        (N, 2) integer vertices of all polygons
+    offsets : np.ndarray
+        (P + 1,) offsets at which each polygon starts
+
+    Returns
+    -------
+    is_manh : np.ndarray
+        (P,) boolean array
+    """
+    _, next_index = _cyclic_neighbours(offsets)
+    delta = vertices[next_index] - vertices
+    non_manh_edges = np.logical_and(delta[:, 0] != 0, delta[:, 1] != 0)
+    # Count the non-Manhattan edges of each polygon with a cumulative sum, which also handles empty polygons
+    non_manh_count = np.concatenate([[0], np.cumsum(non_manh_edges)])
+    return non_manh_count[offsets[1:]] == non_manh_count[offsets[:-1]]
+
+
+def manhattan_to_rectangles(vertices: np.ndarray,
+                            offsets: np.ndarray,
+                            ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Splits Manhattan polygons into disjoint rectangles, one horizontal slab of each polygon at a time.
+    Touching rectangles within a slab are merged, so each rectangle spans a full run of the polygon interior.
+
+    Parameters
+    ----------
+    vertices : np.ndarray
+        (N, 2) integer vertices of the Manhattan polygons
+    offsets : np.ndarray
+        (P + 1,) offsets at which each polygon starts
+
+    Returns
+    -------
+    slab_lo, slab_hi, left, right, slab_y : Tuple[np.ndarray, ...]
+        For each rectangle, the index of its bottom and top y coordinates into slab_y, and its left and right x
+        coordinates. slab_y holds the sorted distinct vertex y coordinates of each polygon, polygon after polygon,
+        so slab indices never cross from one polygon to the next
+    """
+    empty = np.empty(0, dtype=np.int64)
+    lengths = np.diff(offsets)
+    if not len(vertices):
+        return empty, empty, empty, empty, empty
+    poly_idx = np.repeat(np.arange(len(lengths)), lengths)
+    _, next_index = _cyclic_neighbours(offsets)
+
+    # Distinct y coordinates of each polygon, sorted by polygon then y
+    y_min = vertices[:, 1].min()
+    y_span = vertices[:, 1].max() - y_min + 1
+    y_keys = np.unique(poly_idx * y_span + (vertices[:, 1] - y_min))
+    slab_y = y_keys % y_span + y_min
+
+    # Vertical edges cover the slabs between their end points, with the winding given by their direction
+    x1, y1 = vertices[:, 0], vertices[:, 1]
+    y2 = vertices[next_index, 1]
+    is_vertical = y1 != y2
+    edge_poly = poly_idx[is_vertical]
+    edge_x = x1[is_vertical]
+    edge_y1, edge_y2 = y1[is_vertical], y2[is_vertical]
+    edge_winding = np.where(edge_y2 > edge_y1, 1, -1)
+    slab_start = np.searchsorted(y_keys, edge_poly * y_span + (np.minimum(edge_y1, edge_y2) - y_min))
+    slab_stop = np.searchsorted(y_keys, edge_poly * y_span + (np.maximum(edge_y1, edge_y2) - y_min))
+
+    # One crossing per (edge, slab) pair
+    counts = slab_stop - slab_start
+    edge_idx = np.repeat(np.arange(len(counts)), counts)
+    crossing_slab = slab_start[edge_idx] + np.arange(len(edge_idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+    crossing_x = edge_x[edge_idx]
+    order = np.lexsort((crossing_x, crossing_slab))
+    crossing_slab = crossing_slab[order]
+    crossing_x = crossing_x[order]
+
+    # The crossings of each slab of a closed polygon sum to zero, so a single cumulative sum gives the winding number
+    # to the right of every crossing
+    inside = np.cumsum(edge_winding[edge_idx][order]) != 0
+    was_inside = np.concatenate([[False], inside[:-1]])
+    run_start = np.flatnonzero(inside & ~was_inside)
+    run_stop = np.flatnonzero(~inside & was_inside)
+    slab = crossing_slab[run_start]
+    left = crossing_x[run_start]
+    right = crossing_x[run_stop]
+
+    # Merge runs of the same slab that touch, which happens when coincident edges are sorted in an unlucky order
+    keep = right > left
+    slab, left, right = slab[keep], left[keep], right[keep]
+    if not len(slab):
+        return empty, empty, empty, empty, slab_y
+    new_run = np.concatenate([[True], (slab[1:] != slab[:-1]) | (left[1:] != right[:-1])])
+    run_idx = np.flatnonzero(new_run)
+    right = np.maximum.reduceat(right, run_idx)
+    slab, left = slab[run_idx], left[run_idx]
+
+    # Merge rectangles stacked with the same x extent into taller ones
+    order = np.lexsort((slab, right, left))
+    slab, left, right = slab[order], left[order], right[order]
+    new_rect = np.concatenate([[True], (left[1:] != left[:-1]) | (right[1:] != right[:-1]) | (slab[1:] != slab[:-1] + 1)])
+    rect_idx = np.flatnonzero(new_rect)
+    slab_hi = np.append(slab[rect_idx[1:] - 1], slab[-1]) + 1
+
+    return slab[rect_idx], slab_hi, left[rect_idx], right[rect_idx], slab_y
+
+
+def rectangles_to_pieces(slab_lo: np.ndarray,
+                         slab_hi: np.ndarray,
+                         left: np.ndarray,
+                         right: np.ndarray,
+                         slab_y: np.ndarray,
+                         max_points: int,
+                         ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stacks disjoint rectangles into y-monotone Manhattan polygons of at most max_points vertices.
+    A rectangle is stacked on top of another if they share a horizontal boundary, and each is the leftmost rectangle
+    overlapping the other across that boundary.
+
+    Parameters
+    ----------
+    slab_lo, slab_hi, left, right, slab_y : np.ndarray
+        The rectangles, as returned by manhattan_to_rectangles
+    max_points : int
+        Maximum number of vertices of each output polygon
+
+    Returns
+    -------
+    vertices, offsets : Tuple[np.ndarray, np.ndarray]
+        (N, 2) integer vertices of the output polygons, and the offsets at which each polygon starts
+    """
+    n_rects = len(slab_lo)
+    if not n_rects:
+        return np.empty((0, 2), dtype=np.int64), np.zeros(1, dtype=np.int64)
+
+    # Match the top of each rectangle with the bottom of the leftmost rectangle overlapping it, and vice versa
+    x_min = left.min()
+    x_span = right.max() - x_min + 1
+    bottoms = np.lexsort((left, slab_lo))
+    tops = np.lexsort((left, slab_hi))
+    bottom_keys = slab_lo[bottoms] * x_span + (right[bottoms] - x_min)
+    top_keys = slab_hi[tops] * x_span + (right[tops] - x_min)
+
+    above = np.searchsorted(bottom_keys, slab_hi * x_span + (left - x_min), side='right')
+    above = bottoms[np.minimum(above, n_rects - 1)]
+    has_above = (slab_lo[above] == slab_hi) & (left[above] < right) & (right[above] > left)
+    below = np.searchsorted(top_keys, slab_lo * x_span + (left - x_min), side='right')
+    below = tops[np.minimum(below, n_rects - 1)]
+    has_below = (slab_hi[below] == slab_lo) & (left[below] < right) & (right[below] > left)
+
+    index = np.arange(n_rects)
+    linked = has_below & has_above[below] & (above[below] == index)
+    prev_rect = np.where(linked, below, index)
+
+    # Pointer jumping gives the bottom rectangle of each stack and the depth of each rectangle in it
+    root = prev_rect
+    depth = linked.astype(np.int64)
+    while np.any(root[root] != root):
+        depth = depth + depth[root]
+        root = root[root]
+
+    # Each rectangle adds at most 4 vertices, cut the stacks into pieces that stay within max_points
+    rects_per_piece = max(max_points // 4, 1)
+    order = np.lexsort((depth, root))
+    piece_key = root[order] * (n_rects // rects_per_piece + 1) + depth[order] // rects_per_piece
+    new_piece = np.concatenate([[True], piece_key[1:] != piece_key[:-1]])
+    piece_start = np.flatnonzero(new_piece)
+    piece_size = np.diff(np.append(piece_start, n_rects))
+    start = np.repeat(piece_start, piece_size)
+    size = np.repeat(piece_size, piece_size)
+    pos = np.arange(n_rects) - start
+
+    # Go up the right side of the stack and down its left side
+    lo, hi = slab_y[slab_lo[order]], slab_y[slab_hi[order]]
+    l, r = left[order], right[order]
+    vertices = np.empty((4 * n_rects, 2), dtype=np.int64)
+    right_pos = 4 * start + 2 * pos
+    left_pos = 4 * start + 2 * size + 2 * (size - 1 - pos)
+    vertices[right_pos] = np.stack([r, lo], axis=1)
+    vertices[right_pos + 1] = np.stack([r, hi], axis=1)
+    vertices[left_pos] = np.stack([l, hi], axis=1)
+    vertices[left_pos + 1] = np.stack([l, lo], axis=1)
+    offsets = np.append(4 * piece_start, 4 * n_rects)
+
+    # Remove the repeated and collinear vertices where stacked rectangles share an edge
+    vertices, offsets = _remove_vertices(vertices, offsets, _repeated_vertex_mask(vertices, offsets))
+    vertices, offsets = _remove_vertices(vertices, offsets, _collinear_vertex_mask(vertices, offsets))
+
+    return vertices, offsets
+
+
+def _repeated_vertex_mask(vertices: np.ndarray,
+                          offsets: np.ndarray,
+                          ) -> np.ndarray:
+    """ Returns True for each vertex equal to the previous vertex of its polygon """
+    prev_index, _ = _cyclic_neighbours(offsets)
+    return np.all(vertices == vertices[prev_index], axis=1)
+
+
+def _collinear_vertex_mask(vertices: np.ndarray,
+                           offsets: np.ndarray,
+                           ) -> np.ndarray:
+    """ Returns True for each vertex on the straight line between its previous and next vertex """
+    prev_index, next_index = _cyclic_neighbours(offsets)
+    return np.any((vertices[prev_index] == vertices) & (vertices[next_index] == vertices), axis=1)
+
+
+def _remove_vertices(vertices: np.ndarray,
+                     offsets: np.ndarray,
+                     remove: np.ndarray,
+                     ) -> Tuple[np.ndarray, np.ndarray]:
+    """ Removes the flagged vertices and updates the polygon offsets """
+    removed_count = np.concatenate([[0], np.cumsum(remove)])
+    return vertices[~remove], offsets - removed_count[offsets]
+
+
+def fracture_pointlists(pointlists: Sequence[np.ndarray],
+                        max_points: int,
+                        resolution: float,
+                        ) -> List[np.ndarray]:
+    """
+    Fractures polygons into pieces of at most max_points vertices.
+    Polygons within the limit are returned unchanged, large Manhattan polygons are decomposed along horizontal slabs,
+    and large non-Manhattan polygons are fractured by gdspy.
+
+    Parameters
+    ----------
+    pointlists : Sequence[np.ndarray]
+        The polygon pointlists, typically all the polygons of a layer
+    max_points : int
+        Maximum number of vertices of each output polygon
+    resolution : float
+        The grid on which the polygon vertices lie
+
+    Returns
+    -------
+    output_pointlists : List[np.ndarray]
+        The fractured polygon pointlists
+    """
+    is_large = np.fromiter((len(points) > max_points for points in pointlists), dtype=bool, count=len(pointlists))
+    output_pointlists = [points for points, large in zip(pointlists, is_large) if not large]
+    if not np.any(is_large):
+        return output_pointlists
+
+    large_pointlists = [points for points, large in zip(pointlists, is_large) if large]
+    vertices, offsets = pointlists_to_int_array(large_pointlists, resolution)
+    is_manh = manhattan_polygon_mask(vertices, offsets)
+
+    if np.any(is_manh):
+        manh_idx = np.flatnonzero(is_manh)
+        lengths = np.diff(offsets)[manh_idx]
+        manh_offsets = np.zeros(len(manh_idx) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=manh_offsets[1:])
+        vertex_idx = np.repeat(offsets[manh_idx] - manh_offsets[:-1], lengths) + np.arange(manh_offsets[-1])
+        piece_vertices, piece_offsets = rectangles_to_pieces(
+            *manhattan_to_rectangles(vertices[vertex_idx], manh_offsets),
+            max_points=max_points,
+        )
+        piece_vertices = piece_vertices * resolution
+        output_pointlists.extend(
+            piece_vertices[start:stop] for start, stop in zip(piece_offsets[:-1].tolist(), piece_offsets[1:].tolist())
+        )
+
+    if not np.all(is_manh):
+        polygon_set = gdspy.PolygonSet([points for points, manh in zip(large_pointlists, is_manh) if not manh])
+        output_pointlists.extend(polygon_set.fracture(max_points=max_points, precision=resolution).polygons)
+
+    return output_pointlists
@@ -1,4 +1,5 @@
 from shapely.geometry import Polygon, MultiPolygon
+from shapely.ops import unary_union
 from typing import Union, Tuple, List
 from math import ceil, sqrt
 import sys
@@ -240,8 +241,8 @@ def polyop_manh_polygon(geom,  # type: Polygon
                         do_manh,  # type: bool
                         ):
     # print(geom)
-    if geom.type != 'Polygon':
-        raise ValueError('Unhandled geometry type: ' + repr(geom.type) + ', type should be Polygon')
+    if geom.geom_type != 'Polygon':
+        raise ValueError('Unhandled geometry type: ' + repr(geom.geom_type) + ', type should be Polygon')
 
     # if do full manhattanization, enlarge the exterior boundary and shrink the interior one
     if do_manh:
@@ -278,16 +279,16 @@ def polyop_manh(geom,  # type: Union[Polygon, MultiPolygon]
                 manh_grid_size,  # type: float
                 do_manh,  # type: bool
                 ):
-    if geom.type == 'Polygon':
+    if geom.geom_type == 'Polygon':
         poly_manh = polyop_manh_polygon(geom, manh_grid_size, do_manh=do_manh)
         return poly_manh
-    elif geom.type == 'MultiPolygon':
-        poly_manh = polyop_manh_polygon(geom[0], manh_grid_size, do_manh=do_manh)
-        for poly_Polygon in geom[1:]:
-            poly_manh = poly_manh.union(polyop_manh_polygon(poly_Polygon, manh_grid_size, do_manh=do_manh))
+    elif geom.geom_type == 'MultiPolygon':
+        # Union all Manhattanized parts at once rather than one by one
+        poly_manh = unary_union([polyop_manh_polygon(poly_Polygon, manh_grid_size, do_manh=do_manh)
+                                 for poly_Polygon in geom.geoms])
         return poly_manh
     else:
-        raise ValueError('Unhandled geometry type: ' + repr(geom.type) +
+        raise ValueError('Unhandled geometry type: ' + repr(geom.geom_type) +
                          'type should be either "Polygon" or "MultiPolygon"')
 
 
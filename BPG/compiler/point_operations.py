@@ -1,6 +1,6 @@
 import numpy as np
 
-from typing import Union
+from typing import Tuple, Union
 
 
 def cleanup_delete(coords_list_in: np.ndarray,
@@ -180,3 +180,200 @@ def create_polygon_from_path_and_width(points_list: np.ndarray,
     polygon_points = coords_cleanup(points_out, eps_grid=eps, cyclic_points=True)
 
     return polygon_points
+
+
+def segment_indices(offsets: np.ndarray,
+                    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns, for each point of a ragged buffer of segments, the index of its segment, the index of the first point of
+    its segment and the number of points of its segment.
+
+    Parameters
+    ----------
+    offsets : np.ndarray
+        The (n_segments + 1) offsets of the segments in the buffer: segment k is buffer[offsets[k]:offsets[k + 1]]
+
+    Returns
+    -------
+    segment : np.ndarray
+        The segment index of each point
+    start : np.ndarray
+        The buffer index of the first point of the segment of each point
+    length : np.ndarray
+        The number of points of the segment of each point
+    """
+    counts = np.diff(offsets)
+    segment = np.repeat(np.arange(len(counts)), counts)
+    return segment, offsets[:-1][segment], counts[segment]
+
+
+def cleanup_delete_segments(coords_list_in: np.ndarray,
+                            offsets: np.ndarray,
+                            eps_grid: float = 1e-4,
+                            cyclic_points: bool = True,
+                            check_inline: bool = True,
+                            ) -> np.ndarray:
+    """
+    Same as cleanup_delete, for every segment of a ragged buffer of coordinate lists at once. The neighbors of a point
+    are taken within its own segment, so the result is the concatenation of the results of cleanup_delete on each
+    segment.
+
+    Parameters
+    ----------
+    coords_list_in : np.ndarray
+        The concatenated x-y coordinates of all of the segments
+    offsets : np.ndarray
+        The (n_segments + 1) offsets of the segments in coords_list_in
+    eps_grid :
+        grid resolution below which points are considered to be the same
+    cyclic_points : bool
+        True if the segments are closed polygons, False if they are paths. See cleanup_delete
+    check_inline : bool
+        True [default] to check for and remove center points that are in a line with their two adjacent neighbors.
+        False to skip this check
+
+    Returns
+    -------
+    delete_array : np.ndarray
+        Numpy array of bools telling whether to delete the coordinate or not
+    """
+    _, start, length = segment_indices(offsets)
+    local = np.arange(len(coords_list_in)) - start
+
+    vec_to_next = coords_list_in[start + (local + 1) % length] - coords_list_in
+    vec_from_prev = coords_list_in - coords_list_in[start + (local - 1) % length]
+
+    dx_next_abs = np.abs(vec_to_next[:, 0])
+    dy_next_abs = np.abs(vec_to_next[:, 1])
+    dx_prev_abs = np.abs(vec_from_prev[:, 0])
+    dy_prev_abs = np.abs(vec_from_prev[:, 1])
+
+    same_as_next = np.logical_and(dx_next_abs < eps_grid, dy_next_abs < eps_grid)
+
+    if check_inline:
+        same_as_prev = np.logical_and(dx_prev_abs < eps_grid, dy_prev_abs < eps_grid)
+        diff_from_lr = np.logical_not(np.logical_or(same_as_next, same_as_prev))
+        in_line = np.logical_or(np.logical_and(dx_next_abs < eps_grid, dx_prev_abs < eps_grid),
+                                np.logical_and(dy_next_abs < eps_grid, dy_prev_abs < eps_grid))
+        delete_array = np.logical_or(same_as_next, np.logical_and(in_line, diff_from_lr))
+    else:
+        delete_array = same_as_next
+
+    # If cleaning paths rather than polygons, never delete the first or last point of a segment
+    if not cyclic_points:
+        delete_array[local == 0] = False
+        delete_array[local == length - 1] = False
+
+    return delete_array
+
+
+def coords_cleanup_segments(coords_list: np.ndarray,
+                            offsets: np.ndarray,
+                            eps_grid: float = 1e-4,
+                            cyclic_points: bool = True,
+                            check_inline: bool = True,
+                            ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Same as coords_cleanup, for every segment of a ragged buffer of coordinate lists at once.
+
+    Parameters
+    ----------
+    coords_list : np.ndarray
+        The concatenated x-y coordinates of all of the segments
+    offsets : np.ndarray
+        The (n_segments + 1) offsets of the segments in coords_list
+    eps_grid : float
+        a size smaller than the resolution grid size,
+        if the difference of x/y coordinates of two points is smaller than it,
+        these two points should actually share the same x/y coordinate
+    cyclic_points : bool
+        True if the segments are closed polygons, False if they are paths. See coords_cleanup
+    check_inline : bool
+        True [default] to check for and remove center points that are in a line with their two adjacent neighbors.
+        False to skip this check
+
+    Returns
+    ----------
+    coords_set_out : np.ndarray
+        The concatenated cleaned coordinate sets
+    offsets_out : np.ndarray
+        The offsets of the cleaned segments in coords_set_out
+    """
+    n_segments = len(offsets) - 1
+    delete_array = cleanup_delete_segments(coords_list, offsets, eps_grid=eps_grid,
+                                           cyclic_points=cyclic_points, check_inline=check_inline)
+
+    # Segments that are already clean are left unchanged by further passes, so loop over the whole buffer until no
+    # coordinate of any segment is deleted
+    while np.any(delete_array):
+        select_array = np.logical_not(delete_array)
+        segment, _, _ = segment_indices(offsets)
+        coords_list = coords_list[select_array]
+        offsets = np.zeros(n_segments + 1, dtype=int)
+        np.cumsum(np.bincount(segment[select_array], minlength=n_segments), out=offsets[1:])
+        delete_array = cleanup_delete_segments(coords_list, offsets, eps_grid=eps_grid,
+                                               cyclic_points=cyclic_points, check_inline=check_inline)
+
+    return coords_list, offsets
+
+
+def create_polygons_from_paths_and_widths(points_list: np.ndarray,
+                                          offsets: np.ndarray,
+                                          widths: np.ndarray,
+                                          eps: float = 1e-4,
+                                          ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Same as create_polygon_from_path_and_width, for many paths at once. The paths are passed as a ragged buffer of
+    center points, and the polygons are returned as a ragged buffer of polygon points.
+
+    Parameters
+    ----------
+    points_list : np.ndarray
+        The concatenated center points (n x 2) of all of the paths
+    offsets : np.ndarray
+        The (n_paths + 1) offsets of the paths in points_list. Each path must have at least 2 points
+    widths : np.ndarray
+        The width of each path
+    eps : float
+        The tolerance for determining whether two points are coincident.
+
+    Returns
+    -------
+    polygon_points : np.ndarray
+        The concatenated polygons formed by the center paths and widths.
+    polygon_offsets : np.ndarray
+        The offsets of the polygons in polygon_points
+    """
+    points_list = np.asarray(points_list, dtype=np.float64)
+    n_points = len(points_list)
+    segment, start, length = segment_indices(offsets)
+    local = np.arange(n_points) - start
+
+    # Same as np.gradient along each path: central differences inside the path, one sided differences at its ends
+    first = local == 0
+    last = local == length - 1
+    index_next = np.where(last, np.arange(n_points), np.arange(n_points) + 1)
+    index_prev = np.where(first, np.arange(n_points), np.arange(n_points) - 1)
+    tangent_vec = points_list[index_next] - points_list[index_prev]
+    interior = np.logical_not(np.logical_or(first, last))
+    tangent_vec[interior] /= 2.
+    tangent_normalized_vec = \
+        tangent_vec / np.linalg.norm(tangent_vec, axis=1, keepdims=True) * np.asarray(widths)[segment, None] / 2
+
+    # Find the points using the perpendicular to tangent line
+    pts0 = points_list + np.column_stack([-1 * tangent_normalized_vec[:, 1], tangent_normalized_vec[:, 0]])
+    pts1 = points_list + np.column_stack([tangent_normalized_vec[:, 1], -1 * tangent_normalized_vec[:, 0]])
+
+    # Concatenate each path into a polygon: its pts0 followed by its pts1 in reverse order
+    polygon_offsets = 2 * offsets
+    poly_segment, poly_start, poly_length = segment_indices(polygon_offsets)
+    poly_local = np.arange(2 * n_points) - poly_start
+    path_start = offsets[:-1][poly_segment]
+    path_length = poly_length // 2
+    gather = np.where(poly_local < path_length,
+                      path_start + poly_local,
+                      n_points + path_start + poly_length - 1 - poly_local)
+    points_out = np.concatenate((pts0, pts1), axis=0)[gather]
+
+    # Clean up the polygons
+    return coords_cleanup_segments(points_out, polygon_offsets, eps_grid=eps, cyclic_points=True)
@@ -1,89 +1,204 @@
-from shapely.geometry import Polygon, MultiPolygon
-from typing import Union, Tuple, List
 import sys
 import gdspy
-from BPG.compiler.dataprep_gdspy import dataprep_cleanup_gdspy, GLOBAL_OPERATION_PRECISION, GLOBAL_DO_CLEANUP
+import shapely
+import numpy as np
+from shapely.geometry import Polygon
+from shapely.geometry.base import BaseGeometry
+from typing import Union, Tuple, List, Optional
 
 
 MAX_POINTS = sys.maxsize
 
 
-def coord_to_shapely(
-        pos_neg_list_list,  # type: Tuple[List[List[Tuple[float, float]]], List[List[Tuple[float, float]]]]
-        ):
-    # type: (...) -> Union[Polygon, MultiPolygon]
+def pointlists_to_shapely(pointlists: List[List[Tuple[float, float]]],
+                          ) -> np.ndarray:
     """
-    Converts list of coordinate lists into shapely polygon objects
+    Converts a list of polygon point lists into an array of shapely Polygons in a single vectorized call.
+    Point lists with less than 3 distinct points cannot enclose any area and are dropped.
 
     Parameters
     ----------
-    pos_neg_list_list
+    pointlists : List[List[Tuple[float, float]]]
+        The list of polygon point lists. Point lists may or may not repeat the first point at the end.
 
     Returns
     -------
+    polygons : np.ndarray
+        1D array of shapely Polygons, one per valid point list
+    """
+    coord_arrays = []
+    for points in pointlists:
+        coords = np.asarray(points, dtype=float).reshape(-1, 2)
+        # Drop the closing point if present, linearrings closes the ring itself
+        if len(coords) > 1 and np.array_equal(coords[0], coords[-1]):
+            coords = coords[:-1]
+        if len(coords) >= 3:
+            coord_arrays.append(coords)
+
+    if not coord_arrays:
+        return np.empty((0,), dtype=object)
 
+    lengths = np.fromiter((len(coords) for coords in coord_arrays), dtype=np.intp, count=len(coord_arrays))
+    rings = shapely.linearrings(np.concatenate(coord_arrays, axis=0),
+                                indices=np.repeat(np.arange(len(coord_arrays)), lengths))
+    return shapely.polygons(rings)
+
+
+def coord_to_shapely(
+        pos_neg_list_list: Tuple[List[List[Tuple[float, float]]], List[List[Tuple[float, float]]]],
+        grid_size: Optional[float] = None,
+) -> BaseGeometry:
     """
-    pos_coord_list_list = pos_neg_list_list[0]
-    neg_coord_list_list = pos_neg_list_list[1]
+    Converts list of coordinate lists into shapely polygon objects
+
+    Parameters
+    ----------
+    pos_neg_list_list : Tuple[List, List]
+        A tuple containing two lists: the list of positive polygon shapes and the list of negative polygon shapes.
+        Each polygon shape is a list of point tuples
+    grid_size : Optional[float]
+        Precision grid on which the union is computed. None to use full floating point precision
 
-    polygon_out = Polygon(pos_coord_list_list[0]).buffer(0, cap_style=3, join_style=2)
+    Returns
+    -------
+    polygon_out : BaseGeometry
+        The union of the positive shapes minus the union of the negative shapes
+    """
+    # make_valid keeps every lobe of self-intersecting inputs, where buffer(0) would silently drop some of them
+    polygon_pos = shapely.make_valid(pointlists_to_shapely(pos_neg_list_list[0]))
+    polygon_out = shapely.union_all(polygon_pos, grid_size=grid_size)
 
-    if len(pos_coord_list_list) > 1:
-        for pos_coord_list in pos_coord_list_list[1:]:
-            polygon_pos = Polygon(pos_coord_list).buffer(0, cap_style=3, join_style=2)
-            polygon_out = polygon_out.union(polygon_pos)
-    if len(neg_coord_list_list):
-        for neg_coord_list in neg_coord_list_list:
-            polygon_neg = Polygon(neg_coord_list).buffer(0, cap_style=3, join_style=2)
-            polygon_out = polygon_out.difference(polygon_neg)
+    if len(pos_neg_list_list[1]):
+        polygon_neg = shapely.make_valid(pointlists_to_shapely(pos_neg_list_list[1]))
+        polygon_out = shapely.difference(polygon_out,
+                                         shapely.union_all(polygon_neg, grid_size=grid_size),
+                                         grid_size=grid_size)
 
     return polygon_out
 
 
-def shapely_to_gdspy_polygon(polygon_shapely: Polygon) -> gdspy.Polygon:
+def shapely_to_gdspy_polygon(polygon_shapely: Polygon,
+                             precision: float = 1e-4,
+                             ) -> Union[gdspy.Polygon, gdspy.PolygonSet]:
+    """
+    Converts a single shapely Polygon to gdspy. Polygons with holes are converted with a single boolean that cuts
+    all interiors out at once, as gdspy represents holes as keyhole polygons.
+
+    Parameters
+    ----------
+    polygon_shapely : Polygon
+        The polygon to convert
+    precision : float
+        Precision of the boolean used to cut the holes
+
+    Returns
+    -------
+    polygon_gdspy : Union[gdspy.Polygon, gdspy.PolygonSet]
+        The gdspy representation of the polygon
+    """
     if not isinstance(polygon_shapely, Polygon):
         raise ValueError("input must be a Shapely Polygon")
-    else:
-        ext_coord_list = list(zip(*polygon_shapely.exterior.coords.xy))
-        polygon_gdspy = gdspy.Polygon(ext_coord_list)
-        if len(polygon_shapely.interiors):
-            for interior in polygon_shapely.interiors:
-                int_coord_list = list(zip(*interior.coords.xy))
-                polygon_gdspy_int = gdspy.Polygon(int_coord_list)
-
-                polygon_gdspy = dataprep_cleanup_gdspy(gdspy.fast_boolean(polygon_gdspy, polygon_gdspy_int, 'not',
-                                                                          max_points=MAX_POINTS,
-                                                                          precision=GLOBAL_OPERATION_PRECISION),
-                                                       do_cleanup=GLOBAL_DO_CLEANUP)
-        else:
-            pass
-        return polygon_gdspy
 
+    # Shapely rings repeat the first point at the end, gdspy polygons do not
+    polygon_gdspy = gdspy.Polygon(shapely.get_coordinates(polygon_shapely.exterior)[:-1])
+    if len(polygon_shapely.interiors):
+        interiors_gdspy = gdspy.PolygonSet([shapely.get_coordinates(interior)[:-1]
+                                            for interior in polygon_shapely.interiors])
+        polygon_gdspy = gdspy.fast_boolean(polygon_gdspy, interiors_gdspy, 'not',
+                                           max_points=MAX_POINTS,
+                                           precision=precision)
+
+    return polygon_gdspy
+
+
+def shapely_to_gdspy(geom_shapely: BaseGeometry,
+                     precision: float = 1e-4,
+                     ) -> Optional[gdspy.PolygonSet]:
+    """
+    Converts a shapely (Multi)Polygon to a single gdspy PolygonSet.
+    The parts of a valid shapely geometry do not overlap, so no boolean is needed to merge them.
 
-def shapely_to_gdspy(geom_shapely: Union[Polygon, MultiPolygon]) -> gdspy.Polygon:
-    if isinstance(geom_shapely, Polygon):
-        return shapely_to_gdspy_polygon(geom_shapely)
-    elif isinstance(geom_shapely, MultiPolygon):
-        polygon_gdspy = shapely_to_gdspy_polygon(geom_shapely[0])
-        for polygon_shapely in geom_shapely[1:]:
-            polygon_gdspy_append = shapely_to_gdspy_polygon(polygon_shapely)
+    Parameters
+    ----------
+    geom_shapely : BaseGeometry
+        The Polygon, MultiPolygon or GeometryCollection of polygons to convert
+    precision : float
+        Precision of the boolean used to cut the holes
 
-            polygon_gdspy = dataprep_cleanup_gdspy(gdspy.fast_boolean(polygon_gdspy, polygon_gdspy_append, 'or',
-                                                                      max_points=MAX_POINTS,
-                                                                      precision=GLOBAL_OPERATION_PRECISION),
-                                                   do_cleanup=GLOBAL_DO_CLEANUP)
+    Returns
+    -------
+    polygon_gdspy : Optional[gdspy.PolygonSet]
+        The gdspy representation of the geometry. None if the geometry is empty
+    """
+    if not isinstance(geom_shapely, BaseGeometry):
+        raise TypeError("input must be a Shapely geometry")
+
+    polygon_list = []
+    for part in shapely.get_parts(geom_shapely):
+        if not isinstance(part, Polygon) or part.is_empty:
+            # Lines and points left over from degenerate booleans have no area
+            continue
+        if len(part.interiors):
+            polygon_list.extend(shapely_to_gdspy_polygon(part, precision=precision).polygons)
+        else:
+            polygon_list.append(shapely.get_coordinates(part.exterior)[:-1])
 
-        return polygon_gdspy
-    else:
-        raise TypeError("input must be a Shapely Polygon or a Shapely MultiPolygon")
+    if not polygon_list:
+        return None
+    return gdspy.PolygonSet(polygon_list)
 
 
 def simplify_coord_to_gdspy(
-        pos_neg_list_list,  # type: Tuple[List[List[Tuple[float, float]]], List[List[Tuple[float, float]]]]
-        tolerance=5e-4,  # type: float
-):
+        pos_neg_list_list: Tuple[List[List[Tuple[float, float]]], List[List[Tuple[float, float]]]],
+        tolerance: float = 5e-4,
+        precision: float = 1e-4,
+) -> Optional[gdspy.PolygonSet]:
+    """
+    Merges the passed polygons, simplifies the result with the Douglas-Peucker algorithm and converts it to gdspy
+
+    Parameters
+    ----------
+    pos_neg_list_list : Tuple[List, List]
+        A tuple containing two lists: the list of positive polygon shapes and the list of negative polygon shapes.
+    tolerance : float
+        Maximum distance between the simplified boundary and the original one
+    precision : float
+        Precision of the boolean used to cut the holes
+
+    Returns
+    -------
+    poly_gdspy_simplified : Optional[gdspy.PolygonSet]
+        The simplified polygons in gdspy representation
+    """
     poly_shapely = coord_to_shapely(pos_neg_list_list)
-    poly_shapely_simplified = poly_shapely.simplify(tolerance)
-    poly_gdspy_simplified = shapely_to_gdspy(poly_shapely_simplified)
+    poly_shapely_simplified = shapely.simplify(poly_shapely, tolerance, preserve_topology=True)
+    poly_gdspy_simplified = shapely_to_gdspy(poly_shapely_simplified, precision=precision)
 
     return poly_gdspy_simplified
+
+
+def simplify_pointlists(pointlists: List[List[Tuple[float, float]]],
+                        tolerance: float,
+                        ) -> List[np.ndarray]:
+    """
+    Simplifies each polygon point list on its own with the Douglas-Peucker algorithm, in a single vectorized call.
+    Polygons are not merged, and each simplified polygon stays valid if its input was.
+
+    Parameters
+    ----------
+    pointlists : List[List[Tuple[float, float]]]
+        The list of polygon point lists
+    tolerance : float
+        Maximum distance between the simplified boundary and the original one
+
+    Returns
+    -------
+    simplified_pointlists : List[np.ndarray]
+        The simplified polygon point lists. Polygons that collapse are dropped
+    """
+    polygons = shapely.simplify(pointlists_to_shapely(pointlists), tolerance, preserve_topology=True)
+    coords, index = shapely.get_coordinates(shapely.get_exterior_ring(polygons), return_index=True)
+    offsets = np.searchsorted(index, np.arange(len(polygons) + 1)).tolist()
+
+    # Shapely rings repeat the first point at the end, content list polygons do not
+    return [coords[start:stop - 1] for start, stop in zip(offsets[:-1], offsets[1:]) if stop - start > 3]
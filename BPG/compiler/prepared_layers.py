@@ -0,0 +1,93 @@
+"""
+This module implements the prepared layers shared by the dataprep flows run on the same flat content list.
+
+Standard dataprep and LSF dataprep both start by sorting the flat content list by layer and converting the shapes of
+every layer into the polygon format of the dataprep engine. These steps only depend on the content and on the dataprep
+routine settings, so a PreparedLayers object keeps their results and hands them to every Dataprep object created for
+the same content list. The converted polygons are never modified in place by the dataprep operations, which always
+build new polygons, so they can safely be shared.
+"""
+import time
+import logging
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from BPG.content_list import ContentList
+    from BPG.bpg_custom_types import lpp_type
+
+
+class PreparedLayers:
+    """
+    Cache of the layer sorted content and the converted input polygons of one flat content list.
+
+    Converted polygons are keyed by the layer and by every setting that changes the conversion, so that a change in
+    the dataprep routine settings or engine between two runs results in a new conversion rather than stale polygons.
+    """
+    def __init__(self,
+                 content_list_flat: "ContentList",
+                 ) -> None:
+        """
+        Parameters
+        ----------
+        content_list_flat : ContentList
+            The flattened content list the layers are prepared from
+        """
+        self.content_list_flat = content_list_flat
+        self._content_list_flat_sorted_by_layer: Optional[Dict["lpp_type", "ContentList"]] = None
+        # Conversion-key keyed (converted polygons, [vertices before, vertices after] simplification counts or None)
+        self._polygons: Dict[Tuple, Tuple[Any, Optional[List[int]]]] = {}
+        self.n_hits = 0
+        self.n_misses = 0
+
+    @property
+    def content_list_flat_sorted_by_layer(self) -> Dict["lpp_type", "ContentList"]:
+        """ The flat content list sorted into one content list per layer, sorted on first access """
+        if self._content_list_flat_sorted_by_layer is None:
+            start = time.time()
+            self._content_list_flat_sorted_by_layer = self.content_list_flat.sort_content_list_by_layers()
+            end = time.time()
+            logging.info(f'Sorting flat content list by layer took {end - start:.4g}s')
+        return self._content_list_flat_sorted_by_layer
+
+    def get_polygons(self,
+                     key: Tuple,
+                     ) -> Optional[Tuple[Any, Optional[List[int]]]]:
+        """
+        Returns the converted polygons stored for a conversion key, and their simplification vertex counts.
+
+        Parameters
+        ----------
+        key : Tuple
+            The layer and conversion settings the polygons were converted with
+
+        Returns
+        -------
+        entry : Optional[Tuple[Any, Optional[List[int]]]]
+            The converted polygons and the simplification vertex counts, or None if the key was not converted yet
+        """
+        entry = self._polygons.get(key, None)
+        if entry is None:
+            self.n_misses += 1
+        else:
+            self.n_hits += 1
+        return entry
+
+    def store_polygons(self,
+                       key: Tuple,
+                       polygons: Any,
+                       simplify_vertex_counts: Optional[List[int]] = None,
+                       ) -> None:
+        """
+        Stores the converted polygons of a conversion key.
+
+        Parameters
+        ----------
+        key : Tuple
+            The layer and conversion settings the polygons were converted with
+        polygons : Any
+            The converted polygons, in the polygon format of the dataprep engine
+        simplify_vertex_counts : Optional[List[int]]
+            The [vertices before, vertices after] counts of the input simplification, if the layer was simplified
+        """
+        self._polygons[key] = (polygons, simplify_vertex_counts)
@@ -0,0 +1,265 @@
+"""
+This module implements the raster based rough add. Shapes are painted onto a boolean mask whose cells are the rough
+grid, sized with dilation and erosion of the mask, and the mask is converted back into Manhattan rectangles.
+The cost scales with the shape area and perimeter measured in rough grid cells, not with the number of vertices.
+"""
+import numpy as np
+
+from typing import List, Tuple, Sequence
+
+# Maximum number of mask cells painted at once. Larger layouts are processed in bands of rows
+RASTER_MAX_CELLS = 2 ** 24
+
+
+def polygon_edges(pointlists: Sequence[np.ndarray],
+                  ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns the edges of all the passed polygons, together with the winding direction of each edge once all polygons
+    are oriented counterclockwise.
+
+    Parameters
+    ----------
+    pointlists : Sequence[np.ndarray]
+        The polygon pointlists. The polygons are implicitly closed
+
+    Returns
+    -------
+    x1, y1, x2, y2, winding : Tuple[np.ndarray, ...]
+        The edge end points, and +1 / -1 for edges going up / down in the counterclockwise orientation
+    """
+    pointlists = [np.asarray(points, dtype=float).reshape(-1, 2) for points in pointlists]
+    pointlists = [points for points in pointlists if len(points) >= 3]
+    if not pointlists:
+        empty = np.empty(0, dtype=float)
+        return empty, empty, empty, empty, empty
+
+    lengths = np.array([len(points) for points in pointlists])
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    p1 = np.concatenate(pointlists, axis=0)
+    # The next point of the last point of each polygon is its first point
+    p2 = np.roll(p1, -1, axis=0)
+    p2[starts + lengths - 1] = p1[starts]
+
+    # Shoelace formula, the sign gives the orientation of each polygon
+    cross = p1[:, 0] * p2[:, 1] - p2[:, 0] * p1[:, 1]
+    orientation = np.where(np.add.reduceat(cross, starts) < 0, -1.0, 1.0)
+    winding = np.sign(p2[:, 1] - p1[:, 1]) * np.repeat(orientation, lengths)
+
+    return p1[:, 0], p1[:, 1], p2[:, 0], p2[:, 1], winding
+
+
+def _expand_rows(row_lo: np.ndarray,
+                 row_hi: np.ndarray,
+                 ) -> Tuple[np.ndarray, np.ndarray]:
+    """ Returns the (item index, row) pairs of all rows between row_lo and row_hi (inclusive) of each item """
+    counts = np.maximum(row_hi - row_lo + 1, 0)
+    item_idx = np.repeat(np.arange(len(counts)), counts)
+    rows = row_lo[item_idx] + np.arange(len(item_idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return item_idx, rows
+
+
+def polygon_spans(pointlists: Sequence[np.ndarray],
+                  grid_size: float,
+                  eps: float,
+                  ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes the horizontal runs of grid cells that overlap the union of the passed polygons.
+    A cell is covered if the polygon interior overlaps it: cells that only touch a polygon on their boundary are not.
+
+    Runs come from two sources. The interior of the polygons is filled along the center line of each row of cells
+    with the nonzero winding rule, and every edge covers the cells it crosses in each row.
+
+    Parameters
+    ----------
+    pointlists : Sequence[np.ndarray]
+        The polygon pointlists
+    grid_size : float
+        The size of the grid cells. Cell (row, col) spans [col, col + 1) x [row, row + 1) times grid_size
+    eps : float
+        Overlaps smaller than eps are ignored, so that shapes drawn on the grid lines do not cover extra cells
+
+    Returns
+    -------
+    rows, col_start, col_stop : Tuple[np.ndarray, np.ndarray, np.ndarray]
+        The row and the [col_start, col_stop) column range of each run. Runs may overlap
+    """
+    x1, y1, x2, y2, winding = polygon_edges(pointlists)
+    y_min = np.minimum(y1, y2)
+    y_max = np.maximum(y1, y2)
+
+    # 1) Fill the interior along the row center lines, y = (row + 0.5) * grid_size
+    # An edge crosses the center lines in [y_min, y_max), horizontal edges cross none
+    edge_idx, rows = _expand_rows(np.ceil(y_min / grid_size - 0.5).astype(np.int64),
+                                  np.ceil(y_max / grid_size - 0.5).astype(np.int64) - 1)
+    y_center = (rows + 0.5) * grid_size
+    x_cross = x1[edge_idx] + (y_center - y1[edge_idx]) * (
+        (x2[edge_idx] - x1[edge_idx]) / (y2[edge_idx] - y1[edge_idx]))
+
+    # The winding number of each row is back to 0 after its last crossing, so a single cumulative sum over the
+    # crossings sorted by row and x gives the winding number between every pair of consecutive crossings
+    order = np.lexsort((x_cross, rows))
+    rows, x_cross = rows[order], x_cross[order]
+    inside = np.cumsum(winding[edge_idx][order])[:-1] != 0
+    inside &= rows[:-1] == rows[1:]
+    fill_rows = rows[:-1][inside]
+    fill_start = np.floor((x_cross[:-1][inside] + eps) / grid_size).astype(np.int64)
+    fill_stop = np.ceil((x_cross[1:][inside] - eps) / grid_size).astype(np.int64)
+
+    # 2) Cells crossed by the edges, clipped to each row of cells they span
+    edge_idx, rows = _expand_rows(np.floor((y_min + eps) / grid_size).astype(np.int64),
+                                  np.ceil((y_max - eps) / grid_size).astype(np.int64) - 1)
+    ex1, ey1, ex2, ey2 = x1[edge_idx], y1[edge_idx], x2[edge_idx], y2[edge_idx]
+    y_lo = np.maximum(np.minimum(ey1, ey2), rows * grid_size)
+    y_hi = np.minimum(np.maximum(ey1, ey2), (rows + 1) * grid_size)
+    dy = ey2 - ey1
+    # Horizontal edges cover their whole length
+    slope = np.divide(ex2 - ex1, dy, out=np.zeros_like(dy), where=dy != 0)
+    x_lo = np.where(dy != 0, ex1 + (y_lo - ey1) * slope, ex1)
+    x_hi = np.where(dy != 0, ex1 + (y_hi - ey1) * slope, ex2)
+    edge_start = np.floor((np.minimum(x_lo, x_hi) + eps) / grid_size).astype(np.int64)
+    edge_stop = np.ceil((np.maximum(x_lo, x_hi) - eps) / grid_size).astype(np.int64)
+
+    # Single point crossings of vertical edges lying on a grid line cover no cell
+    return (np.concatenate([fill_rows, rows]),
+            np.concatenate([fill_start, edge_start]),
+            np.concatenate([fill_stop, edge_stop]))
+
+
+def dilate_mask(mask: np.ndarray,
+                cells: int,
+                ) -> np.ndarray:
+    """ Dilates the boolean mask by a square of +/- cells in x and y """
+    out = mask.copy()
+    for shift in range(1, cells + 1):
+        out[shift:, :] |= mask[:-shift, :]
+        out[:-shift, :] |= mask[shift:, :]
+    rows_dilated = out.copy()
+    for shift in range(1, cells + 1):
+        out[:, shift:] |= rows_dilated[:, :-shift]
+        out[:, :-shift] |= rows_dilated[:, shift:]
+    return out
+
+
+def erode_mask(mask: np.ndarray,
+               cells: int,
+               ) -> np.ndarray:
+    """ Erodes the boolean mask by a square of +/- cells in x and y """
+    return ~dilate_mask(~mask, cells)
+
+
+def mask_runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Returns the row and the [col_start, col_stop) column range of every horizontal run of True cells """
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    transitions = np.diff(padded, axis=1)
+    # Starts and stops are both listed in row major order, so the k-th start and the k-th stop form a run
+    rows, col_start = np.nonzero(transitions == 1)
+    _, col_stop = np.nonzero(transitions == -1)
+    return rows, col_start, col_stop
+
+
+def merge_runs_to_rectangles(rows: np.ndarray,
+                             col_start: np.ndarray,
+                             col_stop: np.ndarray,
+                             ) -> np.ndarray:
+    """
+    Merges identical runs on consecutive rows into rectangles
+
+    Returns
+    -------
+    rects : np.ndarray
+        (M, 4) array of [col_start, row_start, col_stop, row_stop] cell index rectangles
+    """
+    if not len(rows):
+        return np.empty((0, 4), dtype=np.int64)
+
+    order = np.lexsort((rows, col_stop, col_start))
+    rows, col_start, col_stop = rows[order], col_start[order], col_stop[order]
+    new_rect = np.ones(len(rows), dtype=bool)
+    new_rect[1:] = (col_start[1:] != col_start[:-1]) | (col_stop[1:] != col_stop[:-1]) | (rows[1:] != rows[:-1] + 1)
+    first = np.flatnonzero(new_rect)
+    last = np.append(first[1:], len(rows)) - 1
+    return np.stack([col_start[first], rows[first], col_stop[first], rows[last] + 1], axis=1)
+
+
+def rough_raster_rectangles(pointlists: Sequence[np.ndarray],
+                            grid_size: float,
+                            dilate_cells: int,
+                            erode_cells: int,
+                            eps: float,
+                            grow_cells: int = 0,
+                            max_cells: int = RASTER_MAX_CELLS,
+                            ) -> np.ndarray:
+    """
+    Rasterizes the union of the passed polygons onto the grid, dilates, erodes then dilates the mask again, and
+    returns the covered area as a list of non overlapping rectangles snapped to the grid.
+
+    Parameters
+    ----------
+    pointlists : Sequence[np.ndarray]
+        The polygon pointlists
+    grid_size : float
+        The raster grid size. The grid is aligned to the origin
+    dilate_cells : int
+        Number of cells by which the mask is dilated
+    erode_cells : int
+        Number of cells by which the dilated mask is eroded
+    eps : float
+        Overlaps smaller than eps are ignored when rasterizing
+    grow_cells : int
+        Number of cells by which the eroded mask is dilated
+    max_cells : int
+        Maximum number of cells of the mask processed at once
+
+    Returns
+    -------
+    rects : np.ndarray
+        (M, 4) array of [left, bottom, right, top] rectangles
+    """
+    span_rows, span_start, span_stop = polygon_spans(pointlists, grid_size, eps)
+    valid = span_stop > span_start
+    span_rows, span_start, span_stop = span_rows[valid], span_start[valid], span_stop[valid]
+    if not len(span_rows):
+        return np.empty((0, 4), dtype=float)
+
+    # Leave room around the shapes for the dilation
+    margin = dilate_cells + erode_cells + grow_cells + 1
+    col0 = span_start.min() - margin
+    num_cols = span_stop.max() + margin - col0
+    row0, row1 = span_rows.min() - margin, span_rows.max() + margin + 1
+    span_start = span_start - col0
+    span_stop = span_stop - col0
+
+    # Process the rows in bands. Each band is painted with a halo of rows so that the sizing is exact inside it
+    halo = dilate_cells + erode_cells + grow_cells
+    band_rows = max(1, max_cells // num_cols - 2 * halo)
+    order = np.argsort(span_rows, kind='stable')
+    span_rows, span_start, span_stop = span_rows[order], span_start[order], span_stop[order]
+
+    run_chunks: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+    for band_start in range(row0, row1, band_rows):
+        band_stop = min(band_start + band_rows, row1)
+        paint_start, paint_stop = band_start - halo, band_stop + halo
+        lo, hi = np.searchsorted(span_rows, [paint_start, paint_stop])
+        if lo == hi:
+            continue
+
+        # Paint the runs with a difference array: +1 at the start of each run and -1 after its end
+        num_paint_rows = paint_stop - paint_start
+        band_rows_idx = span_rows[lo:hi] - paint_start
+        diff = np.bincount(band_rows_idx * (num_cols + 1) + span_start[lo:hi],
+                           minlength=num_paint_rows * (num_cols + 1)).astype(np.int32)
+        diff -= np.bincount(band_rows_idx * (num_cols + 1) + span_stop[lo:hi],
+                            minlength=num_paint_rows * (num_cols + 1)).astype(np.int32)
+        mask = np.cumsum(diff.reshape(num_paint_rows, num_cols + 1), axis=1)[:, :-1] > 0
+
+        mask = dilate_mask(erode_mask(dilate_mask(mask, dilate_cells), erode_cells), grow_cells)
+        rows, col_start, col_stop = mask_runs(mask[halo:halo + band_stop - band_start])
+        run_chunks.append((rows + band_start, col_start, col_stop))
+
+    if not run_chunks:
+        return np.empty((0, 4), dtype=float)
+
+    rects = merge_runs_to_rectangles(*(np.concatenate(chunk) for chunk in zip(*run_chunks)))
+    rects += np.array([col0, 0, col0, 0])
+    return rects * grid_size
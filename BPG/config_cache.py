@@ -0,0 +1,191 @@
+"""
+This module provides a process-wide cache of the parsed YAML configuration files, and the precompiled tech bundle.
+
+The tech files (layermap, lumerical map, dataprep routine and dataprep parameters) are read by the tech info, the
+template database, the GDS and Lumerical plugins and the materials file generation. load_yaml_cached parses each file
+once per process, and parses it again only when its modification time or size changes.
+
+A tech bundle is a single binary file holding the parsed content of all tech files, protected by a checksum. Reading a
+bundle seeds the cache with its content, so that a fresh process does not parse any YAML for the tech files. Entries of
+the bundle whose source file was modified after the bundle was written are ignored, and that file is parsed again.
+"""
+import copy
+import hashlib
+import logging
+import os
+import pickle
+import string
+import yaml
+
+from pathlib import Path
+
+from typing import TYPE_CHECKING, Any, Dict, Tuple, Union
+
+if TYPE_CHECKING:
+    from BPG.photonic_core import PhotonicTechInfo
+
+# First bytes of every tech bundle file, followed by the sha256 digest of the payload and the payload itself
+TECH_BUNDLE_MAGIC = b'BPGTECH1'
+
+# Resolved path keyed (modification time, size, parsed content) of the YAML files loaded in this process
+_yaml_cache: Dict[str, Tuple[int, int, Any]] = {}
+
+
+def _file_signature(filepath: Union[str, Path]) -> Tuple[str, int, int]:
+    """ Returns the resolved path, modification time and size identifying the current version of a file """
+    path = Path(filepath).resolve()
+    stat = path.stat()
+    return str(path), stat.st_mtime_ns, stat.st_size
+
+
+def load_yaml_cached(filepath: Union[str, Path],
+                     copy_content: bool = True,
+                     ) -> Any:
+    """
+    Returns the parsed content of a YAML file, parsing it only if it changed since it was last loaded.
+
+    Parameters
+    ----------
+    filepath : Union[str, Path]
+        Path to the YAML file
+    copy_content : bool = True
+        True to return a copy of the cached content that the caller is free to modify.
+        False to return the cached content itself, which must then be treated as read-only.
+
+    Returns
+    -------
+    content : Any
+        The parsed content of the file
+    """
+    path, mtime, size = _file_signature(filepath)
+    entry = _yaml_cache.get(path, None)
+    if entry is None or entry[:2] != (mtime, size):
+        with open(path, 'r') as f:
+            content = yaml.load(f, Loader=yaml.CFullLoader if yaml.__with_libyaml__ else yaml.FullLoader)
+        _yaml_cache[path] = (mtime, size, content)
+    else:
+        content = entry[2]
+
+    return copy.deepcopy(content) if copy_content else content
+
+
+def parse_yaml_file(filepath: Union[str, Path]) -> Any:
+    """
+    Parses a YAML file after substituting the environment variables it references, as is done for the BAG and BPG
+    configuration files. These files are not cached, as their content depends on the environment.
+
+    Parameters
+    ----------
+    filepath : Union[str, Path]
+        Path to the YAML file
+
+    Returns
+    -------
+    content : Any
+        The parsed content of the file
+    """
+    with open(filepath, 'r') as f:
+        content = string.Template(f.read()).substitute(os.environ)
+    return yaml.load(content, Loader=yaml.CFullLoader if yaml.__with_libyaml__ else yaml.FullLoader)
+
+
+def clear_config_cache() -> None:
+    """ Empties the parsed configuration cache, forcing all files to be parsed again """
+    _yaml_cache.clear()
+
+
+def write_tech_bundle(photonic_tech_info: "PhotonicTechInfo",
+                      filepath: Union[str, Path],
+                      ) -> None:
+    """
+    Writes the tech files of a tech info into a tech bundle.
+
+    Parameters
+    ----------
+    photonic_tech_info : PhotonicTechInfo
+        The tech info whose layermap, lumerical map, dataprep routine and dataprep parameters files are bundled
+    filepath : Union[str, Path]
+        Path of the bundle file to write
+    """
+    sources = [photonic_tech_info.layermap_path,
+               photonic_tech_info.lsf_export_path,
+               photonic_tech_info.dataprep_routine_filepath,
+               photonic_tech_info.dataprep_parameters_filepath]
+
+    entries = {}
+    for source in sources:
+        if source:
+            path, mtime, size = _file_signature(source)
+            entries[path] = (mtime, size, load_yaml_cached(path, copy_content=False))
+
+    payload = pickle.dumps(entries, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(filepath, 'wb') as f:
+        f.write(TECH_BUNDLE_MAGIC)
+        f.write(hashlib.sha256(payload).digest())
+        f.write(payload)
+    logging.info(f'Wrote tech bundle with {len(entries)} files to {filepath}')
+
+
+def read_tech_bundle(filepath: Union[str, Path]) -> int:
+    """
+    Reads a tech bundle and seeds the configuration cache with the files that did not change since it was written.
+
+    Parameters
+    ----------
+    filepath : Union[str, Path]
+        Path of the bundle file to read
+
+    Returns
+    -------
+    n_loaded : int
+        The number of files loaded from the bundle
+    """
+    with open(filepath, 'rb') as f:
+        data = f.read()
+
+    digest_start = len(TECH_BUNDLE_MAGIC)
+    payload_start = digest_start + hashlib.sha256().digest_size
+    if not data.startswith(TECH_BUNDLE_MAGIC):
+        raise ValueError(f'{filepath} is not a tech bundle file')
+    if hashlib.sha256(data[payload_start:]).digest() != data[digest_start:payload_start]:
+        raise ValueError(f'Tech bundle {filepath} is corrupted: checksum mismatch')
+
+    n_loaded = 0
+    for path, (mtime, size, content) in pickle.loads(data[payload_start:]).items():
+        if os.path.isfile(path) and _file_signature(path)[1:] == (mtime, size):
+            _yaml_cache[path] = (mtime, size, content)
+            n_loaded += 1
+        else:
+            logging.warning(f'{path} changed since tech bundle {filepath} was written, it will be parsed again')
+
+    return n_loaded
+
+
+def preload_tech_files(photonic_tech_config_path: Union[str, Path]) -> int:
+    """
+    Loads the tech files listed in a photonic tech config into the cache, from its tech bundle if it has one. This lets
+    a parent process parse the shared tech configuration once before starting workers.
+
+    Parameters
+    ----------
+    photonic_tech_config_path : Union[str, Path]
+        Path to the photonic tech config file
+
+    Returns
+    -------
+    n_loaded : int
+        The number of tech files in the cache
+    """
+    photonic_tech_params = parse_yaml_file(photonic_tech_config_path)
+    bundle = photonic_tech_params.get('tech_bundle', None)
+    if bundle and os.path.isfile(bundle):
+        read_tech_bundle(bundle)
+
+    n_loaded = 0
+    for key in ['layermap', 'lsf_dataprep_filepath', 'dataprep_routine_filepath', 'dataprep_parameters_filepath']:
+        filepath = photonic_tech_params.get(key, None)
+        if filepath and os.path.isfile(filepath):
+            load_yaml_cached(filepath, copy_content=False)
+            n_loaded += 1
+
+    return n_loaded
@@ -3,12 +3,14 @@
 """
 This module defines the content list object that is used in db.
 """
+import numpy as np
 from collections import UserDict
 
+from bag.layout.util import transform_table
 from BPG.objects import PhotonicRect, PhotonicPolygon, PhotonicRound, PhotonicBlockage, PhotonicBoundary, \
     PhotonicPath, PhotonicPinInfo
 
-from typing import TYPE_CHECKING, Dict, List, Tuple, Any
+from typing import TYPE_CHECKING, Dict, List, Tuple, Any, Sequence
 from BPG.bpg_custom_types import coord_type, dim_type, lpp_type
 
 if TYPE_CHECKING:
@@ -18,7 +20,7 @@ if TYPE_CHECKING:
 class ContentList(UserDict):
     layout_objects_keys = (
         'rect_list', 'via_list', 'pin_list', 'path_list', 'blockage_list', 'boundary_list',
-        'polygon_list', 'round_list', 'sim_list', 'source_list', 'monitor_list'
+        'polygon_list', 'round_list', 'sim_list', 'source_list', 'monitor_list', 'polygon_array_list'
     )
     all_iterables_keys = ('inst_list',) + layout_objects_keys
 
@@ -88,6 +90,10 @@ class ContentList(UserDict):
     def monitor_list(self) -> List:
         return self['monitor_list']
 
+    @property
+    def polygon_array_list(self) -> List:
+        return self['polygon_array_list']
+
     @property
     def cell_name(self) -> 'str':
         return self['cell_name']
@@ -107,6 +113,31 @@ class ContentList(UserDict):
             **{key: self[key].copy() for key in self.layout_objects_keys}   # Copy the layout objects
         )
 
+    def shape_counts(self, elements: bool = False) -> Dict[str, int]:
+        """
+        Returns the number of instances and of layout objects of each kind in the content list.
+
+        Parameters
+        ----------
+        elements : bool
+            True to count every element of the arrayed rects, rounds and vias and every polygon of the polygon arrays,
+            rather than each of them as a single object
+
+        Returns
+        -------
+        counts : Dict[str, int]
+            The number of objects, or of elements, of each kind
+        """
+        counts = {key: len(self[key]) for key in self.all_iterables_keys}
+        if elements:
+            counts['rect_list'] = sum(rect.get('arr_nx', 1) * rect.get('arr_ny', 1) for rect in self.rect_list)
+            counts['round_list'] = sum(round_obj.get('arr_nx', 1) * round_obj.get('arr_ny', 1)
+                                       for round_obj in self.round_list)
+            counts['via_list'] = sum(via.arr_nx * via.arr_ny for via in self.via_list)
+            counts['polygon_array_list'] = sum(len(polygon_array['offsets']) - 1
+                                               for polygon_array in self.polygon_array_list)
+        return counts
+
     def to_bag_tuple_format(self) -> Tuple:
         """
         Returns the BAG tuple format of the ContentList
@@ -288,6 +319,7 @@ class ContentList(UserDict):
         new_sim_list = []
         new_source_list = []
         new_monitor_list = []
+        new_polygon_array_list = []
 
         # add rectangles
         for rect in self.rect_list:
@@ -400,6 +432,19 @@ class ContentList(UserDict):
                 ).content
             )
 
+        # Polygon arrays are transformed all at once, the offsets do not change
+        array_loc = np.array(loc) * res if unit_mode else np.array(loc)
+        mat = transform_table[orient]
+        for polygon_array in self.polygon_array_list:
+            vertices = np.dot(np.asarray(polygon_array['vertices'], dtype=float).reshape(-1, 2), mat.T) + array_loc
+            new_polygon_array_list.append(
+                dict(
+                    layer=polygon_array['layer'],
+                    vertices=np.round(vertices / res) * res,
+                    offsets=polygon_array['offsets'],
+                )
+            )
+
         for sim in self.sim_list:
             new_sim_list.append(sim)
 
@@ -423,6 +468,7 @@ class ContentList(UserDict):
             sim_list=new_sim_list,
             source_list=new_source_list,
             monitor_list=new_monitor_list,
+            polygon_array_list=new_polygon_array_list,
         )
 
     def via_to_polygon_and_delete(self,
@@ -508,3 +554,59 @@ class ContentList(UserDict):
                 polygon_list.append(via_polygon)
 
         return polygon_list
+
+
+def polygon_array_from_pointlists(layer: lpp_type,
+                                  pointlists: Sequence[Sequence[coord_type]],
+                                  ) -> Dict[str, Any]:
+    """
+    Packs a list of polygon pointlists on a single layer into one polygon array content item.
+    The vertices of all polygons are stored back to back in a single (N, 2) array, and polygon i is made of the
+    vertices between offsets[i] and offsets[i + 1].
+
+    Parameters
+    ----------
+    layer : Tuple[str, str]
+        The layer purpose pair of the polygons
+    pointlists : Sequence[Sequence[Tuple[float, float]]]
+        The polygon pointlists. Each pointlist can be a list of point tuples or an (n, 2) array
+
+    Returns
+    -------
+    polygon_array : Dict[str, Any]
+        The polygon array content item, with layer, vertices and offsets keys
+    """
+    lengths = [len(points) for points in pointlists]
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    if lengths:
+        vertices = np.concatenate([np.asarray(points, dtype=float).reshape(-1, 2) for points in pointlists], axis=0)
+    else:
+        vertices = np.empty((0, 2), dtype=float)
+
+    return dict(
+        layer=(layer[0], layer[1]),
+        vertices=vertices,
+        offsets=offsets,
+    )
+
+
+def polygon_array_to_pointlists(polygon_array: Dict[str, Any],
+                                ) -> List[np.ndarray]:
+    """
+    Splits a polygon array content item into its polygons. The returned arrays are views into the vertex array of
+    the content item, no coordinates are copied.
+
+    Parameters
+    ----------
+    polygon_array : Dict[str, Any]
+        The polygon array content item, with layer, vertices and offsets keys
+
+    Returns
+    -------
+    pointlists : List[np.ndarray]
+        One (n, 2) array of vertices per polygon
+    """
+    vertices = np.asarray(polygon_array['vertices'], dtype=float).reshape(-1, 2)
+    offsets = np.asarray(polygon_array['offsets'], dtype=np.int64).tolist()
+    return [vertices[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
@@ -1,8 +1,7 @@
-import yaml
+import math
 import time
 import logging
-from collections import OrderedDict
-# from memory_profiler import memory_usage
+from collections import OrderedDict, defaultdict
 
 # BAG Imports
 from bag.layout.template import TemplateDB
@@ -10,12 +9,11 @@ from bag.util.cache import _get_unique_name
 
 # BPG Imports
 from .content_list import ContentList
-
-# Plugin Imports
-from .compiler.dataprep_gdspy import Dataprep
+from .config_cache import load_yaml_cached
+from .tracing import tracer, traced, span, annotate
 
 # Typing Imports
-from typing import TYPE_CHECKING, Dict, Optional, Sequence, List, Tuple
+from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence, List, Set, Tuple
 
 if TYPE_CHECKING:
     from BPG.photonic_core import PhotonicTechInfo
@@ -23,6 +21,7 @@ if TYPE_CHECKING:
     from bag.core import RoutingGrid
     from bag.core import BagProject
     from BPG.template import PhotonicTemplateBase
+    from BPG.compiler.prepared_layers import PreparedLayers
 
 
 class PhotonicTemplateDB(TemplateDB):
@@ -34,6 +33,10 @@ class PhotonicTemplateDB(TemplateDB):
                  use_cybagoa: bool = False,
                  gds_lay_file: str = '',
                  photonic_tech_info: 'PhotonicTechInfo' = None,
+                 dataprep_engine: str = 'gdspy',
+                 dataprep_output_arrays: bool = False,
+                 collect_geometry_stats: bool = False,
+                 angle_tolerance: float = 1.0e-9,
                  **kwargs,
                  ) -> None:
         TemplateDB.__init__(self,
@@ -49,13 +52,117 @@ class PhotonicTemplateDB(TemplateDB):
         self.photonic_tech_info = photonic_tech_info
         self.impl_cell = None
 
+        # Polygon engine used to run the dataprep procedure: 'gdspy' or 'shapely'
+        self.dataprep_engine = dataprep_engine
+        # True to keep the dataprep output as per-layer polygon arrays instead of one polygon entry per polygon
+        self.dataprep_output_arrays = dataprep_output_arrays
+
         # Storage for the cache used to speed up flattening.
         self.flattening_cache: Dict[Tuple, "ContentList"] = {}
 
+        # True to record the geometry statistics of the flattened masters and of the dataprep operations
+        self.collect_geometry_stats = collect_geometry_stats
+        # Master key keyed (master class name, own shape count, child master key of each instance), in the order in
+        # which the masters finished flattening
+        self._flatten_graph: Dict[Tuple, Tuple[str, int, List[Tuple]]] = {}
+        # Per master class statistics of the last flattening, and statistics of every dataprep operation run
+        self.master_stats: List[Dict[str, Any]] = []
+        self.dataprep_stats: List[Dict[str, Any]] = []
+
+        # Quantum in radians to which the angles of rotated masters are rounded, so that rotations that only differ by
+        # float noise share one master. 0 to keep the exact angles
+        self.angle_tolerance = angle_tolerance
+        # (master key, canonical angle) keyed rotated masters, and the number of rotations found in or added to it
+        self._rotated_masters: Dict[Tuple, "PhotonicTemplateBase"] = {}
+        self.rotated_master_hits = 0
+        self.rotated_master_misses = 0
+
+        # Cell naming scope of the current run when masters are shared between runs, see start_naming_scope. None
+        # when the cells keep the names the masters were created with
+        self._scope_cell_names: Optional[Dict[str, str]] = None
+        self._scope_used_names: Set[str] = set()
+
+    def new_template(self, *args, **kwargs) -> "DesignMaster":
+        """ Creates a new master, or returns the existing master with the same parameters, in a trace span """
+        if not tracer.enabled:
+            master = TemplateDB.new_template(self, *args, **kwargs)
+        else:
+            temp_cls = kwargs.get('temp_cls', None)
+            with span('new_template', template=getattr(temp_cls, '__name__', None)):
+                master = TemplateDB.new_template(self, *args, **kwargs)
+        self.add_to_naming_scope(master)
+        return master
+
+    def start_naming_scope(self) -> None:
+        """
+        Starts a new cell naming scope, so that a run reusing the masters created by previous runs names its cells as
+        a run on a new template database would. The cell renaming of the previous runs is forgotten, and every master
+        used from now on is named after its basename, made unique among the masters used in this scope in the order
+        they are first used. Only the masters themselves are shared with the previous runs.
+        """
+        self._rename_dict = {}
+        self._scope_cell_names = {}
+        self._scope_used_names = set()
+
+    def add_to_naming_scope(self, master: "PhotonicTemplateBase") -> None:
+        """ Names a master used by the current run in the current naming scope, if there is one """
+        if self._scope_cell_names is None or master.cell_name in self._scope_cell_names:
+            return
+        # A master reused from a previous run was created after its children, so the children are named first
+        for inst in master._layout._inst_list:
+            self.add_to_naming_scope(inst.master)
+        name = _get_unique_name(master.get_layout_basename(), self._scope_used_names)
+        self._scope_used_names.add(name)
+        self._scope_cell_names[master.cell_name] = name
+        if name != master.cell_name:
+            self._rename_dict[master.cell_name] = name
+
+    @property
+    def used_cell_names(self) -> Set[str]:
+        """ The cell names used by the masters, or by the masters used in the current naming scope if there is one """
+        if self._scope_cell_names is None:
+            return self._used_cell_names
+        return self._scope_used_names
+
+    def canonical_angle(self, angle: float) -> float:
+        """ Returns the angle rounded to the nearest multiple of angle_tolerance that is at most pi/2 """
+        if not self.angle_tolerance:
+            return angle
+        steps = round(angle / self.angle_tolerance)
+        if steps * self.angle_tolerance > math.pi / 2:
+            steps -= 1
+        return steps * self.angle_tolerance
+
+    def find_rotated_master(self,
+                            master: "PhotonicTemplateBase",
+                            angle: float,
+                            ) -> Optional["PhotonicTemplateBase"]:
+        """
+        Returns the master already drawn with the parameters of the given master at the given canonical angle, or None
+        if the master was not rotated to this angle yet. The lookup is counted as a hit or a miss.
+        """
+        rotated_master = self._rotated_masters.get((master.key, angle), None)
+        if rotated_master is None:
+            self.rotated_master_misses += 1
+        else:
+            self.rotated_master_hits += 1
+            self.add_to_naming_scope(rotated_master)
+        return rotated_master
+
+    def register_rotated_master(self,
+                                master: "PhotonicTemplateBase",
+                                angle: float,
+                                rotated_master: "PhotonicTemplateBase",
+                                ) -> None:
+        """ Records the master drawn with the parameters of the given master at the given canonical angle """
+        self._rotated_masters[(master.key, angle)] = rotated_master
+
+    @traced('template_db.dataprep')
     def dataprep(self,
                  flat_content_list: List["ContentList"],
                  name_list: List[str],
                  is_lsf: bool = False,
+                 prepared_layers_list: Optional[List["PreparedLayers"]] = None,
                  ) -> List[ContentList]:
         """
         Initializes the dataprep plugin with the standard tech info and runs the dataprep procedure
@@ -68,26 +175,84 @@ class PhotonicTemplateDB(TemplateDB):
             The name to be provided to each dataprepped content list
         is_lsf : bool
             True if running LSF dataprep. False if running standard dataprep.
+        prepared_layers_list : Optional[List[PreparedLayers]]
+            The prepared layers of each flat content list, shared between dataprep runs. If None, every run converts
+            the content of each layer again.
+
         Returns
         -------
         post_dataprep_flat_content_list : List[ContentList]
             The ContentList object (no longer layer separated) after running dataprep
         """
         logging.info(f'In PhotonicTemplateDB.dataprep with is_lsf set to {is_lsf}')
+        # The dataprep engines are imported on first use, so that their geometry backends only load when needed
+        if self.dataprep_engine == 'gdspy':
+            from .compiler.dataprep_gdspy import Dataprep as dataprep_cls
+        elif self.dataprep_engine == 'shapely':
+            try:
+                from .compiler.dataprep_shapely import DataprepShapely as dataprep_cls
+            except ImportError:
+                raise ValueError('dataprep_engine \'shapely\' requires Shapely >= 2.0 to be installed')
+        else:
+            raise ValueError(f'Unsupported BPG configuration:  dataprep_engine:  {self.dataprep_engine}')
+        logging.info(f'Running dataprep with the {self.dataprep_engine} engine')
+
         start = time.time()
+        # The statistics of this run replace those of the previous dataprep run of the same kind
+        self.dataprep_stats = [row for row in self.dataprep_stats if row['is_lsf'] != is_lsf]
         post_dataprep_flat_content_list = []
-        for content, name in zip(flat_content_list, name_list):
-            dataprep_object = Dataprep(photonic_tech_info=self.photonic_tech_info,
-                                       grid=self.grid,
-                                       content_list_flat=content,
-                                       is_lsf=is_lsf,
-                                       impl_cell=name,
-                                       )
-            post_dataprep_flat_content_list.append(dataprep_object.dataprep())
+        if prepared_layers_list is None:
+            prepared_layers_list = [None] * len(flat_content_list)
+        for content, name, prepared_layers in zip(flat_content_list, name_list, prepared_layers_list):
+            with span('dataprep_cell', cell_name=name, is_lsf=is_lsf):
+                dataprep_object = dataprep_cls(photonic_tech_info=self.photonic_tech_info,
+                                             grid=self.grid,
+                                             content_list_flat=content,
+                                             is_lsf=is_lsf,
+                                             impl_cell=name,
+                                             output_arrays=self.dataprep_output_arrays,
+                                             prepared_layers=prepared_layers,
+                                             collect_stats=self.collect_geometry_stats,
+                                             )
+                post_dataprep_flat_content_list.append(dataprep_object.dataprep())
+            for row in dataprep_object.geometry_stats:
+                self.dataprep_stats.append(dict(cell=name, is_lsf=is_lsf, **row))
         end = time.time()
         logging.info(f'All dataprep operations completed in {end - start:.4g} s')
         return post_dataprep_flat_content_list
 
+    def _get_master_stats(self,
+                          master: 'PhotonicTemplateBase',
+                          top_name: Optional[str] = None,
+                          ) -> List[Dict[str, Any]]:
+        """
+        Returns the statistics of each master class in the flattened hierarchy of a top master: the number of distinct
+        masters, the number of times they are instantiated in the flat layout, the number of shapes drawn by the
+        masters themselves, and the number of shapes they contribute to the flat layout.
+        """
+        # Masters finish flattening after all of their children, so the reversed order visits parents first
+        multiplicity: Dict[Tuple, int] = defaultdict(int)
+        multiplicity[master.key] = 1
+        for key in reversed(list(self._flatten_graph)):
+            if multiplicity[key]:
+                for child_key in self._flatten_graph[key][2]:
+                    multiplicity[child_key] += multiplicity[key]
+
+        stats_by_class: Dict[str, Dict[str, Any]] = {}
+        for key, count in multiplicity.items():
+            if not count:
+                continue
+            class_name, own_shape_count, _ = self._flatten_graph[key]
+            stats = stats_by_class.setdefault(class_name, dict(cell=top_name or master.cell_name,
+                                                               master_class=class_name, masters=0, instances=0,
+                                                               shapes=0, flat_shapes=0))
+            stats['masters'] += 1
+            stats['instances'] += count
+            stats['shapes'] += own_shape_count
+            stats['flat_shapes'] += own_shape_count * count
+
+        return sorted(stats_by_class.values(), key=lambda stats: -stats['flat_shapes'])
+
     @staticmethod
     def reverse_no_identity_and_check(in_dict: Dict[str, str]) -> Dict[str, str]:
         """
@@ -103,6 +268,7 @@ class PhotonicTemplateDB(TemplateDB):
                 out_dict[val] = key
         return out_dict
 
+    @traced('template_db.generate_content_list')
     def generate_content_list(self,
                               master_list: Sequence["DesignMaster"],
                               name_list: Optional[Sequence[Optional[str]]] = None,
@@ -147,9 +313,9 @@ class PhotonicTemplateDB(TemplateDB):
                 rename[cur_name] = name
                 reverse_rename[name] = cur_name
 
-                if name in self._used_cell_names:
+                if name in self.used_cell_names:
                     # name is an already used name, so we need to rename it to something else
-                    name2 = _get_unique_name(name, self._used_cell_names, reverse_rename)
+                    name2 = _get_unique_name(name, self.used_cell_names, reverse_rename)
                     rename[name] = name2
                     reverse_rename[name2] = name
 
@@ -170,6 +336,7 @@ class PhotonicTemplateDB(TemplateDB):
 
         return content_list
 
+    @traced('template_db.generate_flat_content_list')
     def generate_flat_content_list(self,
                                    master_list: Sequence['PhotonicTemplateBase'],
                                    name_list: Optional[Sequence[Optional[str]]] = None,
@@ -214,9 +381,9 @@ class PhotonicTemplateDB(TemplateDB):
                 rename[cur_name] = name
                 reverse_rename[name] = cur_name
 
-                if name in self._used_cell_names:
+                if name in self.used_cell_names:
                     # name is an already used name, so we need to rename it to something else
-                    name2 = _get_unique_name(name, self._used_cell_names, reverse_rename)
+                    name2 = _get_unique_name(name, self.used_cell_names, reverse_rename)
                     rename[name] = name2
                     reverse_rename[name2] = name
 
@@ -224,6 +391,7 @@ class PhotonicTemplateDB(TemplateDB):
 
         # Clear the flattening cache
         self.flattening_cache = {}
+        self._flatten_graph = {}
         flat_content_lists = []
         start = time.time()
         # Looping handles case where multiple masters were passed to generate_flat_content_list
@@ -234,12 +402,18 @@ class PhotonicTemplateDB(TemplateDB):
         end = time.time()
         logging.info(f'Master content flattening took {end - start:.4g}s')
 
+        if self.collect_geometry_stats:
+            self.master_stats = []
+            for master, top_name in zip(master_list, name_list):
+                self.master_stats.extend(self._get_master_stats(master, top_name))
+
         if len(name_list) == 1:
             # If called from generate_flat_gds, name_list is just [self.specs['impl_cell']]
             self.impl_cell = name_list[0]
 
         return flat_content_lists
 
+    @traced('flatten_master')
     def _flatten_instantiate_master_helper(self,
                                            master: 'PhotonicTemplateBase',
                                            hierarchy_name: Optional[str] = None,
@@ -272,13 +446,15 @@ class PhotonicTemplateDB(TemplateDB):
         if not isinstance(master_content, ContentList):
             master_content = ContentList.from_bag_tuple_format(master_content)
 
-        with open(self._gds_lay_file, 'r') as f:
-            lay_info = yaml.load(f, Loader=yaml.CFullLoader if yaml.__with_libyaml__ else yaml.FullLoader)
-            via_info = lay_info['via_info']
+        via_info = load_yaml_cached(self._gds_lay_file, copy_content=False)['via_info']
 
         # Convert vias into polygons on the via and enclosure layers
         master_content.via_to_polygon_and_delete(via_info)
 
+        if self.collect_geometry_stats:
+            own_shape_count = sum(master_content.shape_counts(elements=True).values()) - len(master_content.inst_list)
+            child_master_keys = [child_instance_info['master_key'] for child_instance_info in master_content.inst_list]
+
         # For each instance in this level, recurse to get all its content
         for child_instance_info in master_content.inst_list:
             if child_instance_info['num_rows'] > 1 or child_instance_info['num_cols'] > 1:
@@ -320,11 +496,15 @@ class PhotonicTemplateDB(TemplateDB):
 
         master_content['inst_list'] = []
         end = time.time()
+        if self.collect_geometry_stats:
+            self._flatten_graph[master.key] = (master.__class__.__name__, own_shape_count, child_master_keys)
+        if tracer.recording:
+            annotate(hierarchy_name=hierarchy_name,
+                     shape_count=sum(master_content.shape_counts(elements=True).values()))
 
         logging.debug(f'PhotonicTemplateDB._flatten_instantiate_master_helper finished on '
                       f'{hierarchy_name}: \n'
                       f'\t\t\t\t\t\t\t\t\t\tflattening took {end - start:.4g}s.\n'
-                      # f'\t\t\t\t\t\t\t\t\t\tCurrent memory usage: {memory_usage(-1)} MiB'
                       )
 
         return master_content
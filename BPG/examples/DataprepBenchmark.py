@@ -0,0 +1,123 @@
+import time
+import argparse
+import BPG
+import numpy as np
+from BPG.compiler.dataprep_gdspy import Dataprep
+from BPG.compiler.dataprep_shapely import DataprepShapely
+from BPG.objects import PhotonicRound
+
+
+class DataprepBenchmark(BPG.PhotonicTemplateBase):
+    """
+    Synthetic layout used to compare the dataprep engines. Draws a dense field of randomly placed rectangles, rings
+    and rotated polygons on the phot layers of the example tech, so that most shapes overlap several others.
+
+    Parameters
+    ----------
+    n_shapes : int
+        Number of shapes of each type drawn on each layer
+    field_size : float
+        Size of the square area in which the shapes are scattered
+    seed : int
+        Seed of the random placement, so that all engines see the same layout
+    """
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        BPG.PhotonicTemplateBase.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            n_shapes='Number of shapes of each type drawn on each layer',
+            field_size='Size of the square area in which the shapes are scattered',
+            seed='Seed of the random placement',
+        )
+
+    @classmethod
+    def get_default_param_values(cls):
+        return dict(
+            n_shapes=1000,
+            field_size=200.0,
+            seed=0,
+        )
+
+    def draw_layout(self):
+        rng = np.random.RandomState(self.params['seed'])
+        n_shapes = self.params['n_shapes']
+        field_size = self.params['field_size']
+
+        for layer in [('SI', 'phot'), ('POLY', 'phot'), ('M1', 'phot')]:
+            # Rectangles
+            for x, y, w, h in zip(rng.uniform(0, field_size, n_shapes), rng.uniform(0, field_size, n_shapes),
+                                  rng.uniform(0.5, 5, n_shapes), rng.uniform(0.5, 5, n_shapes)):
+                self.add_rect(
+                    layer=layer,
+                    coord1=(x, y),
+                    coord2=(x + w, y + h),
+                )
+
+            # Rings
+            for x, y, r in zip(rng.uniform(0, field_size, n_shapes // 10), rng.uniform(0, field_size, n_shapes // 10),
+                               rng.uniform(1, 5, n_shapes // 10)):
+                self.add_obj(
+                    PhotonicRound(
+                        layer=layer,
+                        resolution=self.grid.resolution,
+                        center=(x, y),
+                        rout=r,
+                        rin=r / 2,
+                        unit_mode=False,
+                    )
+                )
+
+            # Rotated rectangles, which need Manhattanization
+            for x, y, w, theta in zip(rng.uniform(0, field_size, n_shapes // 10),
+                                      rng.uniform(0, field_size, n_shapes // 10),
+                                      rng.uniform(1, 5, n_shapes // 10), rng.uniform(0, np.pi, n_shapes // 10)):
+                corners = np.array([(0, 0), (w, 0), (w, w / 4), (0, w / 4)])
+                rotation = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+                self.add_polygon(
+                    layer=layer,
+                    points=[(x + px, y + py) for px, py in corners @ rotation.T],
+                )
+
+
+def layer_polygon_stats(content_list):
+    """ Returns the number of polygons and vertices of a post-dataprep content list """
+    n_polygons = len(content_list.polygon_list)
+    n_vertices = sum(len(polygon['points']) for polygon in content_list.polygon_list)
+    # The dataprep output layers are kept as polygon arrays
+    n_polygons += sum(len(polygon_array['offsets']) - 1 for polygon_array in content_list.polygon_array_list)
+    n_vertices += sum(len(polygon_array['vertices']) for polygon_array in content_list.polygon_array_list)
+    return n_polygons, n_vertices
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the runtime of the gdspy and shapely dataprep engines')
+    parser.add_argument('spec_file', type=str, nargs='?', default='BPG/examples/specs/dataprep_benchmark.yaml',
+                        help='spec file of the layout to run dataprep on')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='number of dataprep runs per engine, the best run is reported')
+    args = parser.parse_args()
+
+    plm = BPG.PhotonicLayoutManager(args.spec_file)
+    plm.generate_content(save_content=False)
+    plm.generate_flat_content()
+
+    print(f'{"Engine":<10} | {"Best (s)":>10} | {"Polygons":>10} | {"Vertices":>10}')
+    for name, dataprep_cls in [('gdspy', Dataprep), ('shapely', DataprepShapely)]:
+        run_times = []
+        for _ in range(args.repeat):
+            start = time.time()
+            post_dataprep = [
+                dataprep_cls(photonic_tech_info=plm.photonic_tech_info,
+                             grid=plm.template_plugin.grid,
+                             content_list_flat=content,
+                             is_lsf=False,
+                             impl_cell=cell_name,
+                             ).dataprep()
+                for content, cell_name in zip(plm.content_list_flat, plm.cell_name_list)
+            ]
+            run_times.append(time.time() - start)
+
+        n_polygons, n_vertices = layer_polygon_stats(post_dataprep[0])
+        print(f'{name:<10} | {min(run_times):>10.4g} | {n_polygons:>10} | {n_vertices:>10}')
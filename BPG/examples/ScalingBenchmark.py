@@ -0,0 +1,206 @@
+import BPG
+import numpy as np
+
+
+class ScalingBenchmarkBase(BPG.PhotonicTemplateBase):
+    """
+    Base class of the synthetic layouts of the scaling benchmark suite (see BPG.benchmark). Each generator draws a
+    layout whose complexity grows with a single size parameter, so that the cost of every stage of the flow can be
+    measured across sizes.
+    """
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        BPG.PhotonicTemplateBase.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_default_param_values(cls):
+        return dict(
+            layer=('SI', 'phot'),
+        )
+
+
+class DeepHierarchy(ScalingBenchmarkBase):
+    """
+    Binary tree of instances: each level draws a rectangle and instantiates the level below twice.
+    The layout has depth + 1 masters and 2 ** depth leaf instances.
+
+    Parameters
+    ----------
+    depth : int
+        Number of levels below this one
+    """
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            depth='Number of levels below this one',
+            layer='Layer of the rectangles',
+        )
+
+    def draw_layout(self):
+        depth = self.params['depth']
+        self.add_rect(layer=self.params['layer'], coord1=(0, 0), coord2=(1, 1))
+        if depth > 0:
+            child = self.new_template(params=dict(depth=depth - 1, layer=self.params['layer']),
+                                      temp_cls=DeepHierarchy)
+            # Alternate the direction of the split so that the leaves fill a square
+            pitch = 2.0 ** ((depth - 1) // 2 + 1)
+            loc = (pitch, 0) if depth % 2 else (0, pitch)
+            self.add_instance(master=child, loc=(0, 0))
+            self.add_instance(master=child, loc=loc)
+
+
+class FanOutCell(ScalingBenchmarkBase):
+    """ Small cell instantiated many times by FanOut: a ring next to a taper """
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            layer='Layer of the shapes',
+        )
+
+    def draw_layout(self):
+        self.add_round(layer=self.params['layer'], resolution=self.grid.resolution, rout=2, rin=1.5, center=(2, 2))
+        self.add_polygon(layer=self.params['layer'], points=[(5, 1.5), (9, 1.8), (9, 2.2), (5, 2.5)])
+
+
+class FanOut(ScalingBenchmarkBase):
+    """
+    Wide and shallow hierarchy: a single master instantiated n_instances times on a grid.
+
+    Parameters
+    ----------
+    n_instances : int
+        Number of instances of the cell
+    """
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            n_instances='Number of instances of the cell',
+            layer='Layer of the shapes',
+        )
+
+    def draw_layout(self):
+        cell = self.new_template(params=dict(layer=self.params['layer']), temp_cls=FanOutCell)
+        n_cols = int(np.ceil(np.sqrt(self.params['n_instances'])))
+        for index in range(self.params['n_instances']):
+            self.add_instance(master=cell, loc=(12 * (index % n_cols), 6 * (index // n_cols)))
+
+
+class RectArray(ScalingBenchmarkBase):
+    """
+    Flat array of n x n rectangles, drawn one by one.
+
+    Parameters
+    ----------
+    n : int
+        Number of rectangles along each side of the array
+    """
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            n='Number of rectangles along each side of the array',
+            layer='Layer of the rectangles',
+        )
+
+    def draw_layout(self):
+        n = self.params['n']
+        for x in range(n):
+            for y in range(n):
+                self.add_rect(layer=self.params['layer'], coord1=(2 * x, 2 * y), coord2=(2 * x + 1.5, 2 * y + 1.5))
+
+
+class DenseRings(ScalingBenchmarkBase):
+    """
+    Field of n_rings overlapping rings, which produce many curved vertices and boolean interactions in dataprep.
+
+    Parameters
+    ----------
+    n_rings : int
+        Number of rings
+    seed : int
+        Seed of the random placement
+    """
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            n_rings='Number of rings',
+            seed='Seed of the random placement',
+            layer='Layer of the rings',
+        )
+
+    @classmethod
+    def get_default_param_values(cls):
+        return dict(
+            seed=0,
+            layer=('SI', 'phot'),
+        )
+
+    def draw_layout(self):
+        n_rings = self.params['n_rings']
+        rng = np.random.RandomState(self.params['seed'])
+        field_size = 10 * np.sqrt(n_rings)
+        for x, y, r in zip(rng.uniform(0, field_size, n_rings), rng.uniform(0, field_size, n_rings),
+                           rng.uniform(2, 6, n_rings)):
+            self.add_round(layer=self.params['layer'], resolution=self.grid.resolution, rout=r, rin=0.8 * r,
+                           center=(x, y))
+
+
+class CurvedPaths(ScalingBenchmarkBase):
+    """
+    Stack of n_paths long sinusoidal paths of n_points points each.
+
+    Parameters
+    ----------
+    n_paths : int
+        Number of paths
+    n_points : int
+        Number of points of each path
+    """
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            n_paths='Number of paths',
+            n_points='Number of points of each path',
+            layer='Layer of the paths',
+        )
+
+    @classmethod
+    def get_default_param_values(cls):
+        return dict(
+            n_points=200,
+            layer=('SI', 'phot'),
+        )
+
+    def draw_layout(self):
+        x = np.linspace(0, 100, self.params['n_points'])
+        for index in range(self.params['n_paths']):
+            y = 4 * index + np.sin(x / 5 + index)
+            self.add_path(layer=self.params['layer'], width=0.5, points=list(zip(x, y)),
+                          resolution=self.grid.resolution)
+
+
+class ViaFarm(ScalingBenchmarkBase):
+    """
+    Array of n x n via stacks from the lowest to the highest layer of the metal stack.
+
+    Parameters
+    ----------
+    n : int
+        Number of via stacks along each side of the array
+    """
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            n='Number of via stacks along each side of the array',
+        )
+
+    @classmethod
+    def get_default_param_values(cls):
+        return dict()
+
+    def draw_layout(self):
+        metal_stack_info: dict = self.photonic_tech_info.dataprep_parameters['MetalStack']
+        bot_layer = min(metal_stack_info, key=lambda name: metal_stack_info[name]['index'])
+        top_layer = max(metal_stack_info, key=lambda name: metal_stack_info[name]['index'])
+        n = self.params['n']
+        for x in range(n):
+            for y in range(n):
+                self.add_via_stack(bot_layer=bot_layer, top_layer=top_layer, loc=(5 * x, 5 * y), unit_mode=False)
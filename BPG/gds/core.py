@@ -1,10 +1,12 @@
 import time
 import logging
-import yaml
 import gdspy
 
-from BPG.content_list import ContentList
+from BPG.content_list import ContentList, polygon_array_to_pointlists
 from BPG.abstract_plugin import AbstractPlugin
+from BPG.config_cache import load_yaml_cached
+from BPG.tracing import traced, annotate
+from BPG.compiler.manh_fracture import fracture_pointlists
 from BPG.objects import PhotonicRound
 
 from typing import TYPE_CHECKING, List, Optional
@@ -26,11 +28,11 @@ class GDSPlugin(AbstractPlugin):
         self.lib_name = lib_name
         self.max_points_per_polygon = max_points_per_polygon
 
-        with open(self.gds_layermap, 'r') as f:
-            lay_info = yaml.load(f, Loader=yaml.CFullLoader if yaml.__with_libyaml__ else yaml.FullLoader)
-            self.lay_map = lay_info['layer_map']
-            self.via_info = lay_info['via_info']
+        lay_info = load_yaml_cached(self.gds_layermap, copy_content=False)
+        self.lay_map = lay_info['layer_map']
+        self.via_info = lay_info['via_info']
 
+    @traced('gds.export_content_list')
     def export_content_list(self,
                             content_lists: List["ContentList"],
                             name_append: str = '',
@@ -55,6 +57,7 @@ class GDSPlugin(AbstractPlugin):
 
         """
         logging.info(f'In GDSPlugin.export_content_list')
+        annotate(cell_count=len(content_lists), name_append=name_append)
 
         tech_info = self.grid.tech_info
         lay_unit = tech_info.layout_unit
@@ -152,10 +155,24 @@ class GDSPlugin(AbstractPlugin):
             for boundary in content_list.boundary_list:
                 pass
 
+            # Polygons are fractured one layer at a time, so that Manhattan polygons are decomposed together
+            pointlists_by_layer = {}
             for polygon in content_list.polygon_list:
-                lay_id, purp_id = self.lay_map[polygon['layer']]
-                cur_poly = gdspy.Polygon(polygon['points'], layer=lay_id, datatype=purp_id)
-                gds_cell.add(cur_poly.fracture(precision=res, max_points=max_points_per_polygon))
+                pointlists_by_layer.setdefault(tuple(polygon['layer']), []).append(polygon['points'])
+
+            for polygon_array in content_list.polygon_array_list:
+                pointlists_by_layer.setdefault(tuple(polygon_array['layer']), []).extend(
+                    polygon_array_to_pointlists(polygon_array)
+                )
+
+            for layer, pointlists in pointlists_by_layer.items():
+                if pointlists:
+                    lay_id, purp_id = self.lay_map[layer]
+                    cur_polys = gdspy.PolygonSet(
+                        fracture_pointlists(pointlists, max_points=max_points_per_polygon, resolution=res),
+                        layer=lay_id, datatype=purp_id,
+                    )
+                    gds_cell.add(cur_polys)
 
             for round_obj in content_list.round_list:
                 nx, ny = round_obj.get('arr_nx', 1), round_obj.get('arr_ny', 1)
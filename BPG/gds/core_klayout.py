@@ -1,10 +1,11 @@
 import time
 import logging
-import yaml
 import pya
 
-from BPG.content_list import ContentList
+from BPG.content_list import ContentList, polygon_array_to_pointlists
 from BPG.abstract_plugin import AbstractPlugin
+from BPG.config_cache import load_yaml_cached
+from BPG.tracing import traced, annotate
 from BPG.objects import PhotonicRound
 
 from typing import TYPE_CHECKING, List, Optional
@@ -37,11 +38,11 @@ class KLayoutGDSPlugin(AbstractPlugin):
         self.lib_name = lib_name
         self.max_points_per_polygon = max_points_per_polygon
 
-        with open(self.gds_layermap, 'r') as f:
-            lay_info = yaml.load(f, Loader=yaml.CFullLoader if yaml.__with_libyaml__ else yaml.FullLoader)
-            self.lay_map = lay_info['layer_map']
-            self.via_info = lay_info['via_info']
+        lay_info = load_yaml_cached(self.gds_layermap, copy_content=False)
+        self.lay_map = lay_info['layer_map']
+        self.via_info = lay_info['via_info']
 
+    @traced('gds_klayout.export_content_list')
     def export_content_list(self,
                             content_lists: List["ContentList"],
                             name_append: str = '',
@@ -66,6 +67,7 @@ class KLayoutGDSPlugin(AbstractPlugin):
 
         """
         logging.info(f'In KLayoutGDSPlugin.export_content_list')
+        annotate(cell_count=len(content_lists), name_append=name_append)
 
         tech_info = self.grid.tech_info
         lay_unit = tech_info.layout_unit
@@ -188,6 +190,12 @@ class KLayoutGDSPlugin(AbstractPlugin):
                     pya.DPolygon([pya.DPoint(pt[0], pt[1]) for pt in polygon['points']])
                 )
 
+            for polygon_array in content_list.polygon_array_list:
+                lay_id, purp_id = self.lay_map[tuple(polygon_array['layer'])]
+                layer_shapes = gds_cell.shapes(gds_lib.layer(lay_id, purp_id))
+                for points in polygon_array_to_pointlists(polygon_array):
+                    layer_shapes.insert(pya.DPolygon([pya.DPoint(x, y) for x, y in points.tolist()]))
+
             for round_obj in content_list.round_list:
                 nx, ny = round_obj.get('arr_nx', 1), round_obj.get('arr_ny', 1)
                 lay_id, purp_id = self.lay_map[tuple(round_obj['layer'])]
@@ -1,6 +1,7 @@
 from decimal import Decimal
 import numpy as np
 import math
+import numbers
 import warnings
 import logging
 
@@ -28,7 +29,7 @@ class CoordBase:
     def __new__(cls, value, *args, **kwargs):
         """ Assumes a floating point input value in microns, stores an internal integer representation on grid """
         self = object.__new__(cls)  # Create the immutable instance
-        self._value = round(Decimal(str(value)) / CoordBase.res)
+        self._value = _to_unit(value)
         return self
 
     def __repr__(self):
@@ -45,7 +46,7 @@ class CoordBase:
     @property
     def float(self):
         """ Returns the rounded floating point number closest to a valid point on the resolution grid """
-        return float(self._value * CoordBase.res)
+        return self._value / _UNITS_PER_MICRON
 
     @property
     def microns(self):
@@ -54,7 +55,21 @@ class CoordBase:
     @property
     def meters(self):
         """ Returns the rounded floating point number in meters closest to a valid point on the resolution grid """
-        return float(self._value * CoordBase.res * CoordBase.micron)
+        return self._value / _UNITS_PER_METER
+
+
+# Number of resolution units in a micron and in a meter. Dividing the integer number of units by these is exact up to
+# the float rounding of the result, as the decimal arithmetic on CoordBase.res and CoordBase.micron would be
+_UNITS_PER_MICRON = int(1 / CoordBase.res)
+_UNITS_PER_METER = int(1 / (CoordBase.res * CoordBase.micron))
+
+
+def _to_unit(value) -> int:
+    """ Returns the integer number of resolution units closest to a value in microns, rounding half to even """
+    if isinstance(value, numbers.Integral):
+        return int(value) * _UNITS_PER_MICRON
+    # Round the decimal representation of floats, so that values such as 1.0015 are not moved by binary rounding
+    return round(Decimal(str(value)) / CoordBase.res)
 
 
 class XY:
@@ -67,45 +82,45 @@ class XY:
     def __new__(cls, xy, *args, **kwargs):
         """ Assumes a floating point input value in microns for each dimension """
         self = object.__new__(cls)  # Create the immutable instance
-        self._x = CoordBase(xy[0])
-        self._y = CoordBase(xy[1])
+        self._x = _to_unit(xy[0])
+        self._y = _to_unit(xy[1])
         return self
 
     @property
     def x(self):
-        return self._x.unit_mode
+        return self._x
 
     @property
     def y(self):
-        return self._y.unit_mode
+        return self._y
 
     @property
     def xy(self):
-        return [self.x, self.y]
+        return [self._x, self._y]
 
     @property
     def xy_float(self):
-        return [self._x.float, self._y.float]
+        return [self._x / _UNITS_PER_MICRON, self._y / _UNITS_PER_MICRON]
 
     @property
     def x_float(self):
-        return self._x.float
+        return self._x / _UNITS_PER_MICRON
 
     @property
     def y_float(self):
-        return self._y.float
+        return self._y / _UNITS_PER_MICRON
 
     @property
     def xy_meters(self):
-        return [self._x.meters, self._y.meters]
+        return [self._x / _UNITS_PER_METER, self._y / _UNITS_PER_METER]
 
     @property
     def x_meters(self):
-        return self._x.meters
+        return self._x / _UNITS_PER_METER
 
     @property
     def y_meters(self):
-        return self._y.meters
+        return self._y / _UNITS_PER_METER
 
 
 class XYZ:
@@ -118,58 +133,58 @@ class XYZ:
     def __new__(cls, xyz, *args, **kwargs):
         """ Assumes a floating point input value in microns for each dimension """
         self = object.__new__(cls)  # Create the immutable instance
-        self._x = CoordBase(xyz[0])
-        self._y = CoordBase(xyz[1])
-        self._z = CoordBase(xyz[2])
+        self._x = _to_unit(xyz[0])
+        self._y = _to_unit(xyz[1])
+        self._z = _to_unit(xyz[2])
         return self
 
     @property
     def x(self):
-        return self._x.unit_mode
+        return self._x
 
     @property
     def y(self):
-        return self._y.unit_mode
+        return self._y
 
     @property
     def z(self):
-        return self._z.unit_mode
+        return self._z
 
     @property
     def xyz(self):
-        return [self.x, self.y, self.z]
+        return [self._x, self._y, self._z]
 
     @property
     def x_float(self):
-        return self._x.float
+        return self._x / _UNITS_PER_MICRON
 
     @property
     def y_float(self):
-        return self._y.float
+        return self._y / _UNITS_PER_MICRON
 
     @property
     def z_float(self):
-        return self._z.float
+        return self._z / _UNITS_PER_MICRON
 
     @property
     def xyz_float(self):
-        return [self._x.float, self._y.float, self._z.float]
+        return [self._x / _UNITS_PER_MICRON, self._y / _UNITS_PER_MICRON, self._z / _UNITS_PER_MICRON]
 
     @property
     def x_meters(self):
-        return self._x.meters
+        return self._x / _UNITS_PER_METER
 
     @property
     def y_meters(self):
-        return self._y.meters
+        return self._y / _UNITS_PER_METER
 
     @property
     def z_meters(self):
-        return self._z.meters
+        return self._z / _UNITS_PER_METER
 
     @property
     def xyz_meters(self):
-        return [self._x.meters, self._y.meters, self._z.meters]
+        return [self._x / _UNITS_PER_METER, self._y / _UNITS_PER_METER, self._z / _UNITS_PER_METER]
 
 
 class Plane:
@@ -274,19 +289,47 @@ class BBoxMut(BBox):
         total : bag.layout.util.BBox
             the merged bounding box.
         """
+        return self.merge_bounds(bbox._left_unit, bbox._bot_unit, bbox._right_unit, bbox._top_unit)
+
+    def merge_bounds(self,
+                     left_unit: int,
+                     bot_unit: int,
+                     right_unit: int,
+                     top_unit: int,
+                     ) -> 'BBoxMut':
+        """
+        Merges the given bounds into this bounding box in place, as merge does, without creating a bounding box for
+        them. This is used to accumulate the bounds of many shapes.
+
+        Parameters
+        ----------
+        left_unit : int
+            the left bound, in resolution units.
+        bot_unit : int
+            the bottom bound, in resolution units.
+        right_unit : int
+            the right bound, in resolution units.
+        top_unit : int
+            the top bound, in resolution units.
+
+        Returns
+        -------
+        total : BBoxMut
+            this bounding box.
+        """
         if not self.is_physical():
-            self._left_unit = bbox._left_unit
-            self._right_unit = bbox._right_unit
-            self._bot_unit = bbox._bot_unit
-            self._top_unit = bbox._top_unit
+            self._left_unit = left_unit
+            self._right_unit = right_unit
+            self._bot_unit = bot_unit
+            self._top_unit = top_unit
             return self
-        elif not bbox.is_valid():
+        elif left_unit > right_unit or bot_unit > top_unit:
             return self
 
-        self._left_unit = min(self._left_unit, bbox._left_unit)
-        self._right_unit = max(self._right_unit, bbox._right_unit)
-        self._bot_unit = min(self._bot_unit, bbox._bot_unit)
-        self._top_unit = max(self._top_unit, bbox._top_unit)
+        self._left_unit = min(self._left_unit, left_unit)
+        self._right_unit = max(self._right_unit, right_unit)
+        self._bot_unit = min(self._bot_unit, bot_unit)
+        self._top_unit = max(self._top_unit, top_unit)
         return self
 
 
@@ -304,6 +347,9 @@ class Transformable2D:
     OrientationsWithFlip = ['MX', 'MXR90', 'MY', 'MYR90']  # Mirror first, then rotate if applicable
     OrientationsAll = OrientationsNoFlip + OrientationsWithFlip
 
+    # The center is kept as two scalars in resolution units, and returned as numpy arrays by the properties
+    __slots__ = ('_resolution', '_mod_angle', '_x_unit', '_y_unit', '_orient', '_force_cardinal')
+
     def __init__(self,
                  center: "coord_type",
                  resolution: float,
@@ -338,9 +384,11 @@ class Transformable2D:
         self._resolution = resolution
         self._mod_angle = 0.0
         if unit_mode:
-            self._center_unit = np.array([int(round(center[0])), int(round(center[1]))])
+            self._x_unit = int(round(center[0]))
+            self._y_unit = int(round(center[1]))
         else:
-            self._center_unit = np.array([int(round(center[0] / resolution)), int(round(center[1] / resolution))])
+            self._x_unit = int(round(center[0] / resolution))
+            self._y_unit = int(round(center[1] / resolution))
 
         # Convert the input angle+orientation to angle+invert representation
         angle, temp_invert_y = self.orient2angle(orient=orientation, mod_angle=angle)
@@ -363,47 +411,48 @@ class Transformable2D:
     @property
     def center(self) -> np.array:
         """ Return the center coordinates as np array """
-        return self._center_unit * self._resolution
+        return np.array([self._x_unit * self._resolution, self._y_unit * self._resolution])
 
     @property
     def center_unit(self) -> np.array:
         """Return the center coordinates as np array in resolution units"""
-        return self._center_unit
+        return np.array([self._x_unit, self._y_unit])
 
     @center.setter
     def center(self,
                center: Tuple[float, float]
                ) -> None:
         """ This setter is used if the input is not in unit_mode """
-        self._center_unit = np.array([int(round(center[0] / self._resolution)),
-                                      int(round(center[1] / self._resolution))])
+        self._x_unit = int(round(center[0] / self._resolution))
+        self._y_unit = int(round(center[1] / self._resolution))
 
     @center_unit.setter
     def center_unit(self,
                     center: Tuple[int, int]
                     ):
         """ This setter is used if the input is already in unit_mode """
-        self._center_unit = np.array([int(round(center[0])), int(round(center[1]))])
+        self._x_unit = int(round(center[0]))
+        self._y_unit = int(round(center[1]))
 
     @property
     def x_unit(self) -> int:
         """Return the x coordinate of the center in resolution units"""
-        return int(self._center_unit[0])
+        return int(self._x_unit)
 
     @property
     def x(self) -> float:
         """Return the x coordinate of the center"""
-        return float(self._center_unit[0] * self._resolution)
+        return float(self._x_unit * self._resolution)
 
     @property
     def y_unit(self) -> int:
         """Return the y coordinate of the center in resolution units"""
-        return int(self._center_unit[1])
+        return int(self._y_unit)
 
     @property
     def y(self) -> float:
         """Return the y coordinate of the center"""
-        return float(self._center_unit[1] * self._resolution)
+        return float(self._y_unit * self._resolution)
 
     @property
     def mod_angle(self) -> float:
@@ -452,12 +501,12 @@ class Transformable2D:
     @property
     def is_horizontal(self) -> bool:
         """ Returns True if angle is 0, 180deg, etc. Sin(theta) = theta approximation """
-        return abs(self.unit_vec[1]) <= Transformable2D.SMALL_ANGLE_TOLERANCE
+        return abs(math.sin(self.angle)) <= Transformable2D.SMALL_ANGLE_TOLERANCE
 
     @property
     def is_vertical(self) -> bool:
         """ Returns True if angle is 90deg, 270deg, etc. Sin(theta) = theta approximation """
-        return abs(self.unit_vec[0]) <= Transformable2D.SMALL_ANGLE_TOLERANCE
+        return abs(math.cos(self.angle)) <= Transformable2D.SMALL_ANGLE_TOLERANCE
 
     @property
     def resolution(self) -> float:
@@ -468,7 +517,8 @@ class Transformable2D:
     def unit_vec(self) -> np.ndarray:
         """ Returns a unit vector pointing in the direction of the angle """
         # convert angle to unit-vector, including snap-to-90deg when is_cardinal=True to avoid little errors
-        return np.array([np.cos(self.angle), np.sin(self.angle)])
+        angle = self.angle
+        return np.array([math.cos(angle), math.sin(angle)])
 
     ''' Coordinate Manipulation Methods '''
 
@@ -508,9 +558,10 @@ class Transformable2D:
             new_mirrored_state = self.mirrored
 
         # Mirror (if needed) and rotate by the provided angle
-        new_center_x = math.cos(rotation) * self._center_unit[0] - math.sin(rotation) * self._center_unit[1] * y_inv
-        new_center_y = math.sin(rotation) * self._center_unit[0] + math.cos(rotation) * self._center_unit[1] * y_inv
-        new_center_unit = np.array([new_center_x, new_center_y])
+        cos_rot = math.cos(rotation)
+        sin_rot = math.sin(rotation)
+        new_center_x = cos_rot * self._x_unit - sin_rot * self._y_unit * y_inv
+        new_center_y = sin_rot * self._x_unit + cos_rot * self._y_unit * y_inv
 
         # Compute the new angle
         new_angle = y_inv * self.angle + rotation
@@ -521,14 +572,15 @@ class Transformable2D:
         # Store new values
         self.orientation = orient
         self.mod_angle = mod_angle
-        self._center_unit = new_center_unit
+        self._x_unit = new_center_x
+        self._y_unit = new_center_y
 
         if force_cardinal is None:
             force_cardinal = self._force_cardinal
 
         if force_cardinal:
             # Transformation is explicitly cardinal, so do not change is_cardinal flag
-            if np.abs(np.cos(rotation) * np.sin(rotation)) > Transformable2D.SMALL_ANGLE_TOLERANCE:
+            if abs(cos_rot * sin_rot) > Transformable2D.SMALL_ANGLE_TOLERANCE:
                 raise RuntimeError('rotation specified as cardinal, but angle is not a multiple of pi/2')
 
         return np.array([int(round(new_center_x)), int(round(new_center_y))])
@@ -553,12 +605,11 @@ class Transformable2D:
             new position of the center in unit_mode
         """
         if not unit_mode:
-            translation = np.round(
-                np.array([translation[0] / self.resolution, translation[1] / self.resolution])
-            ).astype(int)
+            self._x_unit += int(round(translation[0] / self._resolution))
+            self._y_unit += int(round(translation[1] / self._resolution))
         else:
-            translation = np.round(np.round(translation)).astype(int)
-        self._center_unit += translation
+            self._x_unit += int(round(translation[0]))
+            self._y_unit += int(round(translation[1]))
 
         return self
 
@@ -581,11 +632,11 @@ class Transformable2D:
             True if loc is provided in resolution units, False if loc is provided in layout units.
         """
         if not unit_mode:
-            self._center_unit = np.round(
-                np.array([loc[0] / self.resolution, loc[1] / self.resolution])
-            ).astype(int)
+            self._x_unit = int(round(loc[0] / self._resolution))
+            self._y_unit = int(round(loc[1] / self._resolution))
         else:
-            self._center_unit = np.round(np.round(loc)).astype(int)
+            self._x_unit = int(round(loc[0]))
+            self._y_unit = int(round(loc[1]))
 
         self._orient = orient
 
@@ -655,21 +706,21 @@ class Transformable2D:
             num_90deg : The number of 90 degree rotations (rounded down) that fit into the angle.
         """
         if mirrored:
-            num_90deg = -int(np.floor(-angle / (np.pi / 2)))  
-            mod_angle = -(angle - num_90deg * (np.pi / 2))
+            num_90deg = -math.floor(-angle / (math.pi / 2))
+            mod_angle = -(angle - num_90deg * (math.pi / 2))
         else:
-            num_90deg = int(np.floor(angle / (np.pi / 2)))
-            mod_angle = angle - num_90deg * (np.pi / 2)
+            num_90deg = math.floor(angle / (math.pi / 2))
+            mod_angle = angle - num_90deg * (math.pi / 2)
 
-        if np.abs(mod_angle) < Transformable2D.SMALL_ANGLE_TOLERANCE:
+        if abs(mod_angle) < Transformable2D.SMALL_ANGLE_TOLERANCE:
             mod_angle = 0
             is_cardinal = True
-            num_90deg = int(np.round(angle / (np.pi / 2)))
-        elif np.abs( mod_angle - np.pi / 2) < Transformable2D.SMALL_ANGLE_TOLERANCE:
+            num_90deg = int(round(angle / (math.pi / 2)))
+        elif abs(mod_angle - math.pi / 2) < Transformable2D.SMALL_ANGLE_TOLERANCE:
             mod_angle = 0
-            num_90deg = int(np.round(angle / (np.pi / 2)))
+            num_90deg = int(round(angle / (math.pi / 2)))
             is_cardinal = True
-        elif (mod_angle >= np.pi / 2) or (mod_angle < 0):
+        elif (mod_angle >= math.pi / 2) or (mod_angle < 0):
             raise RuntimeError(f'mod_angle: {mod_angle} should be >=0 and < pi/2')
         else:
             is_cardinal = False
@@ -704,14 +755,14 @@ class Transformable2D:
             raise ValueError(f'orient {orient} is not a permitted orientation string.')
 
         if orient in Transformable2D.OrientationsNoFlip:  # ['R0','R90','R180','R270']):
-            rotate_by = Transformable2D.OrientationsNoFlip.index(orient) * np.pi / 2
+            rotate_by = Transformable2D.OrientationsNoFlip.index(orient) * math.pi / 2
             mirrored = False
             angle = rotate_by + mod_angle
         else:  # Transformable2D.OrientationsWithFlip  ['MX','MXR90','MY','MYR90']):
             # The list above is MX followed by   ['R0','R90','R180','R270'], so
-            rotate_by = Transformable2D.OrientationsWithFlip.index(orient) * np.pi / 2
+            rotate_by = Transformable2D.OrientationsWithFlip.index(orient) * math.pi / 2
             mirrored = True
             angle = rotate_by - mod_angle
 
-        angle = angle % (2 * np.pi)
+        angle = angle % (2 * math.pi)
         return angle, mirrored
@@ -1,11 +1,12 @@
-import yaml
 import importlib
 import logging
 import time
+import csv
 import json
 from pathlib import Path
 from collections import UserDict
 import os
+import numpy as np
 
 
 # BAG imports
@@ -13,36 +14,25 @@ from bag.layout import RoutingGrid
 from bag.util.cache import _get_unique_name
 import BPG
 from BPG.photonic_core import PhotonicBagProject
+from BPG.config_cache import load_yaml_cached
 
-# Plugin imports
+# Plugin imports. The GDS, Lumerical, Calibre and PLVS plugins and the spatial index are only imported when first used,
+# so that their backends are not loaded by runs that do not need them
 from .db import PhotonicTemplateDB
-from .lumerical.code_generator import LumericalMaterialGenerator
-try:
-    from .gds.core import GDSPlugin
-except:
-    GDSPlugin = None
-try:
-    from .gds.core_klayout import KLayoutGDSPlugin
-except:
-    KLayoutGDSPlugin = None
-from .lumerical.core import LumericalPlugin
-
-from typing import TYPE_CHECKING, List, Optional, Dict, Any
+from .compiler.prepared_layers import PreparedLayers
+from .tracing import tracer, traced, annotate
+from .perf_history import PerfHistory
 
-try:
-    from DataprepPlugin.Calibre.calibre import CalibreDataprep
-except ImportError:
-    CalibreDataprep = None
-
-try:
-    from PLVS.PLVS import PLVS
-except ImportError:
-    PLVS = None
+from typing import TYPE_CHECKING, List, Optional, Dict, Any, Tuple, Union
 
 if TYPE_CHECKING:
-    from BPG.photonic_core import PhotonicBagProject
     from BPG.content_list import ContentList
     from .bpg_custom_types import PhotonicTemplateType
+    from .gds.core import GDSPlugin
+    from .gds.core_klayout import KLayoutGDSPlugin
+    from .lumerical.core import LumericalPlugin
+    from .spatial_index import SpatialIndex
+    from DataprepPlugin.Calibre.calibre import CalibreDataprep
     from gdspy import GdsLibrary
 
 timing_logger = logging.getLogger('timing')
@@ -76,14 +66,37 @@ class PhotonicLayoutManager(PhotonicBagProject):
 
         self.load_spec_file_paths(spec_file=spec_file, **kwargs)
 
+        # Record the tracing spans and the memory report of this run next to the timing log if requested, and append
+        # the duration, memory and object counts of each stage to the performance history
+        trace = BPG.run_settings['bpg_config'].get('trace', False)
+        memory_report = BPG.run_settings['bpg_config'].get('memory_report', False)
+        perf_history = BPG.run_settings['bpg_config'].get('perf_history', True)
+        # The tracer is shared by the process, so the settings, spans and listeners of a previous layout manager are
+        # forgotten
+        tracer.disable()
+        tracer.reset()
+        if trace or memory_report or perf_history:
+            tracer.enable(trace_path=Path(self.log_path) / 'trace.json' if trace else None,
+                          summary_path=Path(self.log_path) / 'trace_summary.txt' if trace else None,
+                          memory=bool(memory_report or perf_history),
+                          memory_debug=memory_report == 'debug',
+                          max_depth=None if trace or memory_report else 1)
+        self.perf_history: Optional[PerfHistory] = None
+        if perf_history:
+            history_path = Path(self.log_path) / 'perf_history.jsonl' if perf_history is True else perf_history
+            self.perf_history = PerfHistory(history_path, spec_file)
+            tracer.listeners.append(self.perf_history.record)
+
         self.tdb: "PhotonicTemplateDB" = None
         self.impl_lib = None  # Virtuoso Library where generated cells are stored
 
         # Plugin initialization
-        self.gds_plugin: "GDSPlugin" = None
-        self.lsf_plugin: "LumericalPlugin" = None
+        self.routing_grid: RoutingGrid = None
         self.template_plugin: 'PhotonicTemplateDB' = None
-        self.calibre_dataprep_plugin: 'CalibreDataprep' = None
+        self._gds_plugin: Optional[Union["GDSPlugin", "KLayoutGDSPlugin"]] = None
+        self._lsf_plugin: Optional["LumericalPlugin"] = None
+        self._calibre_dataprep_plugin: Optional['CalibreDataprep'] = None
+        self._calibre_dataprep_plugin_loaded = False
         self.init_plugins()  # Initializes all of the built-in plugins
 
         # Template init
@@ -96,13 +109,20 @@ class PhotonicLayoutManager(PhotonicBagProject):
         self.content_list_post_dataprep: List["ContentList"] = None
         self.content_list_post_lsf_dataprep: List["ContentList"] = None
         self.content_list_lumerical_tb: List["ContentList"] = []
+        # Layer sorted and converted dataprep inputs of content_list_flat, shared by dataprep and generate_lsf
+        self.prepared_layers: List[PreparedLayers] = []
+        # Per layer spatial index of the shapes of each content list in content_list_flat, and the content lists they
+        # were built from with their shape counts at the time
+        self.spatial_indices: List["SpatialIndex"] = []
+        self._spatial_indices_content: List[Tuple["ContentList", Dict[str, int]]] = []
 
         self.content_list_types = ['content_list', 'content_list_flat', 'content_list_post_dataprep',
                                    'content_list_post_lsf_dataprep', 'content_list_lumerical_tb']
 
     def init_plugins(self) -> None:
         """
-        Creates all built-in plugins based on the provided configuration and tech-info
+        Creates the template database based on the provided configuration and tech-info. The GDS, Lumerical and
+        Calibre dataprep plugins are created on first use.
         """
         lib_name = BPG.run_settings['impl_lib']
         self.impl_lib = lib_name
@@ -117,40 +137,83 @@ class PhotonicLayoutManager(PhotonicBagProject):
         spaces = grid_specs['spaces']
         widths = grid_specs['widths']
         bot_dir = grid_specs['bot_dir']
-        routing_grid = RoutingGrid(self.tech_info, layers, spaces, widths, bot_dir)
+        self.routing_grid = RoutingGrid(self.tech_info, layers, spaces, widths, bot_dir)
 
         self.template_plugin = PhotonicTemplateDB('template_libs.def',
-                                                  routing_grid=routing_grid,
+                                                  routing_grid=self.routing_grid,
                                                   lib_name=lib_name,
                                                   use_cybagoa=True,
                                                   gds_lay_file=self.photonic_tech_info.layermap_path,
-                                                  photonic_tech_info=self.photonic_tech_info)
+                                                  photonic_tech_info=self.photonic_tech_info,
+                                                  dataprep_engine=BPG.run_settings['bpg_config'].get(
+                                                      'dataprep_engine', 'gdspy'),
+                                                  dataprep_output_arrays=BPG.run_settings['bpg_config'].get(
+                                                      'dataprep_output_arrays', False),
+                                                  collect_geometry_stats=BPG.run_settings['bpg_config'].get(
+                                                      'geometry_stats', False),
+                                                  angle_tolerance=BPG.run_settings['bpg_config'].get(
+                                                      'angle_tolerance', 1.0e-9))
         self.template_plugin._prj = self
         print(f'GDS layermap is: {self.photonic_tech_info.layermap_path}')
-        if BPG.run_settings['bpg_config']['bpg_gds_backend'] == 'gdspy':
-            self.gds_plugin = GDSPlugin(grid=routing_grid,
-                                        gds_layermap=self.photonic_tech_info.layermap_path,
-                                        gds_filepath=self.gds_path,
-                                        lib_name=self.impl_lib)
-        elif BPG.run_settings['bpg_config']['bpg_gds_backend'] == 'klayout':
-            self.gds_plugin = KLayoutGDSPlugin(grid=routing_grid,
-                                               gds_layermap=self.photonic_tech_info.layermap_path,
-                                               gds_filepath=self.gds_path,
-                                               lib_name=self.impl_lib)
-        else:
-            raise ValueError(f'Unsupported BPG configuration:  bpg_gds_backend:  {BPG.run_settings["bpg_gds_backend"]}')
-
-        self.lsf_plugin = LumericalPlugin(lsf_export_config=self.photonic_tech_info.lsf_export_path,
-                                          )
-        if CalibreDataprep:
-            self.calibre_dataprep_plugin = CalibreDataprep(
-                calibre_run_dir=str(Path(self.data_dir) / 'DataprepRunDir'),
-                photonic_tech_info=self.photonic_tech_info,
-                grid=self.template_plugin.grid
-            )
-        else:
-            self.calibre_dataprep_plugin = None
 
+        self.gds_backend = BPG.run_settings['bpg_config']['bpg_gds_backend']
+        if self.gds_backend not in ('gdspy', 'klayout'):
+            raise ValueError(f'Unsupported BPG configuration:  bpg_gds_backend:  {self.gds_backend}')
+
+    @property
+    def gds_plugin(self) -> Union["GDSPlugin", "KLayoutGDSPlugin"]:
+        """ The GDS import / export plugin of the configured bpg_gds_backend, created on first use """
+        if self._gds_plugin is None:
+            if self.gds_backend == 'gdspy':
+                from .gds.core import GDSPlugin as gds_plugin_cls
+            else:
+                from .gds.core_klayout import KLayoutGDSPlugin as gds_plugin_cls
+            self._gds_plugin = gds_plugin_cls(grid=self.routing_grid,
+                                              gds_layermap=self.photonic_tech_info.layermap_path,
+                                              gds_filepath=self.gds_path,
+                                              lib_name=self.impl_lib)
+        return self._gds_plugin
+
+    @gds_plugin.setter
+    def gds_plugin(self, plugin: Union["GDSPlugin", "KLayoutGDSPlugin"]) -> None:
+        self._gds_plugin = plugin
+
+    @property
+    def lsf_plugin(self) -> "LumericalPlugin":
+        """ The Lumerical export plugin, created on first use """
+        if self._lsf_plugin is None:
+            from .lumerical.core import LumericalPlugin
+            self._lsf_plugin = LumericalPlugin(lsf_export_config=self.photonic_tech_info.lsf_export_path)
+        return self._lsf_plugin
+
+    @lsf_plugin.setter
+    def lsf_plugin(self, plugin: "LumericalPlugin") -> None:
+        self._lsf_plugin = plugin
+
+    @property
+    def calibre_dataprep_plugin(self) -> Optional["CalibreDataprep"]:
+        """ The Calibre dataprep plugin, created on first use. None if the DataprepCalibre plugin is not installed """
+        if not self._calibre_dataprep_plugin_loaded:
+            self._calibre_dataprep_plugin_loaded = True
+            try:
+                from DataprepPlugin.Calibre.calibre import CalibreDataprep
+            except ImportError:
+                CalibreDataprep = None
+
+            if CalibreDataprep:
+                self._calibre_dataprep_plugin = CalibreDataprep(
+                    calibre_run_dir=str(Path(self.data_dir) / 'DataprepRunDir'),
+                    photonic_tech_info=self.photonic_tech_info,
+                    grid=self.template_plugin.grid
+                )
+        return self._calibre_dataprep_plugin
+
+    @calibre_dataprep_plugin.setter
+    def calibre_dataprep_plugin(self, plugin: Optional["CalibreDataprep"]) -> None:
+        self._calibre_dataprep_plugin = plugin
+        self._calibre_dataprep_plugin_loaded = True
+
+    @traced('generate_template')
     def generate_template(self,
                           temp_cls: "PhotonicTemplateType" = None,
                           params: dict = None,
@@ -180,10 +243,14 @@ class PhotonicLayoutManager(PhotonicBagProject):
         if cell_name is None:
             cell_name = BPG.run_settings['impl_cell']
 
+        annotate(cell_name=cell_name, template=temp_cls.__name__)
         start_time = time.time()
         self.template_list.append(self.template_plugin.new_template(params=params,
                                                                     temp_cls=temp_cls,
                                                                     debug=False))
+        if tracer.recording:
+            annotate(masters=len(self.template_plugin._master_lookup))
+        self._report_rotated_masters()
         if cell_name in self.cell_name_list:
             cell_name = _get_unique_name(cell_name, self.cell_name_list)
         self.cell_name_list.append(cell_name)
@@ -191,6 +258,7 @@ class PhotonicLayoutManager(PhotonicBagProject):
 
         timing_logger.info(f'{end_time - start_time:<15.6g} | {temp_cls.__name__} Template generation')
 
+    @traced('generate_content')
     def generate_content(self,
                          save_content: bool = True,
                          ) -> List['ContentList']:
@@ -210,6 +278,7 @@ class PhotonicLayoutManager(PhotonicBagProject):
         start_time = time.time()
         self.content_list = self.template_plugin.generate_content_list(master_list=self.template_list,
                                                                        name_list=self.cell_name_list)
+        self._annotate_object_counts(self.content_list)
         end_time_contentgen = time.time()
 
         # Save the content
@@ -224,6 +293,29 @@ class PhotonicLayoutManager(PhotonicBagProject):
 
         return self.content_list
 
+    def _report_rotated_masters(self) -> None:
+        """ Logs how many rotations of a master reused a master already drawn at the same angle """
+        hits = self.template_plugin.rotated_master_hits
+        lookups = hits + self.template_plugin.rotated_master_misses
+        if not lookups:
+            return
+        logging.info(f'Rotated masters: {hits} of {lookups} rotations reused an existing master '
+                     f'({hits / lookups:.1%} hit rate)')
+        annotate(rotated_master_hits=hits, rotated_master_lookups=lookups)
+
+    def _annotate_object_counts(self,
+                                content_lists: List["ContentList"],
+                                ) -> None:
+        """ Adds the number of masters, cells, instances and layout objects of each kind to the current trace span """
+        if not tracer.recording:
+            return
+        counts = dict(masters=len(self.template_plugin._master_lookup), cells=len(content_lists))
+        for content_list in content_lists:
+            for key, count in content_list.shape_counts().items():
+                counts[key] = counts.get(key, 0) + count
+        annotate(**counts)
+
+    @traced('generate_gds')
     def generate_gds(self,
                      max_points_per_polygon: Optional[int] = None,
                      ) -> "GdsLibrary":
@@ -242,6 +334,7 @@ class PhotonicLayoutManager(PhotonicBagProject):
 
         return gdspy_lib
 
+    @traced('generate_flat_content')
     def generate_flat_content(self,
                               save_content: bool = True,
                               ) -> List["ContentList"]:
@@ -263,6 +356,9 @@ class PhotonicLayoutManager(PhotonicBagProject):
                                                                                  name_list=self.cell_name_list,
                                                                                  rename_dict=None,
                                                                                  )
+        self._annotate_object_counts(self.content_list_flat)
+        if self.template_plugin.collect_geometry_stats:
+            self.write_geometry_stats()
         end_time_contentgen = time.time()
 
         # Save the content
@@ -276,6 +372,7 @@ class PhotonicLayoutManager(PhotonicBagProject):
 
         return self.content_list_flat
 
+    @traced('generate_flat_gds')
     def generate_flat_gds(self) -> None:
         """
         Exports flattened content list of design to gds format
@@ -290,6 +387,67 @@ class PhotonicLayoutManager(PhotonicBagProject):
         end = time.time()
         timing_logger.info(f'{end - start:<15.6g} | GDS export, flat')
 
+    def get_prepared_layers(self) -> List[PreparedLayers]:
+        """
+        Returns the prepared dataprep inputs of each flat content list, so that the layer sorting and the conversion of
+        the shapes are shared by all dataprep runs on the same flat content. They are prepared again whenever the flat
+        content changes.
+
+        Returns
+        -------
+        prepared_layers : List[PreparedLayers]
+            The prepared layers of each content list in content_list_flat
+        """
+        if (len(self.prepared_layers) != len(self.content_list_flat) or
+                any(prepared.content_list_flat is not content
+                    for prepared, content in zip(self.prepared_layers, self.content_list_flat))):
+            self.prepared_layers = [PreparedLayers(content) for content in self.content_list_flat]
+        return self.prepared_layers
+
+    def get_spatial_indices(self) -> List["SpatialIndex"]:
+        """
+        Returns the spatial index of the shapes of each flat content list, to query the shapes of a layer in a region or
+        near a point. The indices are built on first use, and built again whenever the flat content lists are replaced
+        or shapes are added to or removed from them. Shapes modified in place are not detected.
+
+        Returns
+        -------
+        spatial_indices : List[SpatialIndex]
+            The spatial index of each content list in content_list_flat
+        """
+        if not self.content_list_flat:
+            raise ValueError('Must call PhotonicLayoutManager.generate_flat_content before calling get_spatial_indices')
+
+        if (len(self._spatial_indices_content) != len(self.content_list_flat) or
+                any(indexed is not content or shape_counts != content.shape_counts()
+                    for (indexed, shape_counts), content in zip(self._spatial_indices_content,
+                                                                 self.content_list_flat))):
+            from .spatial_index import SpatialIndex
+
+            start = time.time()
+            self.spatial_indices = [SpatialIndex.from_content_list(content) for content in self.content_list_flat]
+            self._spatial_indices_content = [(content, content.shape_counts()) for content in self.content_list_flat]
+            logging.info(f'Building the spatial index of the flat content took {time.time() - start:.4g}s')
+        return self.spatial_indices
+
+    def save_spatial_indices(self,
+                             filepath: str = None,
+                             ) -> None:
+        """
+        Saves the spatial index of each flat content list as a JSON list, next to the saved content lists by default.
+
+        Parameters
+        ----------
+        filepath : Optional[str]
+            Filepath where to store the file. Defaults to content_list_flat_spatial_index in the content directory.
+        """
+        if not filepath:
+            filepath = self.content_dir / 'content_list_flat_spatial_index'
+
+        with open(filepath, 'w') as f:
+            json.dump([spatial_index.to_dict() for spatial_index in self.get_spatial_indices()], f)
+
+    @traced('generate_lsf')
     def generate_lsf(self,
                      create_materials=True,
                      export_dir: Optional[Path] = None
@@ -309,14 +467,18 @@ class PhotonicLayoutManager(PhotonicBagProject):
         self.content_list_post_lsf_dataprep = self.template_plugin.dataprep(
             flat_content_list=self.content_list_flat,
             name_list=self.cell_name_list,
-            is_lsf=True
+            is_lsf=True,
+            prepared_layers_list=self.get_prepared_layers(),
         )
+        if self.template_plugin.collect_geometry_stats:
+            self.write_geometry_stats()
         # TODO: Fix naming here as well
         self.lsf_plugin.export_content_list(content_lists=self.content_list_post_lsf_dataprep,
                                             name_list=self.cell_name_list,
                                             export_dir=export_dir if export_dir else self.scripts_dir
                                             )
 
+    @traced('generate_lsf_calibre')
     def generate_lsf_calibre(self,
                              create_materials: bool = True,
                              file_in: Optional[str] = None,
@@ -357,6 +519,7 @@ class PhotonicLayoutManager(PhotonicBagProject):
                                             export_dir=export_dir if export_dir else self.scripts_dir
                                             )
 
+    @traced('dataprep')
     def dataprep(self):
         """
         Performs dataprep on the design
@@ -370,11 +533,16 @@ class PhotonicLayoutManager(PhotonicBagProject):
         self.content_list_post_dataprep = self.template_plugin.dataprep(
             flat_content_list=self.content_list_flat,
             name_list=self.cell_name_list,
-            is_lsf=False
+            is_lsf=False,
+            prepared_layers_list=self.get_prepared_layers(),
         )
+        self._annotate_object_counts(self.content_list_post_dataprep)
+        if self.template_plugin.collect_geometry_stats:
+            self.write_geometry_stats()
         end = time.time()
         timing_logger.info(f'{end - start:<15.6g} | Dataprep')
 
+    @traced('dataprep_calibre')
     def dataprep_calibre(self,
                          file_in=None,
                          file_out=None,
@@ -412,6 +580,7 @@ class PhotonicLayoutManager(PhotonicBagProject):
         end = time.time()
         timing_logger.info(f'{end - start:<15.6g} | Dataprep_calibre')
 
+    @traced('generate_dataprep_gds')
     def generate_dataprep_gds(self) -> None:
         """
         Exports the dataprep content to GDS format
@@ -427,6 +596,7 @@ class PhotonicLayoutManager(PhotonicBagProject):
         end = time.time()
         timing_logger.info(f'{end - start:<15.6g} | GDS export, dataprep')
 
+    @traced('create_materials_file')
     def create_materials_file(self):
         """
         Takes the custom materials stated in the lumerical_map and generates a Lumerical lsf file that defines the
@@ -436,19 +606,20 @@ class PhotonicLayoutManager(PhotonicBagProject):
 
         inpath = self.photonic_tech_info.lsf_export_path
         outpath = self.scripts_dir / 'materials.lsf'
-        with open(inpath, 'r') as f:
-            lumerical_map = yaml.load(f, Loader=yaml.CFullLoader if yaml.__with_libyaml__ else yaml.FullLoader)
+        lumerical_map = load_yaml_cached(inpath, copy_content=False)
 
         # 2) Extract the custom materials under the materials key
         mat_map = lumerical_map['materials']
 
         # 3) Create the LumericalMaterialGenerator class and load the data in
+        from .lumerical.code_generator import LumericalMaterialGenerator
         lmg = LumericalMaterialGenerator(str(outpath))
         lmg.import_material_file(mat_map)
 
         # 4) Export to LSF
         lmg.export_to_lsf()
 
+    @traced('generate_schematic')
     def generate_schematic(self) -> None:
         """
         Generate the schematic.
@@ -489,10 +660,15 @@ class PhotonicLayoutManager(PhotonicBagProject):
         timing_logger.info(f'  {end_design - end_create_design_module:<13.6g} | - Designing schematic')
         timing_logger.info(f'  {end_implement - end_design:<13.6g} | - Instantiating schematic')
 
+    @traced('run_photonic_lvs')
     def run_photonic_lvs(self,
                          gds_layout_path=None,
                          plvs_runset_template=None,
                          ):
+        try:
+            from PLVS.PLVS import PLVS
+        except ImportError:
+            PLVS = None
 
         if not PLVS:
             raise ValueError(f'PLVS plugin is not initialized. '
@@ -519,6 +695,38 @@ class PhotonicLayoutManager(PhotonicBagProject):
 
         return ret_codes, log_files
 
+    @property
+    def geometry_stats(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Geometry statistics recorded when bpg_config.geometry_stats is set:
+        'masters' : for each master class of the last flattening, the number of distinct masters, of flattened
+        instances, of shapes drawn by the masters and of shapes they contribute to the flat layout,
+        'dataprep' : for each layer after each dataprep step, the polygon count, vertex count, maximum vertices per
+        polygon and bounding box area.
+        """
+        return dict(masters=self.template_plugin.master_stats, dataprep=self.template_plugin.dataprep_stats)
+
+    def write_geometry_stats(self,
+                             directory: Optional[Path] = None,
+                             ) -> None:
+        """
+        Writes the geometry statistics to geometry_stats_masters.csv and geometry_stats_dataprep.csv.
+
+        Parameters
+        ----------
+        directory : Optional[Path]
+            Directory in which to write the files. Defaults to the log directory
+        """
+        directory = Path(directory) if directory else Path(self.log_path)
+        for name, rows in self.geometry_stats.items():
+            with open(directory / f'geometry_stats_{name}.csv', 'w', newline='') as f:
+                if not rows:
+                    continue
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                writer.writeheader()
+                for row in rows:
+                    writer.writerow({key: _csv_value(value) for key, value in row.items()})
+
     def save_content_list(self,
                           content_list: str,
                           filepath: str = None,
@@ -618,6 +826,10 @@ def _json_convert_to_dict(obj: object) -> dict:
         __module__=obj.__module__,
     )
 
+    # Arrays, such as the vertices of polygon arrays, are stored as plain lists
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+
     # Update object dictionary with the obj's properties
     if isinstance(obj, UserDict):
         obj_dict.update(obj.data)
@@ -655,3 +867,10 @@ def _json_convert_from_dict(obj_dict: dict) -> object:
         obj = obj_dict
 
     return obj
+
+
+def _csv_value(value: Any) -> Any:
+    """ Formats a geometry statistics value for CSV, writing layer purpose pairs as 'layer:purpose' """
+    if isinstance(value, (list, tuple)):
+        return ':'.join(str(item) for item in value)
+    return value
@@ -6,6 +6,13 @@ import BPG
 import re
 
 
+def _close_handlers(logger: logging.Logger) -> None:
+    """ Closes and removes all handlers of a logger, so that long-lived processes do not leak log files """
+    for handler in logger.handlers:
+        handler.close()
+    logger.handlers = []
+
+
 def setup_logger(log_path: str,
                  log_filename: str = 'bpg.log',
                  ) -> None:
@@ -26,7 +33,7 @@ def setup_logger(log_path: str,
     # Set up the initial basic config for the root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.DEBUG)
-    root_logger.handlers = []
+    _close_handlers(root_logger)
 
     # Add a console handler
     out_handler = logging.StreamHandler()
@@ -74,7 +81,7 @@ def setup_logger(log_path: str,
     dataprep_file_handler.setLevel(logging.DEBUG)
     dataprep_file_handler.setFormatter(formatter)
 
-    dataprep_logger.handlers = []
+    _close_handlers(dataprep_logger)
     dataprep_logger.addHandler(dataprep_file_handler)
 
     # Print out the current date and time
@@ -99,7 +106,7 @@ def setup_logger(log_path: str,
     timing_formatter = logging.Formatter('%(message)-15s')
     timing_file_handler.setFormatter(timing_formatter)
 
-    timing_logger.handlers = []
+    _close_handlers(timing_logger)
     timing_logger.addHandler(timing_file_handler)
 
     # Print out the current date and time
@@ -109,6 +116,21 @@ def setup_logger(log_path: str,
 
     timing_logger.propagate = True
 
+    ################################################################################
+    # Memory logger
+    ################################################################################
+    # Set up a memory information logger, written to by BPG.tracing when memory accounting is enabled
+    memory_logger = logging.getLogger('memory')
+    memory_logger.setLevel(logging.DEBUG)
+    memory_logger.propagate = False
+
+    _close_handlers(memory_logger)
+    if BPG.run_settings['bpg_config'].get('memory_report', False):
+        memory_file_handler = logging.FileHandler(log_path + '/' 'memory.log', 'w')
+        memory_file_handler.setLevel(logging.DEBUG)
+        memory_file_handler.setFormatter(timing_formatter)
+        memory_logger.addHandler(memory_file_handler)
+
     """
     Adding an end-of-execution summary message that indicates how many errors / warnings were generated during the run.
     """
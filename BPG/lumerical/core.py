@@ -1,8 +1,9 @@
 import time
 import logging
-import yaml
 
 from BPG.abstract_plugin import AbstractPlugin
+from BPG.config_cache import load_yaml_cached
+from BPG.tracing import traced, annotate
 from .code_generator import LumericalDesignGenerator
 from BPG.lumerical.objects import PhotonicRect, PhotonicPolygon, PhotonicRound
 
@@ -20,6 +21,7 @@ class LumericalPlugin(AbstractPlugin):
         self.lsf_export_config = lsf_export_config
         self.export_dir = None
 
+    @traced('lsf.export_content_list')
     def export_content_list(self,
                             content_lists: List["ContentList"],
                             name_list: List[str] = None,
@@ -41,12 +43,11 @@ class LumericalPlugin(AbstractPlugin):
         if export_dir is None:
             raise ValueError(f'export_dir must be specified')
         self.export_dir = export_dir
+        annotate(cell_count=len(content_lists))
 
         start = time.time()
         # 1) Import tech information for the layermap and lumerical properties
-        with open(self.lsf_export_config, 'r') as f:
-            lay_info = yaml.load(f, Loader=yaml.CFullLoader if yaml.__with_libyaml__ else yaml.FullLoader)
-            prop_map = lay_info['lumerical_prop_map']
+        prop_map = load_yaml_cached(self.lsf_export_config, copy_content=False)['lumerical_prop_map']
 
         # 2) For each element in the content list, convert it into lsf code and append to running file
         for name, content_list in zip(name_list, content_lists):
@@ -81,7 +82,7 @@ class LumericalPlugin(AbstractPlugin):
                     lsf_repr = PhotonicPolygon.lsf_export(path['polygon_points'], layer_prop)
                     lsfwriter.add_formatted_code_block(lsf_repr)
 
-            if len(content_list.polygon_list) != 0:
+            if len(content_list.polygon_list) != 0 or len(content_list.polygon_array_list) != 0:
                 lsfwriter.add_formatted_line(' ')
                 lsfwriter.add_formatted_line('#---------------- ')
                 lsfwriter.add_formatted_line('# Adding Polygons ')
@@ -91,6 +92,11 @@ class LumericalPlugin(AbstractPlugin):
                     layer_prop = prop_map[tuple(polygon['layer'])]
                     lsf_repr = PhotonicPolygon.lsf_export(polygon['points'], layer_prop)
                     lsfwriter.add_formatted_code_block(lsf_repr)
+            for polygon_array in content_list.polygon_array_list:
+                if tuple(polygon_array['layer']) in prop_map:
+                    layer_prop = prop_map[tuple(polygon_array['layer'])]
+                    lsf_repr = PhotonicPolygon.lsf_export_array(polygon_array, layer_prop)
+                    lsfwriter.add_formatted_code_block(lsf_repr)
 
             if len(content_list.round_list) != 0:
                 lsfwriter.add_formatted_line(' ')
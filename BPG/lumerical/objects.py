@@ -1278,8 +1278,53 @@ class PhotonicPolygon(Polygon):
         lsf_code : List[str]
             list of str containing the lsf code required to create specified rectangles
         """
+        return cls._lsf_polygon_code(
+            x_meters=[CoordBase(point[0]).meters for point in vertices],
+            y_meters=[CoordBase(point[1]).meters for point in vertices],
+            layer_prop=layer_prop,
+        )
+
+    @classmethod
+    def lsf_export_array(cls, polygon_array, layer_prop) -> List[str]:
+        """
+        Describes all polygons of a polygon array content item in terms of lsf parameters for lumerical use.
+        The vertices of all polygons are converted to meters at once, with the same rounding as CoordBase.
+
+        Parameters
+        ----------
+        polygon_array : dict
+            polygon array content item, with the vertices of all polygons and the offsets at which each one starts
+        layer_prop : dict
+            dictionary containing material properties for the desired layer
+
+        Returns
+        -------
+        lsf_code : List[str]
+            list of str containing the lsf code required to create all the polygons
+        """
+        vertices = np.asarray(polygon_array['vertices'], dtype=float).reshape(-1, 2)
+        offsets = np.asarray(polygon_array['offsets'], dtype=np.int64).tolist()
+
+        # Snap to the resolution grid as an integer number of grid points, then scale to meters.
+        # Dividing the exact integer gives the same float as the Decimal arithmetic of CoordBase.meters
+        grid_points = np.round(vertices / float(CoordBase.res))
+        meters = grid_points / float(1 / (CoordBase.res * CoordBase.micron))
+        x_meters = meters[:, 0].tolist()
+        y_meters = meters[:, 1].tolist()
+
+        lsf_code = []
+        for start, stop in zip(offsets[:-1], offsets[1:]):
+            lsf_code.extend(cls._lsf_polygon_code(x_meters[start:stop], y_meters[start:stop], layer_prop))
+        return lsf_code
+
+    @staticmethod
+    def _lsf_polygon_code(x_meters: List[float],
+                          y_meters: List[float],
+                          layer_prop: dict,
+                          ) -> List[str]:
+        """ Returns the lsf code of a single polygon given its vertex coordinates in meters """
         # Grab the number of vertices in the polygon to preallocate Lumerical matrix size
-        poly_len = len(vertices)
+        poly_len = len(x_meters)
 
         # Write the lumerical code for the polygon
         lsf_code = ['\n',
@@ -1294,8 +1339,8 @@ class PhotonicPolygon(Polygon):
 
                     # Create matrix to hold vertices, Note that the Lumerical uses meters as the base unit
                     'V = matrix({},2);\n'.format(poly_len),
-                    'V(1:{},1) = {};\n'.format(poly_len, [CoordBase(point[0]).meters for point in vertices]),
-                    'V(1:{},2) = {};\n'.format(poly_len, [CoordBase(point[1]).meters for point in vertices]),
+                    'V(1:{},1) = {};\n'.format(poly_len, x_meters),
+                    'V(1:{},2) = {};\n'.format(poly_len, y_meters),
                     'set("vertices", V);\n',
 
                     # Set the thickness values from the layermap file
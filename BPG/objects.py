@@ -5,6 +5,7 @@
 import numpy as np
 # import sys
 import logging
+import functools
 from copy import deepcopy
 
 from bag.layout.objects import Arrayable, Rect, Path, PathCollection, TLineBus, Polygon, Blockage, Boundary, \
@@ -15,15 +16,15 @@ import bag.io
 from bag.layout.util import transform_point, BBox, transform_table
 
 from BPG.geometry import Transformable2D
-from BPG.compiler.point_operations import coords_cleanup, create_polygon_from_path_and_width
+from BPG.compiler.point_operations import coords_cleanup, create_polygon_from_path_and_width, \
+    coords_cleanup_segments, create_polygons_from_paths_and_widths
 
-from typing import TYPE_CHECKING, Union, List, Tuple, Optional, Dict, Any, cast
+from typing import TYPE_CHECKING, Union, List, Tuple, Optional, Dict, Any, Iterable, cast
 from BPG.bpg_custom_types import dim_type, coord_type, lpp_type, layer_or_lpp_type
 
 from BPG.port import PhotonicPort
 if TYPE_CHECKING:
     from BPG.template import PhotonicTemplateBase
-    from bag.layout.objects import Figure
 
 # Load logger
 logger = logging.getLogger(__name__)
@@ -102,7 +103,9 @@ class PhotonicInstance(Instance):
         Instance.__init__(self, parent_grid, lib_name, master, loc, orient,
                           name, nx, ny, spx, spy, unit_mode)
 
+        # Transformed photonic ports, filled on access. True once all of the ports of the master are in it
         self._photonic_port_list: Dict[str, "PhotonicPort"] = {}
+        self._photonic_ports_complete = False
 
         self._origin = Transformable2D(
             center=loc,
@@ -113,7 +116,6 @@ class PhotonicInstance(Instance):
             force_cardinal=False,  # TODO
             unit_mode=unit_mode,
         )
-        self._import_photonic_ports()
         # If the angle of this instance is not 0, rotate the instance
         # TODO: is_cardinal / close enough to cardinal?
         if angle != 0.0 or mirrored:
@@ -200,34 +202,43 @@ class PhotonicInstance(Instance):
     def origin(self) -> "Transformable2D":
         return self._origin
 
-    def _import_photonic_ports(self) -> None:
+    def _invalidate_photonic_ports(self) -> None:
         """
-        Takes all ports from the provided master and adds them to this instance. Transformations are
-        performed to match the current orientation and location.
+        Forgets the transformed ports of this instance. Ports are transformed from the master when they are first
+        accessed, so that instances that are placed and moved many times do not transform ports that are never read.
         """
+        self._photonic_port_list = {}
+        self._photonic_ports_complete = False
+
+    def _master_photonic_port_names(self) -> Iterable[str]:
+        """ Returns the names of the photonic ports of the master """
         # Note some generator classes may be subclasses of TemplateBase/AnalogBase, but not
         # PhotonicTemplateBase. These classes do not have photonic ports, but we still want to support
-        # the ability to instance them. Here we check if the class has photonic ports, and if it does
-        # we will import them into the instance
+        # the ability to instance them.
         try:
-            port_iter = self._master.photonic_ports_names_iter()
+            return self._master.photonic_ports_names_iter()
         except AttributeError:
-            logging.debug(f'new instance {self._master.__class__.__name__} is not a subclass of photonic template '
-                          f'base')
-        else:
-            for port_name in port_iter:
-                port_copy: "PhotonicPort" = deepcopy(self._master.get_photonic_port(port_name))
-                xformed = port_copy.mirror_rotate_translate(
-                    translation=self.location_unit,
-                    rotation=self.angle,
-                    mirror=self.mirrored,
-                    force_cardinal=False,  # TODO: Need to determine what to do if force_cardinal is really true
-                    unit_mode=True
-                )
-                assert isinstance(xformed, PhotonicPort), "should not change type"
-                self._photonic_port_list[port_name] = xformed
+            logging.debug(f'instance {self._master.__class__.__name__} is not a subclass of photonic template base')
+            return ()
+
+    def _transform_photonic_port(self, port_name: str) -> "PhotonicPort":
+        """ Returns a copy of the master port with the given name, transformed to match the location and angle """
+        port_copy: "PhotonicPort" = deepcopy(self._master.get_photonic_port(port_name))
+        xformed = port_copy.mirror_rotate_translate(
+            translation=self.location_unit,
+            rotation=self.angle,
+            mirror=self.mirrored,
+            force_cardinal=False,  # TODO: Need to determine what to do if force_cardinal is really true
+            unit_mode=True
+        )
+        assert isinstance(xformed, PhotonicPort), "should not change type"
+        return xformed
 
     def get_all_photonic_ports(self) -> Dict[str, "PhotonicPort"]:
+        if not self._photonic_ports_complete:
+            for port_name in self._master_photonic_port_names():
+                self.get_photonic_port(port_name)
+            self._photonic_ports_complete = True
         return self._photonic_port_list
 
     def get_photonic_port(self,
@@ -236,7 +247,8 @@ class PhotonicInstance(Instance):
                           col: int = 0,
                           ) -> "PhotonicPort":
         """
-        Returns the photonic port object associated with the provided port name
+        Returns the photonic port object associated with the provided port name. The port is transformed from the
+        master on first access, and kept until this instance is moved.
 
         Parameters
         ----------
@@ -253,7 +265,13 @@ class PhotonicInstance(Instance):
             photonic port object associated with the provided name
         """
         # TODO: Confirm that this works for arrayable instances
-        return self._photonic_port_list[name]
+        port = self._photonic_port_list.get(name, None)
+        if port is None:
+            if name not in self._master_photonic_port_names():
+                raise KeyError(name)
+            port = self._transform_photonic_port(name)
+            self._photonic_port_list[name] = port
+        return port
 
     def get_bound_box_of(self,
                          row: int = 0,
@@ -288,8 +306,8 @@ class PhotonicInstance(Instance):
 
         # Move the origin
         self._origin.move_by(translation=(dx, dy), unit_mode=True)
-        # import ports with the new locations
-        self._import_photonic_ports()
+        # Ports are transformed to the new location on their next access
+        self._invalidate_photonic_ports()
 
     def transform(self,
                   loc: coord_type = (0, 0),
@@ -330,8 +348,8 @@ class PhotonicInstance(Instance):
             self._origin.center_unit = loc
             self._origin.orientation = orient
 
-            # Now that origin is correctly placed, regenerate the ports accordingly
-            self._import_photonic_ports()
+            # Now that origin is correctly placed, the ports are regenerated accordingly on their next access
+            self._invalidate_photonic_ports()
             return self
 
         else:
@@ -385,8 +403,8 @@ class PhotonicInstance(Instance):
         # Regenerate the master based on the new origin
         self.new_master_with(angle=self.mod_angle)
 
-        # Re-extract the port locations
-        self._import_photonic_ports()
+        # Re-extract the port locations on their next access
+        self._invalidate_photonic_ports()
 
     def get_port(self, name='', row=0, col=0):
         # Overwrite to use the proper location
@@ -397,6 +415,48 @@ class PhotonicInstance(Instance):
                                                      orient=self.orientation, unit_mode=True)
 
 
+# Number of round outlines kept by _round_outline. Designs with many rings typically repeat a few radii many times
+ROUND_OUTLINE_CACHE_SIZE = 512
+
+
+@functools.lru_cache(maxsize=ROUND_OUTLINE_CACHE_SIZE)
+def _round_outline(rout: dim_type,
+                   rin: dim_type,
+                   theta0: dim_type,
+                   theta1: dim_type,
+                   resolution: float,
+                   ) -> np.ndarray:
+    """
+    Returns the (npts, 2) outline of a round centered on the origin. The points are spaced so that the maximum error
+    from the ideal circle is no larger than the grid resolution. The returned array is shared and read-only.
+    """
+    theta0_rad = np.deg2rad(theta0)
+    theta1_rad = np.deg2rad(theta1)
+    if rin > 0:
+        # Ensures maximum error from ideal circle is no larger than grid resolution
+        pt_spacing_in = 2 * np.sqrt(2 * rin * resolution)
+        pt_spacing_out = 2 * np.sqrt(2 * rout * resolution)
+
+        phi1 = np.linspace(theta0_rad, theta1_rad,
+                           max(3, 1 + int(np.ceil(abs(theta1_rad - theta0_rad) * rin / pt_spacing_in))))
+        phi2 = np.linspace(theta0_rad, theta1_rad,
+                           max(3, 1 + int(np.ceil(abs(theta1_rad - theta0_rad) * rout / pt_spacing_out))))
+
+        X = np.concatenate([np.array(rin * np.cos(phi1)), np.flip(np.array(rout * np.cos(phi2)), 0)])
+        Y = np.concatenate([np.array(rin * np.sin(phi1)), np.flip(np.array(rout * np.sin(phi2)), 0)])
+    else:
+        pt_spacing = 2 * np.sqrt(2 * rout * resolution)
+        phi2 = np.linspace(theta0_rad, theta1_rad,
+                           max(3, 1 + int(np.ceil(abs(theta1_rad - theta0_rad) * rout / pt_spacing))))
+
+        X = np.concatenate([np.array([0]), np.flip(np.array(rout * np.cos(phi2)), 0)])
+        Y = np.concatenate([np.array([0]), np.flip(np.array(rout * np.sin(phi2)), 0)])
+
+    outline = np.stack([X, Y], 1)
+    outline.setflags(write=False)
+    return outline
+
+
 class PhotonicRound(Arrayable):
     """A layout round object, with optional arraying parameters.
 
@@ -692,37 +752,22 @@ class PhotonicRound(Arrayable):
                                  spy: dim_type = 0.0,
                                  resolution: float = 0.001,
                                  ) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """
+        Returns the points of the polygon of each copy of an arrayed round. The outline of the round is computed once
+        for each set of radii, angles and resolution, and translated to every copy of the array in one operation.
 
-        theta0_rad = np.deg2rad(theta0)
-        theta1_rad = np.deg2rad(theta1)
-        if rin > 0:
-            # Ensures maximum error from ideal circle is no larger than grid resolution
-            pt_spacing_in = 2 * np.sqrt(2 * rin * resolution)
-            pt_spacing_out = 2 * np.sqrt(2 * rout * resolution)
-
-            phi1 = np.linspace(theta0_rad, theta1_rad,
-                               max(3, 1 + int(np.ceil(abs(theta1_rad - theta0_rad) * rin / pt_spacing_in))))
-            phi2 = np.linspace(theta0_rad, theta1_rad,
-                               max(3, 1 + int(np.ceil(abs(theta1_rad - theta0_rad) * rout / pt_spacing_out))))
-
-            X = np.concatenate([np.array(rin * np.cos(phi1)), np.flip(np.array(rout * np.cos(phi2)), 0)])
-            Y = np.concatenate([np.array(rin * np.sin(phi1)), np.flip(np.array(rout * np.sin(phi2)), 0)])
-        else:
-            pt_spacing = 2 * np.sqrt(2 * rout * resolution)
-            phi2 = np.linspace(theta0_rad, theta1_rad,
-                               max(3, 1 + int(np.ceil(abs(theta1_rad - theta0_rad) * rout / pt_spacing))))
-
-            X = np.concatenate([np.array([0]), np.flip(np.array(rout * np.cos(phi2)), 0)])
-            Y = np.concatenate([np.array([0]), np.flip(np.array(rout * np.sin(phi2)), 0)])
-
-        X = X + center[0]
-        Y = Y + center[1]
+        Returns
+        -------
+        output_list : Tuple[List[np.ndarray], List[np.ndarray]]
+            The (npts, 2) point array of each copy, ordered by column then row, and an empty list of negative polygons
+        """
+        outline = _round_outline(rout, rin, theta0, theta1, resolution) + center
+        # Offsets of the copies, with the row index varying fastest
+        offsets = np.stack([np.repeat(np.arange(nx) * spx, ny), np.tile(np.arange(ny) * spy, nx)], axis=1)
+        points = outline[np.newaxis, :, :] + offsets[:, np.newaxis, :]
 
-        output_list_p: List[np.ndarray] = []
+        output_list_p: List[np.ndarray] = list(points)
         output_list_n: List[np.ndarray] = []
-        for x_count in range(nx):
-            for y_count in range(ny):
-                output_list_p.append(np.stack([X + x_count * spx, Y + y_count * spy], 1))
         return output_list_p, output_list_n
 
     def export_to_polygon(self):
@@ -982,6 +1027,100 @@ class PhotonicPath(Figure):
             eps=self._eps_unit,
         )
 
+    @classmethod
+    def create_paths(cls,
+                     resolution: float,
+                     layer: layer_or_lpp_type,
+                     widths: Union[dim_type, Iterable[dim_type]],
+                     points_list: Iterable[Union[List[coord_type], np.ndarray]],
+                     unit_mode: bool = False,
+                     eps: float = None,
+                     ) -> List['PhotonicPath']:
+        """
+        Creates many paths on the same layer at once. The paths are cleaned up and polygonized in a single vectorized
+        pass over the concatenated points of all of the paths, which is much faster than creating each PhotonicPath
+        when drawing many paths. The resulting paths are identical to the paths created one by one.
+
+        Parameters
+        ----------
+        resolution : float
+            the layout grid resolution.
+        layer : string or (string, string)
+            the layer name, or a tuple of layer name and purpose name.
+            If purpose name not given, defaults to 'phot'.
+        widths : Union[dim_type, Iterable[dim_type]]
+            width of every path, or list of the widths of each path, in layout units.
+        points_list : Iterable[Union[List[coord_type], np.ndarray]]
+            list of the path points of each path.
+        unit_mode : bool
+            True if widths, points, and tolerance are given as resolution units instead of layout units.
+        eps : float
+            The tolerance for determining whether two points are coincident or colinear.
+
+        Returns
+        -------
+        paths : List[PhotonicPath]
+            The created paths, in the order of points_list
+        """
+        if isinstance(layer, str):
+            layer = (layer, 'phot')
+
+        points_arrays = [np.array(points) if unit_mode else np.array(points) / resolution for points in points_list]
+        if not points_arrays:
+            return []
+        if np.ndim(widths) == 0:
+            widths = [widths] * len(points_arrays)
+        else:
+            widths = list(widths)
+            if len(widths) != len(points_arrays):
+                raise ValueError(f'PhotonicPath: {len(widths)} widths given for {len(points_arrays)} paths')
+        for width, points_unit in zip(widths, points_arrays):
+            if width <= 0:
+                raise ValueError('PhotonicPath: width argument must be a positive number')
+            if points_unit.ndim != 2 or points_unit.shape[0] < 2:
+                raise ValueError('PhotonicPath: a path must have at least 2 points')
+
+        if eps is None:
+            eps_unit = 0.1
+        else:
+            eps_unit = eps if unit_mode else eps / resolution
+        if unit_mode:
+            widths_unit = [int(width) for width in widths]
+        else:
+            widths_unit = [int(round(width / resolution)) for width in widths]
+
+        # Remove coincident points from all of the paths, then polygonize them together
+        offsets = np.zeros(len(points_arrays) + 1, dtype=int)
+        np.cumsum([len(points_unit) for points_unit in points_arrays], out=offsets[1:])
+        points_buffer, offsets = coords_cleanup_segments(
+            np.concatenate(points_arrays, axis=0),
+            offsets,
+            eps_grid=eps_unit,
+            cyclic_points=False,
+            check_inline=False,
+        )
+        polygon_buffer, polygon_offsets = create_polygons_from_paths_and_widths(
+            points_list=points_buffer,
+            offsets=offsets,
+            widths=widths_unit,
+            eps=eps_unit,
+        )
+        polygon_buffer = np.round(polygon_buffer).astype(int)
+
+        paths = []
+        for index, (width_unit, points_unit) in enumerate(zip(widths_unit, points_arrays)):
+            path = cls.__new__(cls)
+            Figure.__init__(path, resolution)
+            path._layer = layer
+            path._destroyed = False
+            path._eps_unit = eps_unit
+            path._width_unit = width_unit
+            path._points_unit_scale = \
+                points_buffer[offsets[index]:offsets[index + 1]].astype(points_unit.dtype, copy=False)
+            path._polygon_points_unit = polygon_buffer[polygon_offsets[index]:polygon_offsets[index + 1]]
+            paths.append(path)
+        return paths
+
     @staticmethod
     def process_points(points: np.ndarray,
                        width: dim_type,
@@ -1335,6 +1474,31 @@ class PhotonicPolygon(Figure):
             ]
         )
 
+    @staticmethod
+    def rotate_all(polygons: List["PhotonicPolygon"],
+                   angle: float = 0.0,
+                   ) -> None:
+        """
+        Rotates all of the given polygons about the origin by the given angle, in a single array operation over all
+        of their points. The result is the same as rotating each polygon with rotate.
+
+        Parameters
+        ----------
+        polygons : List[PhotonicPolygon]
+            the polygons to rotate
+        angle : float
+            the amount in radians that the polygons will be rotated
+        """
+        if not polygons:
+            return
+        points = np.concatenate([poly._points for poly in polygons])
+        cos, sin = np.cos(angle), np.sin(angle)
+        rotated = np.column_stack([cos * points[:, 0] - sin * points[:, 1],
+                                   sin * points[:, 0] + cos * points[:, 1]])
+        offsets = np.cumsum([len(poly._points) for poly in polygons[:-1]])
+        for poly, poly_points in zip(polygons, np.split(rotated, offsets)):
+            poly._points = poly_points
+
 
 class PhotonicAdvancedPolygon(Polygon):
     """
@@ -0,0 +1,187 @@
+"""
+This module keeps a history of the performance of the runs, so that a slowdown introduced by a generator, tech or BPG
+change can be found by comparing a run to the previous runs of the same spec file.
+
+Each stage of a run (each top level tracing span, see BPG.tracing) appends one JSON line to the history file::
+
+    {"run_id": "20240101T120000-1234-9f8e7d6c", "date": "2024-01-01T12:00:00", "spec": "/path/to/specs.yaml",
+     "revision": "1a2b3c4", "bpg_revision": "5d6e7f8-dirty", "stage": "dataprep", "duration": 1.23,
+     "rss_mb": 512.0, "peak_rss_growth_mb": 64.0, "masters": 12, "polygon": 3400, ...}
+
+Runs of the same spec file that generate different cases, such as the sizes of a scaling benchmark, also record their
+case, e.g. "case": {"benchmark": "rect_array", "size": 100}, and are only compared to the runs of the same case.
+
+The revision is the git revision of the directory of the spec file, and bpg_revision the git revision of BPG. Both are
+None outside of a git repository, and are looked up once per directory and process.
+"""
+import os
+import json
+import uuid
+import logging
+import datetime
+import functools
+import subprocess
+from pathlib import Path
+
+from BPG.tracing import _json_value
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+def git_revision(path: Union[str, Path]) -> Optional[str]:
+    """ Returns the git revision of the repository containing path, suffixed with -dirty if it has local changes """
+    return _git_revision(str(Path(path).resolve()))
+
+
+@functools.lru_cache(maxsize=None)
+def _git_revision(path: str) -> Optional[str]:
+    """ Returns the git revision of the repository containing the resolved path, computed once per process """
+    try:
+        result = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=path,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() or None
+
+
+class PerfHistory:
+    """
+    Appends the duration, memory accounting and object counts of each stage of a run to a JSONL history file.
+    Register the record method as a listener of the tracer to record every top level span.
+
+    Parameters
+    ----------
+    filepath : Union[str, Path]
+        Path of the history file
+    spec_file : str
+        Spec file of the run, used as the key of the run in the history
+    case : Optional[Dict[str, Any]]
+        Case of the spec file generated by the run, used along with the spec file as the key of the run. None if the
+        spec file always generates the same layout
+    """
+    def __init__(self,
+                 filepath: Union[str, Path],
+                 spec_file: str,
+                 case: Optional[Dict[str, Any]] = None,
+                 ) -> None:
+        self.filepath = Path(filepath)
+        spec_path = Path(spec_file).resolve()
+        now = datetime.datetime.now()
+        # Several runs of a process can start within the same second, as in the generation server or batch mode
+        self.run_info = dict(run_id=f'{now.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}-{uuid.uuid4().hex[:8]}',
+                             date=now.isoformat(timespec='seconds'),
+                             spec=str(spec_path),
+                             revision=git_revision(spec_path.parent),
+                             bpg_revision=git_revision(Path(__file__).parent))
+        self.case = case
+
+    def record(self, stage: str, duration: float, attrs: Dict[str, Any]) -> None:
+        """ Appends a stage of the run to the history file """
+        record = dict(self.run_info, stage=stage, duration=duration)
+        if self.case is not None:
+            record['case'] = self.case
+        record.update((key, _json_value(value)) for key, value in attrs.items() if key not in record)
+        try:
+            with open(self.filepath, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except OSError as e:
+            logging.warning(f'Could not append to the performance history {self.filepath}: {e}')
+
+
+def load_history(filepath: Union[str, Path]) -> List[Dict[str, Any]]:
+    """ Reads the records of a history file, skipping the lines that cannot be parsed """
+    records = []
+    with open(filepath, 'r') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def _median(values: List[float]) -> float:
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+def compare_history(records: List[Dict[str, Any]],
+                    spec: Optional[str] = None,
+                    last_n: int = 5,
+                    threshold: float = 0.2,
+                    min_time: float = 0.05,
+                    ) -> List[Dict[str, Any]]:
+    """
+    Compares the duration of each stage of the latest run of each spec file and case to its median over the previous
+    runs of the same spec file and case.
+
+    Parameters
+    ----------
+    records : List[Dict[str, Any]]
+        The records of the history, in the order they were appended
+    spec : Optional[str]
+        Spec file to compare. Defaults to all of the spec files of the history
+    last_n : int
+        Number of previous runs to compare against
+    threshold : float
+        Relative slowdown above which a stage is flagged as a regression
+    min_time : float
+        Absolute slowdown in seconds below which a stage is never flagged, to ignore the noise of short stages
+
+    Returns
+    -------
+    comparison : List[Dict[str, Any]]
+        For each spec file, case and stage of its latest run found in previous runs, the 'revision' of the latest run,
+        the 'baseline' median and 'current' durations, their 'ratio', the number of baseline 'runs', and whether the
+        stage is a 'regression'
+    """
+    if spec is not None:
+        spec = str(Path(spec).resolve())
+    # (spec, case) keyed run id keyed stage keyed total duration, in the order of the runs. Stages run several times in
+    # a run, such as generate_template for several templates, are summed
+    runs: Dict[Tuple[str, str], Dict[str, Dict[str, float]]] = {}
+    cases: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+    revisions: Dict[str, Optional[str]] = {}
+    for record in records:
+        if spec is not None and record['spec'] != spec:
+            continue
+        key = (record['spec'], json.dumps(record.get('case'), sort_keys=True))
+        cases[key] = record.get('case')
+        stages = runs.setdefault(key, {}).setdefault(record['run_id'], {})
+        stages[record['stage']] = stages.get(record['stage'], 0.0) + record['duration']
+        revisions[record['run_id']] = record.get('revision')
+
+    comparison = []
+    for key, spec_runs in runs.items():
+        run_ids = list(spec_runs)
+        latest = run_ids[-1]
+        previous = [spec_runs[run_id] for run_id in run_ids[-last_n - 1:-1]]
+        for stage, current in spec_runs[latest].items():
+            durations = [stages[stage] for stages in previous if stage in stages]
+            if not durations:
+                continue
+            baseline = _median(durations)
+            comparison.append(dict(spec=key[0], case=cases[key], revision=revisions[latest], stage=stage,
+                                   runs=len(durations),
+                                   baseline=baseline, current=current,
+                                   ratio=current / baseline if baseline > 0 else float('inf'),
+                                   regression=current > baseline * (1 + threshold) and current - baseline > min_time))
+    return comparison
+
+
+def print_comparison(comparison: List[Dict[str, Any]]) -> None:
+    """ Prints the comparison of each stage, flagging the regressions, followed by a summary """
+    print(f'{"":<11}{"stage":<32}{"runs":>6}{"median (s)":>14}{"latest (s)":>14}{"ratio":>8}')
+    run_key = None
+    for row in comparison:
+        if (row['spec'], row.get('case')) != run_key:
+            run_key = (row['spec'], row.get('case'))
+            case = ''.join(f' {name}={value}' for name, value in (row.get('case') or {}).items())
+            print(f'{row["spec"]}{case} at revision {row["revision"]}')
+        print(f'{"REGRESSION" if row["regression"] else "":<11}{row["stage"]:<32}{row["runs"]:>6}'
+              f'{row["baseline"]:>14.4f}{row["current"]:>14.4f}{row["ratio"]:>8.2f}')
+    regressions = sum(row['regression'] for row in comparison)
+    print(f'{regressions} regressions in {len(comparison)} compared stages')
@@ -6,6 +6,7 @@ import abc
 import yaml
 import logging
 import math
+import numpy as np
 import string
 from .logger import setup_logger
 from pathlib import Path
@@ -20,10 +21,12 @@ from bag.layout.core import BagLayout, DummyTechInfo
 # BPG imports
 import BPG
 from BPG.content_list import ContentList
+from BPG.config_cache import load_yaml_cached, read_tech_bundle
 from BPG.geometry import BBoxMut
+from BPG.objects import PhotonicPolygon
 
 from typing import TYPE_CHECKING, List, Callable, Union, Tuple, Dict, Optional, Any
-from BPG.bpg_custom_types import layer_or_lpp_type, dim_type
+from BPG.bpg_custom_types import layer_or_lpp_type, lpp_type, dim_type
 
 # Typing imports
 if TYPE_CHECKING:
@@ -261,6 +264,8 @@ class PhotonicBagLayout(BagLayout):
 
         # Add new features to be supported in content list
         self._round_list: List["PhotonicRound"] = []
+        # Shapes added in bulk, stored as polygon arrays: layer, (N, 2) full precision vertices and offsets
+        self._polygon_array_list: List[Dict[str, Any]] = []
         self._sim_list = []
         self._source_list = []
         self._monitor_list = []
@@ -327,6 +332,16 @@ class PhotonicBagLayout(BagLayout):
                 if obj.valid:
                     targ_list.append(obj.content)
 
+        # Polygon arrays are snapped to the grid as a whole, they are never expanded into polygon objects
+        polygon_array_list = []
+        for polygon_array in self._polygon_array_list:
+            if len(polygon_array['offsets']) > 1:
+                polygon_array_list.append(dict(
+                    layer=polygon_array['layer'],
+                    vertices=np.round(polygon_array['vertices'] / self._res) * self._res,
+                    offsets=polygon_array['offsets'],
+                ))
+
         # get via primitives
         via_list.extend(self._via_primitives)
 
@@ -350,22 +365,24 @@ class PhotonicBagLayout(BagLayout):
                              round_list,
                              sim_list,
                              self._source_list,
-                             self._monitor_list
+                             self._monitor_list,
+                             polygon_array_list,
                              ]
 
         if (not inst_list and not self._inst_primitives and not rect_list and not blockage_list and
                 not boundary_list and not via_list and not self._pin_list and not path_list and
                 not polygon_list and not round_list and not self._sim_list and not self._source_list
-                and not self._monitor_list):
+                and not self._monitor_list and not polygon_array_list):
             self._is_empty = True
         else:
             self._is_empty = False
 
-        # Calculate the bounding box for the overall layout
+        # Calculate the bounding box for the overall layout. The bounds of the shapes are merged in place, without
+        # creating a bounding box for each of them
         for inst in self._inst_list:
             self._bound_box.merge(inst.bound_box)
         for rect in self._rect_list:
-            self._bound_box.merge(rect.bound_box)
+            self._bound_box.merge(rect.bbox)
         if self._via_list != []:
             logging.warning("vias are currently not considered in master bounding box calculations")
         # if self._pin_list != []:
@@ -377,10 +394,19 @@ class PhotonicBagLayout(BagLayout):
         if self._boundary_list != []:
             logging.warning("boundaries are currently not considered in master bounding box calculations")
         for poly in self._polygon_list:
-            self._bound_box.merge(poly.bound_box)
+            self._bound_box.merge_bounds(*self._unit_bounds(poly.points))
         if self._round_list != []:
             for round in self._round_list:
                 self._bound_box.merge(round.bound_box)
+        for polygon_array in polygon_array_list:
+            self._bound_box.merge_bounds(*self._unit_bounds(polygon_array['vertices']))
+
+    def _unit_bounds(self, points: np.ndarray) -> Tuple[int, int, int, int]:
+        """ Returns the left, bottom, right and top bounds of an (N, 2) point array, in resolution units """
+        left, bottom = np.amin(points, axis=0)
+        right, top = np.amax(points, axis=0)
+        return (int(round(left / self._res)), int(round(bottom / self._res)),
+                int(round(right / self._res)), int(round(top / self._res)))
 
     def get_content(self,
                     lib_name: str,
@@ -411,7 +437,7 @@ class PhotonicBagLayout(BagLayout):
         cell_name = rename_fun(cell_name)
         (inst_list, inst_prim_list, rect_list, via_list, pin_list,
          path_list, blockage_list, boundary_list, polygon_list, round_list,
-         sim_list, source_list, monitor_list) = self._raw_content
+         sim_list, source_list, monitor_list, polygon_array_list) = self._raw_content
 
         # update library name and apply layout cell renaming on instances
         inst_tot_list = []
@@ -461,6 +487,7 @@ class PhotonicBagLayout(BagLayout):
                 sim_list=sim_list,
                 source_list=source_list,
                 monitor_list=monitor_list,
+                polygon_array_list=polygon_array_list,
             )
 
     def rotate_all_by(self,
@@ -479,51 +506,31 @@ class PhotonicBagLayout(BagLayout):
         if self._finalized:
             raise Exception('Layout is already finalized.')
 
-        # Rotate all polygons first! Otherwise the other shapes get rotated twice
-        temp_poly_list = []
-        for _ in range(len(self._polygon_list)):
-            temp_poly = self._polygon_list.pop(0)  # Pull the current polygon off the list
-            # Rotate the polygons and add them to the list
-            temp_poly.rotate(angle=mod_angle)
-            temp_poly_list.append(temp_poly)
-
-        # Only add polygons to the content list after popping all of them off once. Otherwise there is an infinite loop
-        for poly in temp_poly_list:
-            self.add_polygon(poly)
-
-        # Rotate all rects
-        for _ in range(len(self._rect_list)):
-            rect = self._rect_list.pop(0)  # Pull the current arrayed rectangle off the list
-            poly_list = rect.export_to_polygon()  # Convert the arrayed rectangle to a list of polygons
-            for poly in poly_list:
-                # Rotate the polygons and add them to the list
-                poly.rotate(angle=mod_angle)
-                self.add_polygon(poly)
-
-        # Rotate all round shapes
-        for _ in range(len(self._round_list)):
-            circ = self._round_list.pop(0)  # Pull the current arrayed round off the list
-            poly_list = circ.export_to_polygon()
-            for poly in poly_list:
-                # Rotate the polygons and add them to the list
-                poly.rotate(angle=mod_angle)
-                self.add_polygon(poly)
-
-        # Rotate all path shapes
-        for _ in range(len(self._path_list)):
-            path = self._path_list.pop(0)  # Pull the current arrayed path off the list
-            poly = path.export_to_polygon()
-            poly.rotate(angle=mod_angle)
-            self.add_polygon(poly)
-
-        # Remove all pin shaptes from pin list
-        temp_pin_list = []
-        for _ in range(len(self._pin_list)):
-            pin = self._pin_list.pop(0)  # Pull the current pin off the list
-            temp_pin_list.append(pin)
-
-        # Rotate and add them back in
-        for pin in temp_pin_list:
+        # Convert all rects, rounds and paths to polygons, and rotate them along with the polygons in one operation
+        polygons = list(self._polygon_list)
+        for rect in self._rect_list:
+            polygons.extend(rect.export_to_polygon())
+        for circ in self._round_list:
+            polygons.extend(circ.export_to_polygon())
+        for path in self._path_list:
+            polygons.append(path.export_to_polygon())
+        PhotonicPolygon.rotate_all(polygons, angle=mod_angle)
+        cos, sin = np.cos(mod_angle), np.sin(mod_angle)
+        for polygon_array in self._polygon_array_list:
+            vertices = polygon_array['vertices']
+            polygon_array['vertices'] = np.column_stack([cos * vertices[:, 0] - sin * vertices[:, 1],
+                                                         sin * vertices[:, 0] + cos * vertices[:, 1]])
+
+        self._rect_list.clear()
+        self._round_list.clear()
+        self._path_list.clear()
+        self._polygon_list.clear()
+        self._polygon_list.extend(polygons)
+
+        # Rotate the pins and add them back in
+        pins = list(self._pin_list)
+        self._pin_list.clear()
+        for pin in pins:
             new_bbox = self.bbox_rotate(bbox=pin.bbox, angle=mod_angle)
             self.add_label(
                 label=pin.label,
@@ -595,6 +602,10 @@ class PhotonicBagLayout(BagLayout):
                          self._polygon_list, self._round_list,
                          self._sim_list, self._source_list, self._monitor_list):
             obj.move_by(dx=dx, dy=dy, unit_mode=unit_mode)
+        if unit_mode:
+            dx, dy = dx * self._res, dy * self._res
+        for polygon_array in self._polygon_array_list:
+            polygon_array['vertices'] = polygon_array['vertices'] + np.array([dx, dy])
 
     def add_round(self,
                   round_obj: "PhotonicRound",
@@ -616,6 +627,31 @@ class PhotonicBagLayout(BagLayout):
                  ):
         BagLayout.add_path(self, path)
 
+    def add_polygon_array(self,
+                          layer: lpp_type,
+                          vertices: np.ndarray,
+                          offsets: np.ndarray,
+                          ) -> None:
+        """Add many polygons on a layer, stored compactly as a single polygon array.
+
+        Parameters
+        ----------
+        layer : Tuple[str, str]
+            the layer purpose pair of the polygons.
+        vertices : np.ndarray
+            the (N, 2) vertices of all of the polygons back to back, in layout units.
+        offsets : np.ndarray
+            the (n_polygons + 1) offsets of the polygons: polygon i is vertices[offsets[i]:offsets[i + 1]].
+        """
+        if self._finalized:
+            raise Exception('Layout is already finalized.')
+
+        self._polygon_array_list.append(dict(
+            layer=(layer[0], layer[1]),
+            vertices=np.asarray(vertices, dtype=float).reshape(-1, 2),
+            offsets=np.asarray(offsets, dtype=np.int64),
+        ))
+
     def add_sim_obj(self,
                     sim_obj,
                     ):
@@ -713,6 +749,13 @@ class PhotonicTechInfo(object, metaclass=abc.ABCMeta):
 
 
 
+        # Optional precompiled tech bundle holding the parsed content of the tech files above
+        self.tech_bundle_path = self.photonic_tech_params.get(
+            'tech_bundle',
+            None
+        )
+        self._tech_bundle_loaded = False
+
         self.layer_map = None
         self.via_info = None
         self.lsf_export_parameters = None
@@ -725,34 +768,33 @@ class PhotonicTechInfo(object, metaclass=abc.ABCMeta):
         self.load_tech_files()
 
     def load_tech_files(self):
-        with open(self.layermap_path, 'r') as f:
-            layer_info = yaml.load(f, Loader=yaml.CFullLoader if yaml.__with_libyaml__ else yaml.FullLoader)
-            self.layer_map = layer_info['layer_map']
-            self.via_info = layer_info['via_info']
-
-        with open(self.lsf_export_path, 'r') as f:
-            self.lsf_export_parameters = yaml.load(
-                f,
-                Loader=yaml.CFullLoader if yaml.__with_libyaml__ else yaml.FullLoader
-            )
+        """
+        Loads the content of the tech files. Files are only parsed the first time they are loaded in the process, or
+        when they change. If a tech bundle is provided, the unchanged files are read from the bundle instead.
+        """
+        if self.tech_bundle_path and not self._tech_bundle_loaded:
+            if Path(self.tech_bundle_path).is_file():
+                n_loaded = read_tech_bundle(self.tech_bundle_path)
+                logging.info(f'Loaded {n_loaded} tech files from tech bundle {self.tech_bundle_path}')
+            else:
+                logging.warning(f'Tech bundle {self.tech_bundle_path} does not exist, parsing the tech files instead')
+            self._tech_bundle_loaded = True
+
+        layer_info = load_yaml_cached(self.layermap_path)
+        self.layer_map = layer_info['layer_map']
+        self.via_info = layer_info['via_info']
+
+        self.lsf_export_parameters = load_yaml_cached(self.lsf_export_path)
 
         if self.dataprep_parameters_filepath:
-            with open(self.dataprep_parameters_filepath, 'r') as f:
-                self.dataprep_parameters = yaml.load(
-                    f,
-                    Loader=yaml.CFullLoader if yaml.__with_libyaml__ else yaml.FullLoader
-                )
+            self.dataprep_parameters = load_yaml_cached(self.dataprep_parameters_filepath)
         else:
             self.dataprep_parameters = None
             logging.warning('Warning: dataprep_parameters_filepath not specified in tech config. '
                             'Dataprep and DRC lookup functions may not work.')
 
         if self.dataprep_routine_filepath:
-            with open(self.dataprep_routine_filepath, 'r') as f:
-                self.dataprep_routine_data = yaml.load(
-                    f,
-                    Loader=yaml.CFullLoader if yaml.__with_libyaml__ else yaml.FullLoader
-                )
+            self.dataprep_routine_data = load_yaml_cached(self.dataprep_routine_filepath)
             self.global_dataprep_size_amount = self.dataprep_routine_data['GlobalDataprepSizeAmount']
             self.global_grid_size = self.dataprep_routine_data['GlobalGridSize']
             self.global_rough_grid_size = self.dataprep_routine_data['GlobalRoughGridSize']
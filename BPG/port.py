@@ -9,7 +9,8 @@ if TYPE_CHECKING:
 
 
 class PhotonicPort(Transformable2D):
-    # TODO:  __slots__ =
+    __slots__ = ('_name', '_layer', '_used', '_orientation', '_width_unit', 'info')
+
     def __init__(self,
                  name: str,
                  center: "coord_type",
@@ -51,7 +52,7 @@ class PhotonicPort(Transformable2D):
             A dictionary that can contain additional information that should be stored / associated with a PhotonicPort
 
         """
-        # Set up _resolution, _mod_angle, _center_unit, _orient, _is_cardinal
+        # Set up _resolution, _mod_angle, _x_unit, _y_unit, _orient, _force_cardinal
         Transformable2D.__init__(self,
                                  center=center,
                                  resolution=resolution,
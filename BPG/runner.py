@@ -0,0 +1,103 @@
+"""
+This module runs the standard generation flow of a spec file: content generation followed by the requested outputs.
+It is shared by the bpg command line, the generation server and the batch runner.
+"""
+import time
+import logging
+
+import BPG
+
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, Type
+
+if TYPE_CHECKING:
+    from BPG.layout_manager import PhotonicLayoutManager
+
+# Outputs that can be requested from a generation, in the order they are produced
+OUTPUT_STAGES = ['gds', 'flat_gds', 'lsf', 'dataprep']
+
+
+def check_outputs(outputs: Iterable[str]) -> None:
+    """ Raises a ValueError if any of the requested outputs is not supported """
+    unsupported = [output for output in outputs if output not in OUTPUT_STAGES]
+    if unsupported:
+        raise ValueError(f'Unsupported outputs {unsupported}. Supported outputs are {OUTPUT_STAGES}')
+
+
+def run_spec(spec_file: str,
+             outputs: Iterable[str] = (),
+             overrides: Optional[Dict[str, Any]] = None,
+             layout_manager_cls: Optional[Type["PhotonicLayoutManager"]] = None,
+             ) -> Dict[str, Any]:
+    """
+    Generates the content of a spec file and exports the requested outputs.
+
+    Parameters
+    ----------
+    spec_file : str
+        Path to the spec file to generate
+    outputs : Iterable[str]
+        The outputs to produce, among OUTPUT_STAGES. The content is always generated
+    overrides : Optional[Dict[str, Any]]
+        Keys of the spec file to override, passed to the PhotonicLayoutManager
+    layout_manager_cls : Optional[Type[PhotonicLayoutManager]]
+        The layout manager class to run the flow with. Defaults to PhotonicLayoutManager
+
+    Returns
+    -------
+    result : Dict[str, Any]
+        'spec' : the spec file,
+        'outputs' : the path of each produced output,
+        'timing' : the duration of each stage and the 'total' duration in seconds
+    """
+    outputs = set(outputs)
+    check_outputs(outputs)
+    if layout_manager_cls is None:
+        layout_manager_cls = BPG.PhotonicLayoutManager
+
+    timing = {}
+    start = time.time()
+
+    stage_start = time.time()
+    plm = layout_manager_cls(spec_file=spec_file, **(overrides or {}))
+    timing['init'] = time.time() - stage_start
+
+    stage_start = time.time()
+    plm.generate_content()
+    timing['content'] = time.time() - stage_start
+
+    produced = {}
+    if 'gds' in outputs:
+        stage_start = time.time()
+        plm.generate_gds()
+        timing['gds'] = time.time() - stage_start
+        produced['gds'] = plm.gds_path + '.gds'
+
+    # Flat gds generation, lsf, or dataprep requires generation of flat content list
+    if outputs & {'flat_gds', 'lsf', 'dataprep'}:
+        stage_start = time.time()
+        plm.generate_flat_content()
+        timing['flat_content'] = time.time() - stage_start
+
+    if 'flat_gds' in outputs:
+        stage_start = time.time()
+        plm.generate_flat_gds()
+        timing['flat_gds'] = time.time() - stage_start
+        produced['flat_gds'] = plm.gds_path + '_flat.gds'
+
+    if 'lsf' in outputs:
+        stage_start = time.time()
+        plm.generate_lsf()
+        timing['lsf'] = time.time() - stage_start
+        produced['lsf'] = str(plm.scripts_dir)
+
+    if 'dataprep' in outputs:
+        stage_start = time.time()
+        plm.dataprep()
+        plm.generate_dataprep_gds()
+        timing['dataprep'] = time.time() - stage_start
+        produced['dataprep'] = plm.gds_path + '_dataprep.gds'
+
+    timing['total'] = time.time() - start
+    logging.info(f'Generated {spec_file} in {timing["total"]:.4g}s')
+
+    return dict(spec=str(spec_file), outputs=produced, timing=timing)
@@ -0,0 +1,216 @@
+"""
+This module implements a long-lived generation server, which keeps BPG warm between generations: BAG and BPG are
+imported once, the tech files stay in the parsed configuration cache, and the template database, with its routing grid
+and all of the masters created so far, is reused by the requests that share the same tech and grid configuration.
+Each request names its cells in its own naming scope, so that the output of a request does not depend on the requests
+run before it.
+
+The server listens on a local unix socket. Each request is a single line holding a JSON object, and each response is a
+single line holding a JSON object. A connection can send any number of requests.
+
+Generation request::
+
+    {"spec": "specs/my_spec.yaml", "overrides": {"layout_params": {...}}, "outputs": ["gds", "dataprep"]}
+
+The response holds the "status" ("ok" or "error"), and either the "outputs" and "timing" of the run (see
+BPG.runner.run_spec), or the "error" message and its "traceback". Requests can also be commands:
+{"command": "ping"}, {"command": "stats"} and {"command": "shutdown"}.
+
+Requests are handled one at a time, as BPG.run_settings is global. The run settings are restored after each request so
+that the settings of one spec file never leak into the next.
+"""
+import os
+import json
+import time
+import socket
+import logging
+import traceback
+import socketserver
+
+from copy import deepcopy
+
+import BPG
+from BPG.runner import run_spec
+
+from typing import Any, Dict, Tuple
+
+# Default location of the server socket
+DEFAULT_SOCKET_PATH = 'bpg_server.sock'
+
+
+def _template_db_key() -> Tuple:
+    """
+    Returns the settings that a template database depends on. Requests with the same key share a template database,
+    and therefore its routing grid and masters.
+    """
+    settings = BPG.run_settings
+    return (json.dumps(settings.get('routing_grid', None), sort_keys=True, default=str),
+            str(settings.get('tech_config_path', None)),
+            str(settings.get('photonic_tech_config_path', None)),
+            json.dumps(settings['bpg_config'], sort_keys=True, default=str),
+            str(settings['impl_lib']))
+
+
+class GenerationServer(socketserver.UnixStreamServer):
+    """
+    Unix socket server running generation requests in a warm BPG environment.
+
+    Parameters
+    ----------
+    socket_path : str
+        Path of the unix socket to listen on
+    reuse_masters : bool
+        True to share the template database and its masters between requests with the same configuration.
+        False to create a new template database for every request.
+    """
+    def __init__(self,
+                 socket_path: str = DEFAULT_SOCKET_PATH,
+                 reuse_masters: bool = True,
+                 ) -> None:
+        self.socket_path = str(socket_path)
+        self.reuse_masters = reuse_masters
+        # Template databases kept warm between requests, keyed by their configuration
+        self.template_dbs: Dict[Tuple, Any] = {}
+        self.n_requests = 0
+        self.n_errors = 0
+        self.start_time = time.time()
+        self._shutdown_requested = False
+
+        # Remove the socket of a server that did not exit cleanly
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        socketserver.UnixStreamServer.__init__(self, self.socket_path, GenerationRequestHandler)
+
+        # Warm up the imports of the layout manager and of its dependencies
+        self.layout_manager_cls = self._warm_layout_manager_cls()
+        logging.info(f'BPG generation server listening on {self.socket_path}')
+
+    def _warm_layout_manager_cls(self) -> type:
+        """ Returns a PhotonicLayoutManager subclass reusing the template databases kept by this server """
+        server = self
+
+        class WarmPhotonicLayoutManager(BPG.PhotonicLayoutManager):
+            def init_plugins(self) -> None:
+                key = _template_db_key()
+                template_db = server.template_dbs.get(key, None) if server.reuse_masters else None
+                if template_db is None:
+                    BPG.PhotonicLayoutManager.init_plugins(self)
+                else:
+                    self._reuse(template_db)
+                if server.reuse_masters:
+                    server.template_dbs[key] = self.template_plugin
+                    # Only the masters are shared: the cells of each request are named as in a cold run
+                    self.template_plugin.start_naming_scope()
+
+            def _reuse(self, template_db) -> None:
+                """ Reuses a warm template database, attaching it to this layout manager and its tech info """
+                self.impl_lib = BPG.run_settings['impl_lib']
+                self.routing_grid = template_db.grid
+                self.template_plugin = template_db
+                self.template_plugin._prj = self
+                self.template_plugin.photonic_tech_info = self.photonic_tech_info
+                self.gds_backend = BPG.run_settings['bpg_config']['bpg_gds_backend']
+                # The geometry statistics only report the current request
+                template_db.master_stats = []
+                template_db.dataprep_stats = []
+
+        return WarmPhotonicLayoutManager
+
+    def handle_request_dict(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Runs a single request and returns its response.
+
+        Parameters
+        ----------
+        request : Dict[str, Any]
+            The decoded request
+
+        Returns
+        -------
+        response : Dict[str, Any]
+            The response to encode and send back
+        """
+        command = request.get('command', 'generate')
+        if command == 'ping':
+            return dict(status='ok')
+        if command == 'stats':
+            return dict(status='ok', requests=self.n_requests, errors=self.n_errors,
+                        template_dbs=len(self.template_dbs), uptime=time.time() - self.start_time)
+        if command == 'shutdown':
+            self._shutdown_requested = True
+            return dict(status='ok')
+        if command != 'generate':
+            return dict(status='error', error=f'Unknown command {command}')
+
+        self.n_requests += 1
+        saved_settings = deepcopy(BPG.run_settings.data)
+        try:
+            if 'spec' not in request:
+                raise ValueError('Generation requests must provide a spec file')
+            result = run_spec(spec_file=request['spec'],
+                              outputs=request.get('outputs', []),
+                              overrides=request.get('overrides', None),
+                              layout_manager_cls=self.layout_manager_cls)
+            return dict(status='ok', **result)
+        except Exception as e:
+            self.n_errors += 1
+            logging.error(f'Generation request {request} failed: {e}')
+            return dict(status='error', error=str(e), traceback=traceback.format_exc())
+        finally:
+            BPG.run_settings.data = saved_settings
+
+    def serve(self) -> None:
+        """ Handles requests until a shutdown command is received """
+        try:
+            while not self._shutdown_requested:
+                self.handle_request()
+        finally:
+            self.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+class GenerationRequestHandler(socketserver.StreamRequestHandler):
+    """ Reads the JSON requests of a connection line by line and answers each of them """
+    server: GenerationServer
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                response = dict(status='error', error=f'Invalid JSON request: {e}')
+            else:
+                response = self.server.handle_request_dict(request)
+            self.wfile.write((json.dumps(response, default=str) + '\n').encode())
+            self.wfile.flush()
+            if self.server._shutdown_requested:
+                break
+
+
+def send_request(request: Dict[str, Any],
+                 socket_path: str = DEFAULT_SOCKET_PATH,
+                 ) -> Dict[str, Any]:
+    """
+    Sends a request to a running generation server and waits for its response.
+
+    Parameters
+    ----------
+    request : Dict[str, Any]
+        The request to send
+    socket_path : str
+        Path of the unix socket the server listens on
+
+    Returns
+    -------
+    response : Dict[str, Any]
+        The response of the server
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        with sock.makefile('rwb') as stream:
+            stream.write((json.dumps(request) + '\n').encode())
+            stream.flush()
+            return json.loads(stream.readline())
@@ -0,0 +1,298 @@
+"""
+This module implements a spatial index of the shapes of a content list, so that generators, dataprep and the exporters
+can find the shapes of a layer in a region or near a point in logarithmic time rather than scanning the content list.
+
+A SpatialIndex keeps one R-tree per layer over the bounding boxes of the shapes. Each entry refers back to its shape
+with a (key, item, polygon) reference: the content list key, the index of the item in that list, and for polygon arrays
+the index of the polygon in the array (-1 for the other shapes)::
+
+    spatial_index = SpatialIndex.from_content_list(plm.content_list_flat[0])
+    for ref in spatial_index.intersection(('SI', 'phot'), (0, 0, 10, 10)):
+        shape = SpatialIndex.get_shape(plm.content_list_flat[0], ref)
+
+The index only stores the bounding boxes and references, so it can be saved next to the content list it was built from
+and loaded back without rebuilding it from the shapes.
+"""
+import json
+import numpy as np
+from pathlib import Path
+from rtree import index as rtree_index
+
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+if TYPE_CHECKING:
+    from BPG.content_list import ContentList
+    from BPG.template import PhotonicTemplateBase
+    from BPG.bpg_custom_types import lpp_type
+
+# Content list keys of the indexed shapes. Vias and pins are not indexed
+INDEXED_KEYS = ('rect_list', 'polygon_list', 'path_list', 'round_list', 'polygon_array_list')
+
+# Reference of an indexed shape: content list key, index of the item in the list, index of the polygon in a polygon
+# array or -1
+shape_ref_type = Tuple[str, int, int]
+
+
+def _array_extent(left: float, bottom: float, right: float, top: float, item: Dict[str, Any]) -> Tuple:
+    """ Extends the bounding box of the first copy of an arrayed shape to all of its copies """
+    dx = (item.get('arr_nx', 1) - 1) * item.get('arr_spx', 0)
+    dy = (item.get('arr_ny', 1) - 1) * item.get('arr_spy', 0)
+    return left + min(dx, 0), bottom + min(dy, 0), right + max(dx, 0), top + max(dy, 0)
+
+
+def _points_bbox(points: Any) -> Tuple:
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    (left, bottom), (right, top) = points.min(axis=0), points.max(axis=0)
+    return float(left), float(bottom), float(right), float(top)
+
+
+def shape_bbox(key: str,
+               item: Dict[str, Any],
+               ) -> Tuple[float, float, float, float]:
+    """
+    Returns the (left, bottom, right, top) bounding box of a content list item. Arrayed rectangles and rounds are
+    bounded as a whole, and rounds by their full outer circle.
+
+    Parameters
+    ----------
+    key : str
+        The content list key of the item, one of INDEXED_KEYS except polygon_array_list
+    item : Dict[str, Any]
+        The content list item
+
+    Returns
+    -------
+    bbox : Tuple[float, float, float, float]
+        The bounding box of the item, in layout units
+    """
+    if key == 'rect_list':
+        (left, bottom), (right, top) = item['bbox']
+        return _array_extent(min(left, right), min(bottom, top), max(left, right), max(bottom, top), item)
+    elif key == 'polygon_list':
+        return _points_bbox(item['points'])
+    elif key == 'path_list':
+        return _points_bbox(item['polygon_points'])
+    elif key == 'round_list':
+        (x, y), rout = item['center'], item['rout']
+        return _array_extent(x - rout, y - rout, x + rout, y + rout, item)
+    raise ValueError(f'Cannot compute the bounding box of {key} items')
+
+
+def polygon_array_bboxes(polygon_array: Dict[str, Any],
+                         ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the bounding boxes of the polygons of a polygon array content item, computed in one pass over its vertices.
+
+    Returns
+    -------
+    bboxes : np.ndarray
+        The (n, 4) left, bottom, right, top bounding boxes of the polygons that have vertices
+    polygon_indices : np.ndarray
+        The index in the polygon array of the polygon of each bounding box
+    """
+    vertices = np.asarray(polygon_array['vertices'], dtype=float).reshape(-1, 2)
+    offsets = np.asarray(polygon_array['offsets'], dtype=np.int64)
+    polygon_indices = np.flatnonzero(np.diff(offsets) > 0)
+    if len(polygon_indices) == 0:
+        return np.empty((0, 4)), polygon_indices
+    starts = offsets[polygon_indices]
+    bboxes = np.column_stack([np.minimum.reduceat(vertices, starts, axis=0),
+                              np.maximum.reduceat(vertices, starts, axis=0)])
+    return bboxes, polygon_indices
+
+
+class SpatialIndex:
+    """
+    Per layer R-tree index of the bounding boxes of the shapes of a content list.
+
+    Parameters
+    ----------
+    layers : Optional[Dict[lpp_type, Tuple[np.ndarray, np.ndarray]]]
+        Layer keyed (bboxes, refs) of the indexed shapes: the (n, 4) left, bottom, right, top bounding boxes, and the
+        (n, 3) references, the key being stored as its index in INDEXED_KEYS
+    """
+    def __init__(self,
+                 layers: Optional[Dict["lpp_type", Tuple[np.ndarray, np.ndarray]]] = None,
+                 ) -> None:
+        self._bboxes: Dict["lpp_type", np.ndarray] = {}
+        self._refs: Dict["lpp_type", np.ndarray] = {}
+        self._trees: Dict["lpp_type", rtree_index.Index] = {}
+        for layer, (bboxes, refs) in (layers or {}).items():
+            bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+            if len(bboxes) == 0:
+                continue
+            layer = (layer[0], layer[1])
+            self._bboxes[layer] = bboxes
+            self._refs[layer] = np.asarray(refs, dtype=np.int64).reshape(-1, 3)
+            # Bulk loading from a stream packs the tree, which is much faster than inserting the entries one by one
+            self._trees[layer] = rtree_index.Index((entry_id, bbox, None)
+                                                   for entry_id, bbox in enumerate(bboxes.tolist()))
+
+    @classmethod
+    def from_content_list(cls,
+                          content_list: "ContentList",
+                          ) -> "SpatialIndex":
+        """ Builds the index of the shapes of a content list. Does not look at instances """
+        bboxes: Dict["lpp_type", List[np.ndarray]] = {}
+        refs: Dict["lpp_type", List[np.ndarray]] = {}
+        for code, key in enumerate(INDEXED_KEYS):
+            if key == 'polygon_array_list':
+                for item_index, polygon_array in enumerate(content_list[key]):
+                    layer = tuple(polygon_array['layer'])
+                    array_bboxes, polygon_indices = polygon_array_bboxes(polygon_array)
+                    bboxes.setdefault(layer, []).append(array_bboxes)
+                    refs.setdefault(layer, []).append(
+                        np.column_stack([np.full(len(polygon_indices), code), np.full(len(polygon_indices), item_index),
+                                         polygon_indices])
+                    )
+                continue
+
+            # Gather the other shapes in lists, and convert each layer to arrays once
+            layer_bboxes: Dict["lpp_type", List[Tuple]] = {}
+            layer_refs: Dict["lpp_type", List[Tuple]] = {}
+            for item_index, item in enumerate(content_list[key]):
+                layer = tuple(item['layer'])
+                layer_bboxes.setdefault(layer, []).append(shape_bbox(key, item))
+                layer_refs.setdefault(layer, []).append((code, item_index, -1))
+            for layer in layer_bboxes:
+                bboxes.setdefault(layer, []).append(np.array(layer_bboxes[layer], dtype=float))
+                refs.setdefault(layer, []).append(np.array(layer_refs[layer], dtype=np.int64))
+
+        return cls({layer: (np.concatenate(bboxes[layer], axis=0), np.concatenate(refs[layer], axis=0))
+                    for layer in bboxes})
+
+    @classmethod
+    def from_master(cls,
+                    master: "PhotonicTemplateBase",
+                    ) -> "SpatialIndex":
+        """ Builds the index of the shapes drawn in a finalized master, in the coordinates of the master """
+        return cls.from_content_list(master.get_content(lib_name='', rename_fun=lambda name: name))
+
+    @property
+    def layers(self) -> List["lpp_type"]:
+        """ The layers that have indexed shapes """
+        return list(self._trees)
+
+    def __len__(self) -> int:
+        return sum(len(bboxes) for bboxes in self._bboxes.values())
+
+    def _to_refs(self, layer: "lpp_type", entry_ids: Iterable[int]) -> List[shape_ref_type]:
+        refs = self._refs[layer]
+        return [(INDEXED_KEYS[code], item_index, polygon_index)
+                for code, item_index, polygon_index in refs[sorted(entry_ids)].tolist()]
+
+    def intersection(self,
+                     layer: "lpp_type",
+                     bbox: Sequence[float],
+                     ) -> List[shape_ref_type]:
+        """
+        Returns the references of the shapes of a layer whose bounding box intersects a region.
+
+        Parameters
+        ----------
+        layer : Tuple[str, str]
+            The layer purpose pair to query
+        bbox : Sequence[float]
+            The (left, bottom, right, top) region, in layout units
+
+        Returns
+        -------
+        refs : List[Tuple[str, int, int]]
+            The (key, item, polygon) reference of each shape, in the order of the content list
+        """
+        layer = (layer[0], layer[1])
+        if layer not in self._trees:
+            return []
+        return self._to_refs(layer, self._trees[layer].intersection(tuple(bbox)))
+
+    def count(self,
+              layer: "lpp_type",
+              bbox: Sequence[float],
+              ) -> int:
+        """ Returns the number of shapes of a layer whose bounding box intersects the (left, bottom, right, top) region """
+        layer = (layer[0], layer[1])
+        if layer not in self._trees:
+            return 0
+        return self._trees[layer].count(tuple(bbox))
+
+    def nearest(self,
+                layer: "lpp_type",
+                location: Sequence[float],
+                num_results: int = 1,
+                ) -> List[shape_ref_type]:
+        """
+        Returns the references of the shapes of a layer whose bounding box is the nearest to a point or region.
+
+        Parameters
+        ----------
+        layer : Tuple[str, str]
+            The layer purpose pair to query
+        location : Sequence[float]
+            The (x, y) point or (left, bottom, right, top) region, in layout units
+        num_results : int
+            The number of shapes to return
+
+        Returns
+        -------
+        refs : List[Tuple[str, int, int]]
+            The (key, item, polygon) reference of each shape, nearest first
+        """
+        layer = (layer[0], layer[1])
+        if layer not in self._trees:
+            return []
+        if len(location) == 2:
+            location = (location[0], location[1], location[0], location[1])
+        entry_ids = list(self._trees[layer].nearest(tuple(location), num_results))[:num_results]
+        refs = self._refs[layer][entry_ids].tolist()
+        return [(INDEXED_KEYS[code], item_index, polygon_index) for code, item_index, polygon_index in refs]
+
+    @staticmethod
+    def get_shape(content_list: "ContentList",
+                  ref: shape_ref_type,
+                  ) -> Union[Dict[str, Any], np.ndarray]:
+        """
+        Returns the shape of a content list that a reference points to: the content list item, or the (n, 2) vertices
+        of the polygon for polygon arrays.
+        """
+        key, item_index, polygon_index = ref
+        item = content_list[key][item_index]
+        if key != 'polygon_array_list':
+            return item
+        vertices = np.asarray(item['vertices'], dtype=float).reshape(-1, 2)
+        offsets = item['offsets']
+        return vertices[offsets[polygon_index]:offsets[polygon_index + 1]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ Returns a JSON serializable representation of the index """
+        return dict(layers=[dict(layer=list(layer), bboxes=self._bboxes[layer].tolist(),
+                                 refs=self._refs[layer].tolist())
+                            for layer in self._trees])
+
+    @classmethod
+    def from_dict(cls, index_dict: Dict[str, Any]) -> "SpatialIndex":
+        """ Rebuilds an index from the representation returned by to_dict """
+        return cls(cls._layers_dict(index_dict))
+
+    def save(self, filepath: Union[str, Path]) -> None:
+        """ Writes the index to a JSON file """
+        with open(filepath, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, filepath: Union[str, Path]) -> "SpatialIndex":
+        """ Reads an index written by save """
+        with open(filepath, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The R-trees are rebuilt from the bounding boxes rather than pickled
+        return self.to_dict()
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(self._layers_dict(state))
+
+    @staticmethod
+    def _layers_dict(index_dict: Dict[str, Any]) -> Dict["lpp_type", Tuple[np.ndarray, np.ndarray]]:
+        return {tuple(layer_dict['layer']): (np.array(layer_dict['bboxes'], dtype=float),
+                                             np.array(layer_dict['refs'], dtype=np.int64))
+                for layer_dict in index_dict['layers']}
@@ -15,10 +15,11 @@ from BPG.photonic_core import PhotonicBagLayout
 # Photonic object imports
 from BPG.port import PhotonicPort
 from BPG.objects import PhotonicRect, PhotonicPolygon, PhotonicAdvancedPolygon, PhotonicInstance, PhotonicRound, \
-    PhotonicPath
+    PhotonicPath, _round_outline
+from BPG.content_list import polygon_array_from_pointlists
 
 # Typing imports
-from typing import TYPE_CHECKING, Dict, Any, List, Set, Optional, Tuple, Iterable, TypeVar
+from typing import TYPE_CHECKING, Dict, Any, List, Set, Optional, Tuple, Iterable, TypeVar, Union
 from BPG.bpg_custom_types import *
 
 if TYPE_CHECKING:
@@ -252,6 +253,202 @@ class PhotonicTemplateBase(TemplateBase, metaclass=abc.ABCMeta):
         self._layout.add_path(new_path)
         return new_path
 
+    def add_paths(self,
+                  layer: layer_or_lpp_type,
+                  widths: Union[dim_type, List[dim_type]],
+                  points_list: List[List[coord_type]],
+                  resolution: Optional[float] = None,
+                  unit_mode: bool = False,
+                  ) -> List[PhotonicPath]:
+        """
+        Create many PhotonicPath objects on the same layer at once and add them to the db. The paths are polygonized
+        in one vectorized pass, which is much faster than calling add_path for each path.
+
+        Parameters
+        ----------
+        layer : layer_or_lpp_type
+            the layer name, or a tuple of layer name and purpose name.
+        widths : Union[dim_type, List[dim_type]]
+            width of every path, or list of the widths of each path.
+        points_list : List[List[coord_type]]
+            list of the path points of each path.
+        resolution : Optional[float]
+            the layout grid resolution. Defaults to the resolution of the grid.
+        unit_mode : bool
+            True if widths and points are given as resolution units instead of layout units.
+
+        Returns
+        -------
+        paths : List[PhotonicPath]
+            The created paths, in the order of points_list
+        """
+        if resolution is None:
+            resolution = self.grid.resolution
+        new_paths = PhotonicPath.create_paths(layer=layer,
+                                              widths=widths,
+                                              points_list=points_list,
+                                              resolution=resolution,
+                                              unit_mode=unit_mode)
+        for new_path in new_paths:
+            self._layout.add_path(new_path)
+        return new_paths
+
+    def add_rects(self,
+                  layer: layer_or_lpp_type,
+                  bboxes: np.ndarray,
+                  unit_mode: bool = False,
+                  ) -> int:
+        """
+        Adds many rectangles on the same layer at once. The rectangles are snapped to the grid like with add_rect, and
+        stored compactly as a single polygon array that goes through finalize, flattening and export without being
+        expanded into per-shape objects. Unlike add_rect, the rectangles are not recorded as used routing tracks.
+
+        Parameters
+        ----------
+        layer : Union[str, Tuple[str, str]]
+            the layer name, or the (layer, purpose) pair.
+        bboxes : np.ndarray
+            (N, 4) array of the (left, bottom, right, top) coordinates of each rectangle.
+        unit_mode : bool
+            True if the coordinates are given in resolution units.
+
+        Returns
+        -------
+        num_rects : int
+            the number of added rectangles. Rectangles with zero width or height are skipped.
+        """
+        res = self.grid.resolution
+        bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+        if not unit_mode:
+            bboxes = bboxes / res
+        bboxes = np.round(bboxes)
+        left = np.minimum(bboxes[:, 0], bboxes[:, 2])
+        right = np.maximum(bboxes[:, 0], bboxes[:, 2])
+        bottom = np.minimum(bboxes[:, 1], bboxes[:, 3])
+        top = np.maximum(bboxes[:, 1], bboxes[:, 3])
+
+        physical = np.logical_and(right > left, top > bottom)
+        if not np.all(physical):
+            logging.warning(f'{np.count_nonzero(~physical)} rectangles with non-physical bounding boxes on layer '
+                            f'{layer} are skipped')
+        left, bottom, right, top = left[physical], bottom[physical], right[physical], top[physical]
+
+        vertices = np.stack([left, bottom, left, top, right, top, right, bottom], axis=1).reshape(-1, 2) * res
+        self._layout.add_polygon_array(layer=self._lpp(layer),
+                                       vertices=vertices,
+                                       offsets=np.arange(0, 4 * len(left) + 1, 4))
+        return len(left)
+
+    def add_polygons(self,
+                     layer: layer_or_lpp_type,
+                     points: Union[np.ndarray, List[List[coord_type]]],
+                     offsets: Optional[np.ndarray] = None,
+                     unit_mode: bool = False,
+                     ) -> int:
+        """
+        Adds many polygons on the same layer at once, stored compactly as a single polygon array that goes through
+        finalize, flattening and export without being expanded into per-shape objects.
+
+        Parameters
+        ----------
+        layer : Union[str, Tuple[str, str]]
+            the layer name, or the (layer, purpose) pair.
+        points : Union[np.ndarray, List[List[coord_type]]]
+            the (N, 2) vertices of all of the polygons back to back if offsets is given, otherwise the list of the
+            points of each polygon.
+        offsets : Optional[np.ndarray]
+            the (n_polygons + 1) offsets of the polygons in points: polygon i is points[offsets[i]:offsets[i + 1]].
+        unit_mode : bool
+            True if the points are given in resolution units.
+
+        Returns
+        -------
+        num_polygons : int
+            the number of added polygons.
+        """
+        if offsets is None:
+            polygon_array = polygon_array_from_pointlists(self._lpp(layer), points)
+            vertices, offsets = polygon_array['vertices'], polygon_array['offsets']
+        else:
+            vertices = np.asarray(points, dtype=float).reshape(-1, 2)
+            offsets = np.asarray(offsets, dtype=np.int64)
+            if len(offsets) == 0 or offsets[0] != 0 or offsets[-1] != len(vertices) or np.any(np.diff(offsets) < 0):
+                raise ValueError(f'add_polygons: offsets must increase from 0 to the number of points {len(vertices)}')
+        if unit_mode:
+            vertices = vertices * self.grid.resolution
+
+        self._layout.add_polygon_array(layer=self._lpp(layer), vertices=vertices, offsets=offsets)
+        return len(offsets) - 1
+
+    def add_rounds(self,
+                   layer: layer_or_lpp_type,
+                   centers: np.ndarray,
+                   rout: Union[dim_type, np.ndarray],
+                   rin: Union[dim_type, np.ndarray] = 0,
+                   theta0: dim_type = 0,
+                   theta1: dim_type = 360,
+                   unit_mode: bool = False,
+                   ) -> int:
+        """
+        Adds many rounds on the same layer at once. The rounds are snapped to the grid and polygonized like with
+        add_round, each set of radii being polygonized once, and stored compactly as a single polygon array that goes
+        through finalize, flattening and export without being expanded into per-shape objects.
+
+        Parameters
+        ----------
+        layer : Union[str, Tuple[str, str]]
+            the layer name, or the (layer, purpose) pair.
+        centers : np.ndarray
+            (N, 2) array of the center of each round.
+        rout : Union[dim_type, np.ndarray]
+            outer radius of every round, or array of the outer radius of each round.
+        rin : Union[dim_type, np.ndarray]
+            inner radius of every round, or array of the inner radius of each round.
+        theta0 : dim_type
+            start angle of the rounds, in degrees.
+        theta1 : dim_type
+            stop angle of the rounds, in degrees.
+        unit_mode : bool
+            True if the centers and radii are given in resolution units.
+
+        Returns
+        -------
+        num_rounds : int
+            the number of added rounds.
+        """
+        res = self.grid.resolution
+        scale = 1 if unit_mode else res
+        centers_unit = np.round(np.asarray(centers, dtype=float).reshape(-1, 2) / scale)
+        num_rounds = len(centers_unit)
+        radii_unit = np.round(np.column_stack([np.broadcast_to(np.asarray(rout, dtype=float), (num_rounds,)),
+                                               np.broadcast_to(np.asarray(rin, dtype=float), (num_rounds,))]) / scale)
+
+        # Polygonize each set of radii once, and translate its outline to the center of each of its rounds
+        radii_sets, radii_index = np.unique(radii_unit, axis=0, return_inverse=True)
+        radii_index = radii_index.reshape(-1)
+        outlines = [_round_outline(rout_unit * res, rin_unit * res, theta0, theta1, res)
+                    for rout_unit, rin_unit in radii_sets]
+        lengths = np.array([len(outline) for outline in outlines], dtype=np.int64)[radii_index]
+        offsets = np.zeros(num_rounds + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        vertices = np.empty((offsets[-1], 2), dtype=float)
+        for set_index, outline in enumerate(outlines):
+            members = np.flatnonzero(radii_index == set_index)
+            rows = offsets[members][:, np.newaxis] + np.arange(len(outline))
+            vertices[rows] = outline + centers_unit[members][:, np.newaxis, :] * res
+
+        self._layout.add_polygon_array(layer=self._lpp(layer), vertices=vertices, offsets=offsets)
+        return num_rounds
+
+    @staticmethod
+    def _lpp(layer: layer_or_lpp_type) -> Tuple[str, str]:
+        """ Returns the (layer, purpose) pair of a layer, defaulting to the 'phot' purpose """
+        layer = bag.io.fix_string(layer)
+        if isinstance(layer, str):
+            return layer, 'phot'
+        return layer[0], layer[1]
+
     def finalize(self):
         """ Call the old finalize method, but then also grab the bounding box from the layout content """
         TemplateBase.finalize(self)
@@ -966,7 +1163,7 @@ class PhotonicTemplateBase(TemplateBase, metaclass=abc.ABCMeta):
         Parameters
         ----------
         angle : float
-            angle in radians fo the rotation to be performed
+            angle in radians fo the rotation to be performed, rounded to the angle_tolerance of the template database
         kwargs : dict
             a dictionary of new parameter values
 
@@ -975,6 +1172,15 @@ class PhotonicTemplateBase(TemplateBase, metaclass=abc.ABCMeta):
         master : PhotonicTemplateBase
             Newly created master from the given parameters
         """
+        # Round the angle so that rotations that only differ by float noise share a master, and reuse the master if
+        # it was already rotated to this angle
+        temp_db = self.template_db
+        angle = temp_db.canonical_angle(angle)
+        if not kwargs:
+            master = temp_db.find_rotated_master(self, angle)
+            if master is not None:
+                return master
+
         # Create a new parameter dictionary based on the provided changes
         new_params = copy.deepcopy(self.params)
         for key, val in kwargs.items():
@@ -983,10 +1189,13 @@ class PhotonicTemplateBase(TemplateBase, metaclass=abc.ABCMeta):
 
         # Move to populate_params? This deletes the old angle and sets it to the provided value via hidden params
         new_params.pop('_angle', None)
-        return TemplateBase.new_template(self,
-                                         params=new_params,
-                                         temp_cls=self.__class__,
-                                         hidden_params={'_angle': angle},
-                                         **kwargs
-                                         )
+        master = TemplateBase.new_template(self,
+                                           params=new_params,
+                                           temp_cls=self.__class__,
+                                           hidden_params={'_angle': angle},
+                                           **kwargs
+                                           )
+        if not kwargs:
+            temp_db.register_rotated_master(self, angle, master)
+        return master
 
@@ -0,0 +1,383 @@
+"""
+This module provides lightweight tracing of the generation pipeline.
+
+Spans are opened with the span context manager or the traced decorator, and can be nested. Each span records its
+duration and a set of attributes, such as the layer, operation, shape count or cell name it works on::
+
+    with span('dataprep_operation', layer=lpp, operation='rad') as op_span:
+        ...
+        op_span.set(shape_count=len(shapes))
+
+The tracer is disabled by default, in which case spans cost a single attribute lookup. The layout manager enables it for
+the top level stages of the flow unless perf_history is turned off in bpg_config, so attributes that are costly to
+compute should only be computed when tracer.recording is True, i.e. when the innermost open span is recorded and not
+merely nested deeper than the maximum depth. When enabled with a trace path, the trace is written in the Chrome trace
+event format (viewable in chrome://tracing or https://ui.perfetto.dev) each time a top level span ends, along with a
+summary table of the total and self time spent in each span name.
+
+The tracer can also account for memory. Each span then records the resident set size (RSS) of the process when it ends,
+its change over the span, and how much the span raised the peak RSS of the process. These are written to memory.log
+next to timing.log. In debug mode, tracemalloc also records the peak python allocations of each span, and the top
+allocating source lines of each top level span.
+
+The depth of the recorded spans can be limited, so that only the stages of the flow are measured, and listeners can be
+registered to receive each top level span when it ends, as BPG.perf_history does to keep the history of the runs.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import functools
+import tracemalloc
+
+from pathlib import Path
+
+from typing import Any, Callable, Dict, List, Optional, Union
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Logger of the memory report, written to memory.log by BPG.logger.setup_logger
+memory_logger = logging.getLogger('memory')
+
+MB = 1024 * 1024
+
+
+class Span:
+    """ An open span, closed when its context exits """
+    __slots__ = ('tracer', 'name', 'attrs', 'start', 'child_time', 'rss_start', 'peak_rss_start', 'py_start',
+                 'py_peak', 'snapshot')
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.start = 0.0
+        self.child_time = 0.0
+        self.rss_start = None
+        self.peak_rss_start = None
+        self.py_start = 0
+        self.py_peak = 0
+        self.snapshot = None
+
+    def set(self, **attrs: Any) -> None:
+        """ Adds attributes to the span, for values that are only known once its work is done """
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        if self.tracer.memory:
+            self.tracer._open_memory(self)
+        self.tracer._stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.tracer._close(self, time.perf_counter(), failed=exc_type is not None)
+
+
+class _NullSpan:
+    """ Span returned while tracing is disabled, doing nothing """
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _SkippedSpan(_NullSpan):
+    """ Span nested deeper than the maximum depth of the tracer, not recorded and hiding its annotations """
+    __slots__ = ('tracer',)
+
+    def __init__(self, tracer: "Tracer") -> None:
+        self.tracer = tracer
+
+    def __enter__(self) -> "_SkippedSpan":
+        self.tracer._skipped += 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.tracer._skipped -= 1
+
+
+class Tracer:
+    """
+    Records the spans of the process into Chrome trace events, and aggregates the time spent in each span name.
+    """
+    def __init__(self) -> None:
+        self.enabled = False
+        self.memory = False
+        self.memory_debug = False
+        # Number of top allocating source lines reported for each top level span in memory debug mode
+        self.n_top_allocators = 10
+        self.trace_path: Optional[Path] = None
+        self.summary_path: Optional[Path] = None
+        self.events: List[Dict[str, Any]] = []
+        # Span name keyed [count, total time, self time, max time] in seconds
+        self.summary: Dict[str, List[float]] = {}
+        # Maximum nesting depth of the recorded spans, None for no limit
+        self.max_depth: Optional[int] = None
+        # Functions called with the name, duration in seconds and attributes of each top level span that ends
+        self.listeners: List[Callable[[str, float, Dict[str, Any]], None]] = []
+        self._stack: List[Span] = []
+        # Number of open spans skipped because they are deeper than max_depth
+        self._skipped = 0
+        self._origin = time.perf_counter()
+
+    def enable(self,
+               trace_path: Optional[Union[str, Path]] = None,
+               summary_path: Optional[Union[str, Path]] = None,
+               memory: bool = False,
+               memory_debug: bool = False,
+               max_depth: Optional[int] = None,
+               ) -> None:
+        """
+        Starts recording spans.
+
+        Parameters
+        ----------
+        trace_path : Optional[Union[str, Path]]
+            Path of the Chrome trace event JSON file, rewritten every time a top level span ends. None to not write it
+        summary_path : Optional[Union[str, Path]]
+            Path of the summary table, rewritten every time a top level span ends. None to not write it
+        memory : bool
+            True to record the RSS of the process in each span and write the memory report
+        memory_debug : bool
+            True to also trace python allocations with tracemalloc. This slows down the run significantly
+        max_depth : Optional[int]
+            Maximum nesting depth of the recorded spans, 1 to only record the top level spans. None for no limit
+        """
+        self.enabled = True
+        self.max_depth = max_depth
+        self.trace_path = Path(trace_path) if trace_path else None
+        self.summary_path = Path(summary_path) if summary_path else None
+        self.memory = memory or memory_debug
+        self.memory_debug = memory_debug
+        if memory_debug and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.memory:
+            memory_logger.info(f'{"RSS (MB)":>10} {"Delta (MB)":>12} {"Peak+ (MB)":>12} {"Py peak (MB)":>14} | Span')
+
+    def disable(self) -> None:
+        """ Stops recording spans. The spans recorded so far are kept """
+        if self.memory_debug and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.enabled = False
+        self.memory = False
+        self.memory_debug = False
+
+    def reset(self) -> None:
+        """ Forgets all of the recorded spans and removes the listeners """
+        self.events = []
+        self.summary = {}
+        self.listeners = []
+        self._stack = []
+        self._skipped = 0
+        self._origin = time.perf_counter()
+
+    def span(self, name: str, **attrs: Any) -> Union[Span, _NullSpan]:
+        """ Returns a context manager recording a span with the given name and attributes """
+        if not self.enabled:
+            return _NULL_SPAN
+        if self._skipped or (self.max_depth is not None and len(self._stack) >= self.max_depth):
+            return _SkippedSpan(self)
+        return Span(self, name, attrs)
+
+    def _open_memory(self, span: Span) -> None:
+        """ Records the memory state of the process when a span starts """
+        span.rss_start = current_rss()
+        span.peak_rss_start = peak_rss()
+        if self.memory_debug and tracemalloc.is_tracing():
+            if not self._stack and self.n_top_allocators:
+                span.snapshot = tracemalloc.take_snapshot()
+            span.py_start, py_peak = tracemalloc.get_traced_memory()
+            # The peak is reset for this span, so the parent keeps the peak it reached so far
+            if self._stack:
+                self._stack[-1].py_peak = max(self._stack[-1].py_peak, py_peak)
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+
+    def _close_memory(self, span: Span) -> None:
+        """ Adds the memory accounting of a span that ended to its attributes, and writes it to the memory report """
+        rss_end = current_rss()
+        peak_rss_end = peak_rss()
+        if rss_end is not None:
+            span.attrs['rss_mb'] = rss_end / MB
+            span.attrs['rss_delta_mb'] = (rss_end - span.rss_start) / MB
+        if peak_rss_end is not None:
+            span.attrs['peak_rss_growth_mb'] = (peak_rss_end - span.peak_rss_start) / MB
+
+        top_allocators = []
+        if self.memory_debug and tracemalloc.is_tracing():
+            # The peak of a span is the highest of the peaks reached between its children, and of their peaks
+            py_peak = max(tracemalloc.get_traced_memory()[1], span.py_peak)
+            span.attrs['py_peak_delta_mb'] = (py_peak - span.py_start) / MB
+            if self._stack:
+                self._stack[-1].py_peak = max(self._stack[-1].py_peak, py_peak)
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            if span.snapshot is not None:
+                # Leave out the allocations of the accounting itself
+                ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+                stats = tracemalloc.take_snapshot().filter_traces(ignored).compare_to(
+                    span.snapshot.filter_traces(ignored), 'lineno')
+                top_allocators = stats[:self.n_top_allocators]
+                span.snapshot = None
+
+        counts = ' '.join(f'{key}={value}' for key, value in span.attrs.items()
+                          if key not in ('rss_mb', 'rss_delta_mb', 'peak_rss_growth_mb', 'py_peak_delta_mb'))
+        memory_logger.info(f'{_format_mb(span.attrs.get("rss_mb")):>10} '
+                           f'{_format_mb(span.attrs.get("rss_delta_mb"), sign=True):>12} '
+                           f'{_format_mb(span.attrs.get("peak_rss_growth_mb")):>12} '
+                           f'{_format_mb(span.attrs.get("py_peak_delta_mb")):>14} | '
+                           f'{"  " * len(self._stack)}{span.name} {counts}')
+        for stat in top_allocators:
+            memory_logger.info(f'{"":>51} |   {stat.size_diff / MB:+.3f} MB in {stat.count_diff:+d} blocks at '
+                               f'{stat.traceback}')
+
+    @property
+    def recording(self) -> bool:
+        """ True if the innermost open span is recorded, False if there is none or it is deeper than the maximum depth """
+        return self.enabled and bool(self._stack) and not self._skipped
+
+    def annotate(self, **attrs: Any) -> None:
+        """ Adds attributes to the innermost open span, unless it is nested deeper than the maximum depth """
+        if self.recording:
+            self._stack[-1].attrs.update(attrs)
+
+    def _close(self, span: Span, end: float, failed: bool) -> None:
+        """ Records a span that ended """
+        duration = end - span.start
+        if self._stack and self._stack[-1] is span:
+            self._stack.pop()
+        if self._stack:
+            self._stack[-1].child_time += duration
+        if failed:
+            span.attrs['failed'] = True
+        if self.memory:
+            self._close_memory(span)
+
+        self.events.append(dict(name=span.name, ph='X', ts=(span.start - self._origin) * 1e6, dur=duration * 1e6,
+                                pid=os.getpid(), tid=threading.get_ident(),
+                                args={key: _json_value(value) for key, value in span.attrs.items()}))
+        stats = self.summary.setdefault(span.name, [0, 0.0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += duration
+        stats[2] += duration - span.child_time
+        stats[3] = max(stats[3], duration)
+
+        if not self._stack:
+            if self.trace_path:
+                self.write_trace(self.trace_path)
+            if self.summary_path:
+                self.write_summary(self.summary_path)
+            for listener in self.listeners:
+                listener(span.name, duration, span.attrs)
+
+    def write_trace(self, filepath: Union[str, Path]) -> None:
+        """ Writes the recorded spans as a Chrome trace event JSON file """
+        with open(filepath, 'w') as f:
+            json.dump(dict(traceEvents=self.events, displayTimeUnit='ms'), f)
+
+    def summary_table(self) -> str:
+        """ Returns the table of the count, total, self, mean and max time of each span name, by decreasing self time """
+        lines = [f'{"Span":<40} {"Count":>8} {"Total (s)":>12} {"Self (s)":>12} {"Mean (s)":>12} {"Max (s)":>12}']
+        for name, (count, total, self_time, max_time) in sorted(self.summary.items(), key=lambda item: -item[1][2]):
+            lines.append(f'{name:<40} {count:>8} {total:>12.6g} {self_time:>12.6g} {total / count:>12.6g} '
+                         f'{max_time:>12.6g}')
+        return '\n'.join(lines)
+
+    def write_summary(self, filepath: Union[str, Path]) -> None:
+        """ Writes the summary table to a text file """
+        with open(filepath, 'w') as f:
+            f.write(self.summary_table() + '\n')
+
+
+def current_rss() -> Optional[int]:
+    """ Returns the resident set size of the process in bytes, or None if it can not be measured on this platform """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss() -> Optional[int]:
+    """ Returns the peak resident set size of the process in bytes, or None if it can not be measured """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and in kilobytes elsewhere
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def _format_mb(value: Optional[float], sign: bool = False) -> str:
+    """ Formats a memory amount of the report, in MB """
+    if value is None:
+        return '-'
+    return f'{value:+.1f}' if sign else f'{value:.1f}'
+
+
+def _json_value(value: Any) -> Any:
+    """ Converts a span attribute to a value that can be written in JSON """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_json_value(item) for item in value]
+    return str(value)
+
+
+# Tracer shared by the whole process
+tracer = Tracer()
+
+
+def span(name: str, **attrs: Any) -> Union[Span, _NullSpan]:
+    """ Returns a context manager recording a span of the process tracer """
+    return tracer.span(name, **attrs)
+
+
+def annotate(**attrs: Any) -> None:
+    """ Adds attributes to the innermost open span of the process tracer """
+    tracer.annotate(**attrs)
+
+
+def traced(name: Optional[str] = None, **attrs: Any) -> Callable:
+    """
+    Decorator recording every call of a function in a span.
+
+    Parameters
+    ----------
+    name : Optional[str]
+        Name of the span. Defaults to the qualified name of the function
+    attrs : Any
+        Attributes of the span
+    """
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(span_name, **attrs):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
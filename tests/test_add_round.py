@@ -1,5 +1,6 @@
 import BPG
-from BPG.objects import PhotonicRound
+import numpy as np
+from BPG.objects import PhotonicRound, _round_outline
 
 
 class AddRound(BPG.PhotonicTemplateBase):
@@ -63,5 +64,28 @@ def test_add_round():
     plm.generate_dataprep_gds()
 
 
+def test_round_outline_array():
+    """ Arrayed rounds are the outline of a single round translated to each copy """
+    round_params = dict(rout=2, rin=0.5, theta0=30, theta1=250, resolution=0.001)
+    nx, ny, spx, spy = 3, 4, 10, 7
+    list_p, list_n = PhotonicRound.polygon_pointlist_export(center=(1, -2), nx=nx, ny=ny, spx=spx, spy=spy,
+                                                            **round_params)
+    assert len(list_p) == nx * ny and list_n == []
+    for i in range(nx):
+        for j in range(ny):
+            [points], _ = PhotonicRound.polygon_pointlist_export(center=(1 + i * spx, -2 + j * spy), **round_params)
+            np.testing.assert_allclose(list_p[i * ny + j], points, rtol=0, atol=1e-9)
+
+    # The cached outline is shared between calls, and cannot be modified by the callers
+    outline = _round_outline(2, 0.5, 30, 250, 0.001)
+    expected = outline.copy()
+    assert not outline.flags.writeable
+    for _ in range(3):
+        PhotonicRound.polygon_pointlist_export(center=(5, 5), nx=2, spx=1, **round_params)
+        assert _round_outline(2, 0.5, 30, 250, 0.001) is outline
+    np.testing.assert_array_equal(outline, expected)
+
+
 if __name__ == '__main__':
     test_add_round()
+    test_round_outline_array()
@@ -1,5 +1,6 @@
 import BPG
 from BPG.geometry import Transformable2D
+from BPG.objects import PhotonicPolygon
 import random
 import math
 import numpy as np
@@ -38,6 +39,24 @@ class AnyAngleTest(BPG.PhotonicTemplateBase):
         self.add_instance(master, loc=(0, 5), angle=math.pi/4, unit_mode=False)
 
 
+class AnyAngleReuseTest(BPG.PhotonicTemplateBase):
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            point1='Rectangle corner 1',
+            point2='Rectangle corner 2',
+        )
+
+    def draw_layout(self):
+        master = self.new_template(params=self.params, temp_cls=AnyAngleBase)
+        # Equal rotations, and rotations that only differ by float noise, share one master
+        inst1 = self.add_instance(master, loc=(0, 0), angle=math.pi / 5, unit_mode=False)
+        inst2 = self.add_instance(master, loc=(0, 5), angle=math.pi / 5, unit_mode=False)
+        inst3 = self.add_instance(master, loc=(0, 10), angle=math.pi / 5 + 1e-13, unit_mode=False)
+        assert inst1.master is inst2.master is inst3.master
+
+
 class AnyAngleNoHierarchyPortToPortLevel1Type1(BPG.PhotonicTemplateBase):
     """
     For test:  test_instance_port_to_port_at_angle_no_hierarchy
@@ -510,6 +529,30 @@ def test_rectangle_rotation():
     plm.generate_lsf()
 
 
+def test_polygon_rotate_all():
+    """ Rotating polygons in one batch gives the same points as rotating each of them """
+    points_list = [[(0, 0), (2, 0), (2, 1)], [(1, 1), (3, 1), (3, 4), (1, 4)], [(-1, 0.5), (0, 2.5), (-2, 1.5)]]
+    for orient in ['R0', 'MX', 'MY']:
+        for angle in [0, math.pi / 2, math.pi, 3 * math.pi / 2, 0.3]:
+            polygons = [PhotonicPolygon(resolution=0.001, layer='SI', points=points).transform(orient=orient)
+                        for points in points_list]
+            expected = [PhotonicPolygon(resolution=0.001, layer='SI', points=points).transform(orient=orient)
+                        for points in points_list]
+            PhotonicPolygon.rotate_all(polygons, angle=angle)
+            for polygon in expected:
+                polygon.rotate(angle=angle)
+            for polygon, expected_polygon in zip(polygons, expected):
+                assert np.array_equal(polygon.points, expected_polygon.points)
+
+
+def test_rotated_master_reuse():
+    spec_file = 'bpg_test_suite/specs/any_angle_specs.yaml'
+    plm = BPG.PhotonicLayoutManager(spec_file)
+    plm.generate_template(temp_cls=AnyAngleReuseTest, params=dict(point1=(0, 0), point2=(2, 1)), cell_name='reuse')
+    assert plm.template_plugin.rotated_master_hits >= 2
+    plm.generate_content()
+
+
 def test_instance_port_to_port_at_angle_no_hierarchy():
     spec_file = 'bpg_test_suite/specs/any_angle_port_to_port_at_angle_no_hierarchy_specs.yaml'
     plm = BPG.PhotonicLayoutManager(spec_file)
@@ -537,5 +580,7 @@ def test_instance_port_to_port_at_angle_hierarchy():
 if __name__ == '__main__':
     test_anyangle_conversion_functions()
     test_rectangle_rotation()
+    test_polygon_rotate_all()
+    test_rotated_master_reuse()
     test_instance_port_to_port_at_angle_no_hierarchy()
     test_instance_port_to_port_at_angle_hierarchy()
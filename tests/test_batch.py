@@ -0,0 +1,22 @@
+import json
+from BPG.batch import run_batch
+
+
+def test_batch(tmp_path):
+    spec_files = ['bpg_test_suite/specs/add_round_specs.yaml',
+                  'bpg_test_suite/specs/dataprep_specs_op.yaml',
+                  'bpg_test_suite/specs/does_not_exist.yaml']
+    report = run_batch(spec_files, outputs=['gds', 'dataprep'], jobs=2, output_dir=str(tmp_path))
+
+    assert report['summary']['passed'] == 2 and report['summary']['failed'] == 1
+    assert [result['status'] for result in report['results']] == ['ok', 'ok', 'error']
+
+    # Every spec file ran in its own output directory
+    output_dirs = [result['output_dir'] for result in report['results']]
+    assert len(set(output_dirs)) == len(spec_files)
+    for result in report['results'][:2]:
+        assert result['outputs']['gds'].startswith(result['output_dir'])
+        assert 'dataprep' in result['timing']
+
+    with open(tmp_path / 'report.json', 'r') as f:
+        assert json.load(f)['summary'] == report['summary']
@@ -0,0 +1,33 @@
+from BPG.benchmark import BENCHMARKS, run_benchmarks, compare_results
+
+
+def test_benchmark_smoke():
+    """ Runs every benchmark at a small size through all stages """
+    sizes = dict(deep_hierarchy=[2], fan_out=[4], rect_array=[3], dense_rings=[3], curved_paths=[2], via_farm=[2])
+    results = run_benchmarks(spec_file='bpg_test_suite/specs/benchmark_specs.yaml', sizes=sizes)
+    assert [result['benchmark'] for result in results['results']] == list(BENCHMARKS)
+    for result in results['results']:
+        assert result['flat_shapes'] > 0
+        assert all(duration >= 0 for duration in result['timing'].values())
+        assert 'process_peak_rss_mb' in result
+
+    # Results never regress against themselves
+    assert not any(row['regression'] for row in compare_results(results, results))
+
+
+def test_compare_results():
+    baseline = dict(results=[dict(benchmark='rect_array', size=10, timing=dict(generate_content=1.0, dataprep=0.01))])
+    results = dict(results=[dict(benchmark='rect_array', size=10, timing=dict(generate_content=1.5, dataprep=0.02)),
+                            dict(benchmark='rect_array', size=50, timing=dict(generate_content=5.0))])
+    comparison = compare_results(results, baseline, threshold=0.2, min_time=0.05)
+
+    # Sizes missing from the baseline are not compared, and short stages are not flagged
+    assert [(row['stage'], row['regression']) for row in comparison] == [('generate_content', True),
+                                                                         ('dataprep', False)]
+    assert comparison[0]['ratio'] == 1.5
+    assert not compare_results(results, baseline, threshold=0.6)[0]['regression']
+
+
+if __name__ == '__main__':
+    test_compare_results()
+    test_benchmark_smoke()
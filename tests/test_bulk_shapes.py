@@ -0,0 +1,91 @@
+import BPG
+import numpy as np
+
+
+class BulkShapes(BPG.PhotonicTemplateBase):
+    def __init__(self, temp_db,
+                 lib_name,
+                 params,
+                 used_names,
+                 **kwargs,
+                 ):
+        """ Class for drawing rectangles, polygons and rounds with the bulk insertion methods """
+        BPG.PhotonicTemplateBase.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            n='Number of shapes along each side of the arrays',
+        )
+
+    @classmethod
+    def get_default_param_values(cls):
+        return dict(
+            n=10,
+        )
+
+    def draw_layout(self):
+        n = self.params['n']
+        x, y = np.meshgrid(np.arange(n) * 2.0, np.arange(n) * 2.0)
+        x, y = x.ravel(), y.ravel()
+
+        self.add_rects(layer='SI', bboxes=np.column_stack([x, y, x + 1.5, y + 1.5]))
+        self.add_polygons(layer='SI', points=[[(-5, 0), (-3, 0), (-4, 2)], [(-5, 3), (-3, 3), (-3, 5), (-5, 5)]])
+        self.add_rounds(layer='M1', centers=np.column_stack([x, y]) + 0.75, rout=np.where(x > y, 0.5, 0.6), rin=0.2)
+
+
+class BulkShapesTop(BPG.PhotonicTemplateBase):
+    def __init__(self, temp_db,
+                 lib_name,
+                 params,
+                 used_names,
+                 **kwargs,
+                 ):
+        """ Class instantiating the bulk shapes with several orientations """
+        BPG.PhotonicTemplateBase.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            n='Number of shapes along each side of the arrays',
+        )
+
+    @classmethod
+    def get_default_param_values(cls):
+        return dict(
+            n=10,
+        )
+
+    def draw_layout(self):
+        master = self.new_template(params=dict(n=self.params['n']), temp_cls=BulkShapes)
+        self.add_instance(master=master, loc=(0, 0), orient='R0')
+        self.add_instance(master=master, loc=(100, 0), orient='R90')
+        self.add_instance(master=master, loc=(0, 100), orient='MX')
+
+
+def test_bulk_shapes():
+    spec_file = 'bpg_test_suite/specs/add_rect_specs.yaml'
+    plm = BPG.PhotonicLayoutManager(spec_file)
+    plm.generate_template(temp_cls=BulkShapesTop, params=dict(n=10), cell_name='bulk_shapes')
+    plm.generate_content()
+    plm.generate_gds()
+    plm.template_plugin.collect_geometry_stats = True
+    plm.generate_flat_content()
+    plm.generate_flat_gds()
+
+    # The shapes stay in polygon arrays through flattening, with one array per call and instance
+    flat_content = plm.content_list_flat[0]
+    assert len(flat_content.polygon_array_list) == 9
+    assert not flat_content.rect_list and not flat_content.polygon_list and not flat_content.round_list
+    num_polygons = sum(len(polygon_array['offsets']) - 1 for polygon_array in flat_content.polygon_array_list)
+    assert num_polygons == 3 * (100 + 2 + 100)
+    # The geometry statistics count each polygon of the arrays
+    assert sum(stats['flat_shapes'] for stats in plm.geometry_stats['masters']) == num_polygons
+
+    plm.dataprep()
+    plm.generate_dataprep_gds()
+    plm.generate_lsf()
+
+
+if __name__ == '__main__':
+    test_bulk_shapes()
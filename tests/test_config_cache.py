@@ -0,0 +1,50 @@
+import pytest
+from types import SimpleNamespace
+from BPG.config_cache import load_yaml_cached, clear_config_cache, write_tech_bundle, read_tech_bundle
+
+
+def test_load_yaml_cached(tmp_path):
+    config = tmp_path / 'config.yaml'
+    config.write_text('layer_map:\n  SI: [1, 0]\n')
+
+    shared = load_yaml_cached(config, copy_content=False)
+    assert load_yaml_cached(config, copy_content=False) is shared
+    # Copies can be modified without affecting the cache
+    copied = load_yaml_cached(config)
+    assert copied == shared and copied is not shared
+    copied['layer_map']['SI'] = [2, 0]
+    assert load_yaml_cached(config)['layer_map']['SI'] == [1, 0]
+
+    # Modified files are parsed again
+    config.write_text('layer_map:\n  SI: [10, 0]\n')
+    assert load_yaml_cached(config)['layer_map']['SI'] == [10, 0]
+
+
+def test_tech_bundle(tmp_path):
+    layermap = tmp_path / 'gds_map.yaml'
+    layermap.write_text('layer_map:\n  SI: [1, 0]\nvia_info: {}\n')
+    lumerical_map = tmp_path / 'lumerical_map.yaml'
+    lumerical_map.write_text('lumerical_prop_map: {}\n')
+    routine = tmp_path / 'dataprep_routine.yaml'
+    routine.write_text('GlobalGridSize: 0.001\n')
+    tech_info = SimpleNamespace(layermap_path=layermap, lsf_export_path=lumerical_map,
+                                dataprep_routine_filepath=routine, dataprep_parameters_filepath=None)
+
+    bundle = tmp_path / 'tech.bundle'
+    write_tech_bundle(tech_info, bundle)
+    clear_config_cache()
+    assert read_tech_bundle(bundle) == 3
+    assert load_yaml_cached(layermap) == {'layer_map': {'SI': [1, 0]}, 'via_info': {}}
+
+    # Files changed after the bundle was written are not taken from the bundle
+    routine.write_text('GlobalGridSize: 0.0005\n')
+    clear_config_cache()
+    assert read_tech_bundle(bundle) == 2
+    assert load_yaml_cached(routine) == {'GlobalGridSize': 0.0005}
+
+    # Corrupted bundles are rejected
+    data = bytearray(bundle.read_bytes())
+    data[-1] ^= 0xff
+    bundle.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        read_tech_bundle(bundle)
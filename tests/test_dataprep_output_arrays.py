@@ -0,0 +1,40 @@
+import BPG
+import numpy as np
+from BPG.content_list import polygon_array_to_pointlists
+
+
+def test_dataprep_output_arrays():
+    spec_file = 'bpg_test_suite/specs/dataprep_specs_op.yaml'
+    plm = BPG.PhotonicLayoutManager(spec_file)
+    plm.generate_content()
+    plm.generate_flat_content()
+
+    plm.dataprep()
+    polygons_by_layer = {}
+    for polygon in plm.content_list_post_dataprep[0].polygon_list:
+        polygons_by_layer.setdefault(tuple(polygon['layer']), []).append(polygon['points'])
+
+    # Rerun dataprep keeping the output as one polygon array per layer, and export it directly
+    plm.template_plugin.dataprep_output_arrays = True
+    plm.dataprep()
+    plm.generate_dataprep_gds()
+    content_list = plm.content_list_post_dataprep[0]
+
+    assert content_list.polygon_array_list
+    array_layers = set()
+    for polygon_array in content_list.polygon_array_list:
+        pointlists = polygon_array_to_pointlists(polygon_array)
+        # A layer without output polygons may be kept as an empty array
+        expected_pointlists = polygons_by_layer.get(tuple(polygon_array['layer']), [])
+        if pointlists:
+            array_layers.add(tuple(polygon_array['layer']))
+        assert len(pointlists) == len(expected_pointlists)
+        for points, expected_points in zip(pointlists, expected_pointlists):
+            assert np.array_equal(points, np.array(expected_points))
+    # Every dataprepped layer is kept as an array, and the bypass layers keep their polygons
+    bypass_layers = {tuple(polygon['layer']) for polygon in content_list.polygon_list}
+    assert array_layers | bypass_layers == set(polygons_by_layer)
+
+
+if __name__ == '__main__':
+    test_dataprep_output_arrays()
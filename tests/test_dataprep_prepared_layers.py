@@ -0,0 +1,35 @@
+import BPG
+
+
+def polygon_set(content_list):
+    """ Returns the layers and points of all polygons in a content list """
+    return {(tuple(polygon['layer']), tuple(map(tuple, polygon['points']))) for polygon in content_list.polygon_list}
+
+
+def test_dataprep_prepared_layers():
+    spec_file = 'bpg_test_suite/specs/dataprep_specs_op.yaml'
+    plm = BPG.PhotonicLayoutManager(spec_file)
+    plm.generate_content()
+    plm.generate_flat_content()
+
+    plm.dataprep()
+    prepared_layers = plm.prepared_layers
+    reference = polygon_set(plm.content_list_post_dataprep[0])
+    assert prepared_layers[0].n_hits == 0 and prepared_layers[0].n_misses > 0
+
+    # LSF dataprep and a second dataprep reuse the conversion of the first run
+    plm.generate_lsf()
+    plm.dataprep()
+    assert plm.prepared_layers is prepared_layers
+    assert prepared_layers[0].n_hits == 2 * prepared_layers[0].n_misses
+    assert polygon_set(plm.content_list_post_dataprep[0]) == reference
+
+    # New flat content is prepared again
+    plm.generate_flat_content()
+    plm.dataprep()
+    assert plm.prepared_layers is not prepared_layers
+    assert polygon_set(plm.content_list_post_dataprep[0]) == reference
+
+
+if __name__ == '__main__':
+    test_dataprep_prepared_layers()
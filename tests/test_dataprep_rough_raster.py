@@ -0,0 +1,37 @@
+import BPG
+import shapely
+
+
+def rad_layer_geometry(content_list):
+    """ Returns the union of the post-dataprep polygons on the rough add output layer """
+    return shapely.union_all([
+        shapely.Polygon(polygon['points']) for polygon in content_list.polygon_list
+        if tuple(polygon['layer']) == ('rad', 'drawing')
+    ])
+
+
+def test_dataprep_rough_raster():
+    spec_file = 'bpg_test_suite/specs/dataprep_specs_op.yaml'
+    plm = BPG.PhotonicLayoutManager(spec_file)
+    plm.generate_content()
+    plm.generate_flat_content()
+
+    plm.dataprep()
+    offset_geometry = rad_layer_geometry(plm.content_list_post_dataprep[0])
+
+    # Rerun dataprep with the rasterized rough add
+    plm.photonic_tech_info.dataprep_routine_data['RoughAddMode'] = 'raster'
+    plm.dataprep()
+    plm.generate_dataprep_gds()
+    raster_geometry = rad_layer_geometry(plm.content_list_post_dataprep[0])
+
+    # The raster rough add is Manhattan and covers the offset based result
+    for polygon in plm.content_list_post_dataprep[0].polygon_list:
+        if tuple(polygon['layer']) == ('rad', 'drawing'):
+            points = shapely.Polygon(polygon['points']).exterior.coords
+            assert all(x0 == x1 or y0 == y1 for (x0, y0), (x1, y1) in zip(points[:-1], points[1:]))
+    assert offset_geometry.difference(raster_geometry).area < 1e-6
+
+
+if __name__ == '__main__':
+    test_dataprep_rough_raster()
@@ -0,0 +1,38 @@
+import BPG
+import shapely
+import numpy as np
+
+
+def layer_areas(content_list):
+    """ Returns the total polygon area on each layer of a post-dataprep content list """
+    polygons_by_layer = {}
+    for polygon in content_list.polygon_list:
+        polygons_by_layer.setdefault(tuple(polygon['layer']), []).append(shapely.Polygon(polygon['points']))
+
+    return {layer: shapely.union_all(polygons).area for layer, polygons in polygons_by_layer.items()}
+
+
+def test_dataprep_shapely():
+    spec_file = 'bpg_test_suite/specs/dataprep_specs_shapely.yaml'
+    plm = BPG.PhotonicLayoutManager(spec_file)
+    plm.generate_content()
+    plm.generate_flat_content()
+
+    assert plm.template_plugin.dataprep_engine == 'shapely'
+    plm.dataprep()
+    plm.generate_dataprep_gds()
+    shapely_areas = layer_areas(plm.content_list_post_dataprep[0])
+
+    # Rerun the same procedure with the gdspy engine, results should only differ by grid-level rounding
+    plm.template_plugin.dataprep_engine = 'gdspy'
+    plm.dataprep()
+    gdspy_areas = layer_areas(plm.content_list_post_dataprep[0])
+
+    assert shapely_areas.keys() == gdspy_areas.keys()
+    for layer, area in gdspy_areas.items():
+        assert np.isclose(shapely_areas[layer], area, rtol=1e-2), \
+            f'Area mismatch on {layer}: shapely {shapely_areas[layer]}, gdspy {area}'
+
+
+if __name__ == '__main__':
+    test_dataprep_shapely()
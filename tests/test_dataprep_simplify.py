@@ -0,0 +1,39 @@
+import BPG
+import shapely
+import numpy as np
+
+
+def layer_geometries(content_list):
+    """ Returns the union of the post-dataprep polygons on each layer """
+    polygons_by_layer = {}
+    for polygon in content_list.polygon_list:
+        polygons_by_layer.setdefault(tuple(polygon['layer']), []).append(shapely.Polygon(polygon['points']))
+
+    return {layer: shapely.union_all(polygons) for layer, polygons in polygons_by_layer.items()}
+
+
+def test_dataprep_simplify():
+    spec_file = 'bpg_test_suite/specs/dataprep_specs_op.yaml'
+    plm = BPG.PhotonicLayoutManager(spec_file)
+    plm.generate_content()
+    plm.generate_flat_content()
+
+    plm.dataprep()
+    reference = layer_geometries(plm.content_list_post_dataprep[0])
+
+    # Rerun dataprep, simplifying the circles on the layerA_* layers within the global grid before the operations
+    plm.photonic_tech_info.dataprep_routine_data['simplify_tolerance_per_layer'] = {
+        f'layerA_{op}': 0.001 for op in ['add', 'sub', 'xor', 'and', 'rad']
+    }
+    plm.dataprep()
+    plm.generate_dataprep_gds()
+    simplified = layer_geometries(plm.content_list_post_dataprep[0])
+
+    assert simplified.keys() == reference.keys()
+    for layer, geometry in reference.items():
+        assert shapely.hausdorff_distance(simplified[layer], geometry) < 0.01, f'Shapes on {layer} moved'
+        assert np.isclose(simplified[layer].area, geometry.area, rtol=1e-2), f'Area mismatch on {layer}'
+
+
+if __name__ == '__main__':
+    test_dataprep_simplify()
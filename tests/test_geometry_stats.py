@@ -0,0 +1,43 @@
+import csv
+from pathlib import Path
+
+import BPG
+
+
+def test_geometry_stats():
+    spec_file = 'bpg_test_suite/specs/dataprep_specs_op.yaml'
+    plm = BPG.PhotonicLayoutManager(spec_file)
+    plm.generate_content()
+    plm.template_plugin.collect_geometry_stats = True
+    plm.generate_flat_content()
+    plm.dataprep()
+
+    # Every shape of the flat layout is accounted to a master class
+    master_stats = plm.geometry_stats['masters']
+    n_flat_shapes = sum(sum(content.shape_counts(elements=True).values()) for content in plm.content_list_flat)
+    assert sum(stats['flat_shapes'] for stats in master_stats) == n_flat_shapes
+    assert all(stats['instances'] >= stats['masters'] >= 1 for stats in master_stats)
+
+    # The output statistics of each layer match the dataprepped content
+    dataprep_stats = plm.geometry_stats['dataprep']
+    assert {row['step'] for row in dataprep_stats} >= {'input', 'output'}
+    output_polygon_counts = {tuple(row['layer']): row['polygon_count']
+                             for row in dataprep_stats if row['step'] == 'output'}
+    polygon_counts = {}
+    for polygon in plm.content_list_post_dataprep[0].polygon_list:
+        polygon_counts[tuple(polygon['layer'])] = polygon_counts.get(tuple(polygon['layer']), 0) + 1
+    for layer, count in polygon_counts.items():
+        if layer in output_polygon_counts:
+            assert output_polygon_counts[layer] == count
+    assert all(row['max_vertices'] <= row['vertex_count'] for row in dataprep_stats)
+
+    with open(Path(plm.log_path) / 'geometry_stats_dataprep.csv', 'r') as f:
+        assert len(list(csv.DictReader(f))) == len(dataprep_stats)
+
+    # Running dataprep again replaces its statistics
+    plm.dataprep()
+    assert len(plm.geometry_stats['dataprep']) == len(dataprep_stats)
+
+
+if __name__ == '__main__':
+    test_geometry_stats()
@@ -0,0 +1,36 @@
+import subprocess
+import sys
+import json
+
+# Modules that must only be imported when a layout is generated, exported or dataprepped
+DEFERRED_MODULES = ['bag', 'gdspy', 'pya', 'h5py', 'scipy', 'shapely', 'DataprepPlugin', 'PLVS', 'rtree',
+                    'BPG.layout_manager', 'BPG.template', 'BPG.db', 'BPG.gds', 'BPG.lumerical', 'BPG.compiler']
+
+IMPORT_SCRIPT = """
+import sys
+import time
+start = time.perf_counter()
+import BPG
+end = time.perf_counter()
+import json
+print(json.dumps({'time': end - start, 'modules': sorted(sys.modules)}))
+"""
+
+
+def test_import_time():
+    result = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], capture_output=True, text=True, check=True)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    print(f'import BPG took {report["time"] * 1e3:.1f} ms')
+
+    loaded = [module for module in report['modules']
+              if any(module == name or module.startswith(name + '.') for name in DEFERRED_MODULES)]
+    assert not loaded, f'import BPG loaded {loaded}'
+
+    # The lazily exposed classes are still available from the package
+    import BPG
+    assert BPG.PhotonicLayoutManager.__name__ == 'PhotonicLayoutManager'
+    assert BPG.PhotonicTemplateBase.__name__ == 'PhotonicTemplateBase'
+
+
+if __name__ == '__main__':
+    test_import_time()
@@ -0,0 +1,44 @@
+import numpy as np
+import shapely
+from BPG.compiler.manh_adaptive import manh_adaptive
+
+
+def test_manh_adaptive():
+    theta = np.linspace(0, 2 * np.pi, 500, endpoint=False)
+    circle = np.round(np.stack([10 * np.cos(theta), 10 * np.sin(theta)], axis=1), 3)
+    circle_shapely = shapely.Polygon(circle)
+
+    n_vertices = {}
+    for max_deviation in [0.001, 0.02, 0.1]:
+        coords = manh_adaptive(circle, manh_grid_size=0.001, max_deviation=max_deviation, manh_type='inc')
+        manh_shapely = shapely.Polygon(coords)
+        n_vertices[max_deviation] = len(coords)
+
+        assert manh_shapely.is_valid
+        # All edges are horizontal or vertical
+        assert np.all(np.any(np.isclose(np.diff(coords, axis=0), 0), axis=1))
+        # The outline stays within the budget, up to the rounding on the Manhattanization grid
+        assert shapely.hausdorff_distance(circle_shapely.exterior, manh_shapely.exterior) <= max_deviation + 0.002
+        # 'inc' steps are placed outside of the shape
+        assert circle_shapely.difference(manh_shapely).area < 1e-3 * circle_shapely.area
+
+    assert n_vertices[0.1] < n_vertices[0.02] < n_vertices[0.001]
+
+
+def test_manh_adaptive_self_intersection():
+    """ The coarse steps on both sides of a sharp concave corner cross, so the outline is rejected """
+    polygon = np.array([(2.065, 0.7), (0.841, 0.539), (0.908, 2.707), (0.171, 1.402), (-0.23, 0.728), (-1.711, 1.17),
+                        (-2.466, -1.363), (0.459, -1.534)])
+    assert shapely.Polygon(polygon).is_valid
+    assert manh_adaptive(polygon, manh_grid_size=0.001, max_deviation=0.1, manh_type='inc') is None
+
+    # The returned outlines are always valid
+    for max_deviation in [0.001, 0.01, 0.05]:
+        for manh_type in ['inc', 'dec']:
+            coords = manh_adaptive(polygon, manh_grid_size=0.001, max_deviation=max_deviation, manh_type=manh_type)
+            assert coords is None or shapely.Polygon(coords).is_valid
+
+
+if __name__ == '__main__':
+    test_manh_adaptive()
+    test_manh_adaptive_self_intersection()
@@ -0,0 +1,40 @@
+import numpy as np
+import shapely
+from BPG.compiler.manh_fracture import fracture_pointlists
+
+
+def comb_polygon(n_teeth):
+    """ Returns the points of a Manhattan comb, with teeth of varying length pointing up from a horizontal spine """
+    points = [(0, 0), (2 * n_teeth - 1, 0)]
+    for tooth in reversed(range(n_teeth)):
+        points.extend([(2 * tooth + 1, 1), (2 * tooth + 1, 2 + tooth % 7), (2 * tooth, 2 + tooth % 7)])
+        if tooth:
+            points.append((2 * tooth, 1))
+    return np.array(points, dtype=float) * 0.01
+
+
+def test_manh_fracture():
+    comb = comb_polygon(200)
+    rotated_square = np.array([(1, 0), (2, 1), (1, 2), (0, 1)], dtype=float)
+    pointlists = [comb, rotated_square]
+
+    fractured = fracture_pointlists(pointlists, max_points=199, resolution=0.001)
+
+    assert max(len(points) for points in fractured) <= 199
+    # Small polygons are kept as they are
+    assert any(np.array_equal(points, rotated_square) for points in fractured)
+
+    # The pieces of the comb are Manhattan, do not overlap, and cover the comb exactly
+    comb_pieces = [shapely.Polygon(points) for points in fractured if not np.array_equal(points, rotated_square)]
+    assert len(comb_pieces) > 1
+    for piece in comb_pieces:
+        assert piece.is_valid
+        coords = np.array(piece.exterior.coords)
+        assert np.all(np.any(np.isclose(np.diff(coords, axis=0), 0), axis=1))
+    comb_union = shapely.union_all(comb_pieces)
+    assert np.isclose(sum(piece.area for piece in comb_pieces), comb_union.area)
+    assert comb_union.symmetric_difference(shapely.Polygon(comb)).area < 1e-9
+
+
+if __name__ == '__main__':
+    test_manh_fracture()
@@ -73,6 +73,40 @@ class Path(BPG.PhotonicTemplateBase):
         self.add_obj(path2)
 
 
+class PathBatch(BPG.PhotonicTemplateBase):
+    def __init__(self, temp_db,
+                 lib_name,
+                 params,
+                 used_names,
+                 **kwargs,
+                 ):
+        """ Class for drawing many paths at once with add_paths """
+        BPG.PhotonicTemplateBase.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+        )
+
+    @classmethod
+    def get_default_param_values(cls):
+        return dict(
+        )
+
+    def draw_layout(self):
+        x = np.arange(0, 2*np.pi, 0.01)
+        points_list = [[(x[ind], np.cos(x[ind]) + 3 * offset) for ind in range(x.shape[0])] for offset in range(10)]
+        points_list.append([(0, -2), (1, -2), (1, -2), (2, -3)])
+        widths = [0.4 + 0.1 * index for index in range(len(points_list))]
+
+        paths = self.add_paths(layer='SI', widths=widths, points_list=points_list)
+
+        # The batched paths are identical to the paths created one by one
+        for path, width, points in zip(paths, widths, points_list):
+            reference = PhotonicPath(resolution=self.grid.resolution, layer='SI', width=width, points=points)
+            assert path.content == reference.content
+
+
 def test_path():
     spec_file = 'bpg_test_suite/specs/path_test_specs.yaml'
     plm = BPG.PhotonicLayoutManager(spec_file)
@@ -83,5 +117,14 @@ def test_path():
     plm.generate_lsf()
 
 
+def test_add_paths():
+    spec_file = 'bpg_test_suite/specs/path_test_specs.yaml'
+    plm = BPG.PhotonicLayoutManager(spec_file)
+    plm.generate_template(temp_cls=PathBatch, cell_name='path_batch')
+    plm.generate_content()
+    plm.generate_gds()
+
+
 if __name__ == '__main__':
     test_path()
+    test_add_paths()
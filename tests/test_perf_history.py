@@ -0,0 +1,122 @@
+import BPG
+from BPG.perf_history import PerfHistory, load_history, compare_history, _git_revision
+from BPG.tracing import Tracer, tracer
+
+
+def test_history_records_stages(tmp_path):
+    """ Each top level span of a run is appended to the history, without the spans nested below the maximum depth """
+    history_path = tmp_path / 'perf_history.jsonl'
+    spec_file = tmp_path / 'specs.yaml'
+    trace = Tracer()
+    for _ in range(2):
+        trace.reset()
+        trace.enable(memory=True, max_depth=1)
+        trace.listeners.append(PerfHistory(history_path, str(spec_file)).record)
+        assert not trace.recording
+        with trace.span('generate_content') as content_span:
+            assert trace.recording
+            with trace.span('new_template'):
+                # The attributes of the spans nested below the maximum depth need not be computed
+                assert not trace.recording
+                trace.annotate(cell_name='nested')
+            content_span.set(polygon=12)
+        with trace.span('dataprep'):
+            pass
+        trace.disable()
+
+    records = load_history(history_path)
+    assert [record['stage'] for record in records] == ['generate_content', 'dataprep'] * 2
+    assert records[0]['spec'] == str(spec_file.resolve())
+    assert records[0]['polygon'] == 12
+    assert 'cell_name' not in records[0]
+    assert 'rss_mb' in records[0] and 'duration' in records[0]
+    assert trace.summary.keys() == {'generate_content', 'dataprep'}
+
+
+def test_run_ids(tmp_path):
+    """ Runs started by a process within the same second are told apart, and the revisions are looked up once """
+    _git_revision.cache_clear()
+    spec_file = tmp_path / 'specs.yaml'
+    histories = [PerfHistory(tmp_path / 'perf_history.jsonl', str(spec_file)) for _ in range(3)]
+    assert len({history.run_info['run_id'] for history in histories}) == 3
+    assert _git_revision.cache_info().misses == 2
+
+
+def test_managers_reset_tracer(tmp_path):
+    """ Each layout manager replaces the tracer settings and history listener of the previous one """
+    spec_file = 'bpg_test_suite/specs/add_rect_specs.yaml'
+    history_path = tmp_path / 'perf_history.jsonl'
+    bpg_config = BPG.run_settings['bpg_config']
+    settings = {key: bpg_config[key] for key in ('trace', 'memory_report', 'perf_history') if key in bpg_config}
+    try:
+        bpg_config.update(trace=False, memory_report=False, perf_history=str(history_path))
+        for _ in range(2):
+            plm = BPG.PhotonicLayoutManager(spec_file)
+            assert tracer.enabled and len(tracer.listeners) == 1
+        plm.generate_content()
+        records = load_history(history_path)
+        assert [record['stage'] for record in records].count('generate_content') == 1
+
+        # Without any of the settings, the tracer is disabled and the history is left untouched
+        bpg_config.update(perf_history=False)
+        plm = BPG.PhotonicLayoutManager(spec_file)
+        assert not tracer.enabled and not tracer.listeners
+        plm.generate_content()
+        assert len(load_history(history_path)) == len(records)
+    finally:
+        for key in ('trace', 'memory_report', 'perf_history'):
+            bpg_config.pop(key, None)
+        bpg_config.update(settings)
+        tracer.disable()
+        tracer.reset()
+
+
+def test_compare_history():
+    """ The latest run of each spec file is compared to the median of its previous runs """
+    def record(spec, run_id, stage, duration):
+        return dict(run_id=run_id, spec=spec, revision=run_id, stage=stage, duration=duration)
+
+    records = []
+    for run, duration in enumerate([1.0, 1.1, 5.0, 0.9]):
+        records += [record('/a.yaml', f'run{run}', 'dataprep', duration),
+                    record('/a.yaml', f'run{run}', 'generate_content', 0.5)]
+        records.append(record('/b.yaml', f'run{run}', 'dataprep', 0.01))
+    # The latest run generates two templates, and is slower overall
+    records += [record('/a.yaml', 'run4', 'dataprep', 1.5),
+                record('/a.yaml', 'run4', 'generate_template', 0.2),
+                record('/a.yaml', 'run4', 'generate_template', 0.2),
+                record('/a.yaml', 'run4', 'generate_content', 0.52)]
+
+    comparison = {(row['spec'], row['stage']): row for row in compare_history(records, last_n=4)}
+    # The outlier of run2 does not hide the slowdown, and stages without previous runs are not compared
+    assert comparison['/a.yaml', 'dataprep']['baseline'] == 1.05
+    assert comparison['/a.yaml', 'dataprep']['regression']
+    assert not comparison['/a.yaml', 'generate_content']['regression']
+    assert ('/a.yaml', 'generate_template') not in comparison
+    assert comparison['/a.yaml', 'dataprep']['revision'] == 'run4'
+    # Short stages are not flagged on noise
+    assert not comparison['/b.yaml', 'dataprep']['regression']
+
+    assert compare_history(records, last_n=1)[0]['baseline'] == 0.9
+
+    # The cases of a spec file, such as the sizes of a benchmark, are only compared to their own previous runs
+    case_records = []
+    for run in range(4):
+        for size, duration in [(10, 0.1), (1000, 10.0)]:
+            case_records.append(dict(record('/c.yaml', f'run{run}-{size}', 'dataprep', duration),
+                                     case=dict(benchmark='rect_array', size=size)))
+    comparison = compare_history(case_records)
+    assert [(row['case']['size'], row['baseline']) for row in comparison] == [(10, 0.1), (1000, 10.0)]
+    assert not any(row['regression'] for row in comparison)
+
+
+if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_history_records_stages(Path(tmp_dir))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_run_ids(Path(tmp_dir))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_managers_reset_tracer(Path(tmp_dir))
+    test_compare_history()
@@ -0,0 +1,119 @@
+import threading
+
+import gdspy
+
+import BPG
+from BPG.runner import run_spec
+from BPG.server import GenerationServer, send_request
+
+
+class ServerRing(BPG.PhotonicTemplateBase):
+    def __init__(self, temp_db,
+                 lib_name,
+                 params,
+                 used_names,
+                 **kwargs,
+                 ):
+        """ Class for drawing a ring, shared by the generation server naming test specs """
+        BPG.PhotonicTemplateBase.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            rout='Outer radius of the ring',
+        )
+
+    @classmethod
+    def get_default_param_values(cls):
+        return dict(
+            rout=5,
+        )
+
+    def draw_layout(self):
+        self.add_round(layer='SI', resolution=self.grid.resolution, rout=self.params['rout'], rin=self.params['rout'] - 1,
+                       center=(0, 0))
+
+
+class ServerRingWithHeater(BPG.PhotonicTemplateBase):
+    def __init__(self, temp_db,
+                 lib_name,
+                 params,
+                 used_names,
+                 **kwargs,
+                 ):
+        """ Class instantiating a ring next to a heater """
+        BPG.PhotonicTemplateBase.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            rout='Outer radius of the ring',
+        )
+
+    @classmethod
+    def get_default_param_values(cls):
+        return dict(
+            rout=5,
+        )
+
+    def draw_layout(self):
+        rout = self.params['rout']
+        master = self.new_template(params=dict(rout=rout), temp_cls=ServerRing)
+        self.add_instance(master=master, loc=(0, 0))
+        self.add_rect(layer='M1', bbox=BPG.geometry.BBox(-rout, rout + 1, rout, rout + 2, resolution=self.grid.resolution))
+
+
+def _cell_names(gds_path):
+    return set(gdspy.GdsLibrary(infile=gds_path).cells.keys())
+
+
+def test_server(tmp_path):
+    socket_path = str(tmp_path / 'bpg.sock')
+    server = GenerationServer(socket_path)
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+
+    try:
+        assert send_request(dict(command='ping'), socket_path)['status'] == 'ok'
+
+        spec_file = 'bpg_test_suite/specs/add_round_specs.yaml'
+        for _ in range(2):
+            response = send_request(dict(spec=spec_file, outputs=['gds', 'dataprep']), socket_path)
+            assert response['status'] == 'ok', response.get('traceback')
+            assert set(response['outputs']) == {'gds', 'dataprep'}
+
+        # Failures are reported without stopping the server
+        response = send_request(dict(spec=spec_file, outputs=['oa']), socket_path)
+        assert response['status'] == 'error'
+
+        # Both runs shared the same warm template database
+        stats = send_request(dict(command='stats'), socket_path)
+        assert stats['requests'] == 3 and stats['errors'] == 1 and stats['template_dbs'] == 1
+    finally:
+        send_request(dict(command='shutdown'), socket_path)
+        thread.join()
+
+
+def test_server_cell_names(tmp_path):
+    socket_path = str(tmp_path / 'bpg.sock')
+    server = GenerationServer(socket_path)
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+
+    # The heater requests reuse the ring master of the first request under the same impl_cell, and the last request
+    # creates a new ring master
+    ring_spec = 'bpg_test_suite/specs/server_ring_specs.yaml'
+    heater_spec = 'bpg_test_suite/specs/server_ring_heater_specs.yaml'
+    runs = [(ring_spec, {}), (heater_spec, {}), (heater_spec, dict(layout_params=dict(rout=6)))]
+    try:
+        for spec_file, overrides in runs:
+            response = send_request(dict(spec=spec_file, outputs=['gds'], overrides=overrides), socket_path)
+            assert response['status'] == 'ok', response.get('traceback')
+            warm_names = _cell_names(response['outputs']['gds'])
+
+            # The warm cells are named as in a cold run of the same spec
+            cold_names = _cell_names(run_spec(spec_file, ['gds'], overrides)['gds'])
+            assert warm_names == cold_names
+    finally:
+        send_request(dict(command='shutdown'), socket_path)
+        thread.join()
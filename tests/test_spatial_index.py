@@ -0,0 +1,55 @@
+import pickle
+
+import BPG
+from BPG.spatial_index import SpatialIndex, shape_bbox, polygon_array_bboxes, INDEXED_KEYS
+
+
+def _intersects(bbox, region):
+    return bbox[0] <= region[2] and bbox[2] >= region[0] and bbox[1] <= region[3] and bbox[3] >= region[1]
+
+
+def test_spatial_index():
+    spec_file = 'bpg_test_suite/specs/add_rect_specs.yaml'
+    plm = BPG.PhotonicLayoutManager(spec_file)
+    plm.generate_content()
+    plm.generate_flat_content()
+    content = plm.content_list_flat[0]
+    spatial_index = plm.get_spatial_indices()[0]
+    assert plm.get_spatial_indices()[0] is spatial_index
+
+    # Region queries return the same shapes as a linear scan of the content list
+    region = (-4, -9, 2, 0)
+    for layer in spatial_index.layers:
+        expected = []
+        for key in INDEXED_KEYS:
+            for item_index, item in enumerate(content[key]):
+                if tuple(item['layer']) != layer:
+                    continue
+                if key == 'polygon_array_list':
+                    bboxes, polygon_indices = polygon_array_bboxes(item)
+                    expected.extend((key, item_index, int(polygon_index))
+                                    for bbox, polygon_index in zip(bboxes, polygon_indices)
+                                    if _intersects(bbox, region))
+                elif _intersects(shape_bbox(key, item), region):
+                    expected.append((key, item_index, -1))
+        assert spatial_index.intersection(layer, region) == expected
+        assert spatial_index.count(layer, region) == len(expected)
+        assert len(spatial_index.nearest(layer, (0, 0), 1)) == 1
+
+    # Shapes added to the flat content after the index is built are found
+    rect = dict(content.rect_list[0], bbox=[[1000, 1000], [1001, 1001]])
+    content.rect_list.append(rect)
+    layer = tuple(rect['layer'])
+    spatial_index = plm.get_spatial_indices()[0]
+    assert ('rect_list', len(content.rect_list) - 1, -1) in spatial_index.intersection(layer, (999, 999, 1002, 1002))
+
+    # The index is rebuilt identically from its saved form
+    plm.save_spatial_indices()
+    for restored in (SpatialIndex.from_dict(spatial_index.to_dict()), pickle.loads(pickle.dumps(spatial_index))):
+        assert restored.layers == spatial_index.layers
+        for layer in spatial_index.layers:
+            assert restored.intersection(layer, region) == spatial_index.intersection(layer, region)
+
+
+if __name__ == '__main__':
+    test_spatial_index()
@@ -0,0 +1,98 @@
+import json
+
+from BPG.tracing import Tracer, traced, tracer
+
+
+def test_nested_spans(tmp_path):
+    """ Nested spans are recorded with their attributes, and the self time excludes the time spent in children """
+    trace = Tracer()
+    trace.enable(trace_path=tmp_path / 'trace.json', summary_path=tmp_path / 'trace_summary.txt')
+
+    with trace.span('dataprep', cell_name='top'):
+        for layer in [('SI', 'drawing'), ('POLY', 'drawing')]:
+            with trace.span('poly_operation', operation='rad', lpp_in=layer) as op_span:
+                sum(range(10000))
+                op_span.set(shape_count=3)
+
+    assert trace.summary['poly_operation'][0] == 2
+    count, total, self_time, max_time = trace.summary['dataprep']
+    assert count == 1
+    assert self_time < total
+    assert abs(total - self_time - trace.summary['poly_operation'][1]) < 1e-6
+
+    # The trace is written when the top level span ends, in the Chrome trace event format
+    with open(tmp_path / 'trace.json', 'r') as f:
+        events = json.load(f)['traceEvents']
+    assert [event['name'] for event in events] == ['poly_operation', 'poly_operation', 'dataprep']
+    assert events[0]['ph'] == 'X'
+    assert events[0]['args'] == dict(operation='rad', lpp_in=['SI', 'drawing'], shape_count=3)
+    assert events[2]['ts'] <= events[0]['ts']
+    assert events[2]['dur'] >= events[0]['dur'] + events[1]['dur']
+
+    summary = (tmp_path / 'trace_summary.txt').read_text()
+    assert 'poly_operation' in summary and 'dataprep' in summary
+
+
+def test_traced_disabled():
+    """ Traced functions run unchanged and record nothing while the process tracer is disabled """
+    @traced('add')
+    def add(a, b):
+        return a + b
+
+    tracer.reset()
+    assert not tracer.enabled
+    assert add(1, b=2) == 3
+    assert tracer.events == []
+
+    tracer.enable()
+    try:
+        assert add(1, b=2) == 3
+        assert tracer.summary['add'][0] == 1
+    finally:
+        tracer.disable()
+        tracer.reset()
+
+
+def test_failed_span():
+    """ Spans exited by an exception are recorded and marked as failed """
+    trace = Tracer()
+    trace.enable()
+    try:
+        with trace.span('export'):
+            raise ValueError('export failed')
+    except ValueError:
+        pass
+    assert trace.events[0]['args'] == dict(failed=True)
+    assert trace._stack == []
+
+
+def test_memory_accounting():
+    """ Memory accounting adds the RSS and the python allocation peak of each span to its attributes """
+    trace = Tracer()
+    trace.enable(memory=True, memory_debug=True)
+    try:
+        with trace.span('dataprep'):
+            with trace.span('poly_operation'):
+                data = bytearray(32 * 1024 * 1024)
+                del data
+            with trace.span('output_layer'):
+                pass
+    finally:
+        trace.disable()
+
+    attrs = {event['name']: event['args'] for event in trace.events}
+    assert 'rss_mb' in attrs['dataprep'] and 'peak_rss_growth_mb' in attrs['dataprep']
+    assert attrs['poly_operation']['py_peak_delta_mb'] >= 32
+    assert attrs['output_layer']['py_peak_delta_mb'] < 1
+    # The peak of the parent includes the peaks of its children
+    assert attrs['dataprep']['py_peak_delta_mb'] >= 32
+
+
+if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_nested_spans(Path(tmp_dir))
+    test_traced_disabled()
+    test_failed_span()
+    test_memory_accounting()
@@ -1,4 +1,5 @@
 import BPG
+import numpy as np
 from typing import Dict, Set, Any, TYPE_CHECKING
 from bag.layout.core import BBox
 
@@ -488,6 +489,42 @@ class PortTest(BPG.PhotonicTemplateBase):
         )
 
 
+class WaveguideMoveTest(BPG.PhotonicTemplateBase):
+
+    def __init__(self,
+                 temp_db: "PhotonicTemplateDB",
+                 lib_name: str,
+                 params: Dict[str, Any],
+                 used_names: Set[str],
+                 **kwargs,
+                 ):
+        BPG.PhotonicTemplateBase.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_default_param_values(cls):
+        return dict()
+
+    @classmethod
+    def get_params_info(cls):
+        return dict()
+
+    def draw_layout(self):
+        wg_master = self.new_template(params=dict(width=1, length=5), temp_cls=Waveguide)
+        inst = self.add_instance(wg_master, 'moved', (0, 0), 'R0', unit_mode=False)
+        port = inst['PORT1']
+        for _ in range(100):
+            inst.move_by(dx=0.5, dy=0.25)
+
+        # Ports read before a move keep their location, ports read after it follow the instance
+        assert np.allclose(port.center, (5, 0))
+        assert np.allclose(inst['PORT1'].center, (55, 25))
+        assert inst.get_photonic_port('PORT1') is inst['PORT1']
+
+        inst.transform(loc=(10, 0), orient='R90')
+        assert np.allclose(inst['PORT1'].center, (10, 5))
+        assert set(inst.get_all_photonic_ports()) == {'PORT0', 'PORT1'}
+
+
 def test_wg_port():
     spec_file = 'bpg_test_suite/specs/waveguide_and_port_specs.yaml'
     plm = BPG.PhotonicLayoutManager(spec_file)
@@ -498,5 +535,13 @@ def test_wg_port():
     plm.generate_lsf()
 
 
+def test_instance_ports_follow_moves():
+    spec_file = 'bpg_test_suite/specs/waveguide_and_port_specs.yaml'
+    plm = BPG.PhotonicLayoutManager(spec_file)
+    plm.generate_template(temp_cls=WaveguideMoveTest, params={}, cell_name='move_test')
+    plm.generate_content()
+
+
 if __name__ == '__main__':
     test_wg_port()
+    test_instance_ports_follow_moves()